@@ -0,0 +1,4 @@
+"""
+Benchmarks of the check pipeline against local stand-in services.
+Run ``python -m benchmarks.run --help`` from the repository root.
+"""
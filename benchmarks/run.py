@@ -0,0 +1,185 @@
+"""
+Run benchmark scenarios and write or compare their results.
+
+Each scenario and size runs in a fresh process so memory figures are not
+polluted by earlier runs::
+
+    python -m benchmarks.run --quick --output before.json
+    python -m benchmarks.run --quick --output after.json
+    python -m benchmarks.run --compare before.json after.json
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from benchmarks.scenarios import SCENARIOS
+from benchmarks.stubs import StubServer
+
+#: Scale of each scenario in a full run.
+DEFAULT_SIZES = (100, 10000, 100000)
+#: Scale of each scenario with ``--quick``.
+QUICK_SIZES = (100, 1000)
+#: Result fields compared by ``--compare``, with ``True`` where higher is better.
+COMPARED = (('throughput', True), ('p50', False), ('p99', False), ('peak_rss_kb', False))
+
+
+def _rss_kb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize() // 1024
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _run_case(scenario, size, results):
+    logging.basicConfig(level=logging.CRITICAL)
+    stub = StubServer()
+    stub.start()
+    try:
+        rss_before = _rss_kb()
+        result = SCENARIOS[scenario](size, stub)
+        latencies = result.pop('latencies', None)
+        summary = {'scenario': scenario, 'size': size}
+        if 'ops' in result:
+            ops = result.pop('ops')
+            seconds = result.pop('seconds')
+            summary.update({
+                'ops': ops,
+                'seconds': seconds,
+                'throughput': ops / seconds if seconds else None,
+                'p50': _percentile(latencies, 0.5),
+                'p99': _percentile(latencies, 0.99),
+                'rss_kb': _rss_kb() - rss_before,
+                'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            })
+        summary.update(result)
+        results.put(summary)
+    except Exception as e:
+        results.put({'scenario': scenario, 'size': size, 'error': '{}: {}'.format(type(e).__name__, e)})
+        raise
+    finally:
+        stub.stop()
+
+
+def run_case(scenario, size):
+    """
+    Run one scenario at one size in a fresh process.
+
+    :param str scenario: Name from :data:`~benchmarks.scenarios.SCENARIOS`.
+    :param int size: Scale, usually the number of reminders.
+    :returns: Summary with ``throughput``, ``p50``, ``p99``, memory and scenario figures.
+    :rtype: dict
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_run_case, args=(scenario, size, results))
+    process.start()
+    try:
+        return results.get()
+    finally:
+        process.join()
+
+
+def _meta():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def _format(value):
+    if isinstance(value, float):
+        return '{:.4g}'.format(value)
+    return str(value)
+
+
+def compare(old, new, threshold=10.0):
+    """
+    Print change of compared fields between two result files.
+
+    :param dict old: Baseline results.
+    :param dict new: New results.
+    :param float threshold: Percent change in the worse direction counted as a regression.
+    :returns: Number of regressions.
+    :rtype: int
+    """
+    baseline = {(result['scenario'], result['size']): result for result in old['results']}
+    regressions = 0
+    for result in new['results']:
+        before = baseline.get((result['scenario'], result['size']))
+        if before is None:
+            continue
+        for field, higher_is_better in COMPARED:
+            if not before.get(field) or result.get(field) is None:
+                continue
+            change = (result[field] - before[field]) / before[field] * 100
+            worse = -change if higher_is_better else change
+            flag = ''
+            if worse > threshold:
+                flag = '  REGRESSION'
+                regressions += 1
+            print('{:<22} {:>7} {:<12} {:>10} -> {:<10} {:+7.1f}%{}'.format(
+                result['scenario'], result['size'], field, _format(before[field]), _format(result[field]),
+                change, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the reminders check pipeline.')
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS),
+                        help='Scenarios to run (default: all)')
+    parser.add_argument('--sizes', nargs='+', type=int,
+                        help='Sizes to run each scenario at (default: {})'.format(' '.join(map(str, DEFAULT_SIZES))))
+    parser.add_argument('--quick', action='store_true',
+                        help='Run at sizes {} only'.format(' '.join(map(str, QUICK_SIZES))))
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='Compare two result files instead of running')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='Percent change counted as a regression by --compare (default: 10)')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        regressions = compare(old, new, args.threshold)
+        print('{} regressions over {}%'.format(regressions, args.threshold))
+        return 1 if regressions else 0
+
+    sizes = args.sizes or (QUICK_SIZES if args.quick else DEFAULT_SIZES)
+    results = []
+    for scenario in args.scenarios:
+        for size in sizes:
+            print('{} at {}...'.format(scenario, size), file=sys.stderr, flush=True)
+            result = run_case(scenario, size)
+            results.append(result)
+            print(json.dumps(result, default=str), flush=True)
+    output = {'meta': _meta(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2, default=str)
+    return 1 if any('error' in result for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
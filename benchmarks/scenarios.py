@@ -0,0 +1,267 @@
+"""
+Benchmark scenarios. Each takes the scale ``size`` and a running :class:`~benchmarks.stubs.StubServer`
+(or ``None`` if it needs none) and returns a dict with ``ops``, ``seconds``, optional per-op
+``latencies`` and any scenario specific figures.
+"""
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import yaml
+from reminders.reminder import ReminderDaemon
+from reminders.mqtt import LocalBroker
+
+
+def http_reminder(index, url, distinct_urls=1000, threshold=90, id=True):
+    """
+    Return config of a reminder watching the stub server and alerting back to it.
+    About ``(100 - threshold)%`` of reminders see a status that triggers their alert.
+    """
+    config = {
+        'condition': 'status >= {}'.format(threshold),
+        'watcher': {
+            'type': 'HTTPWatcher',
+            'schedules': [{'trigger': 'interval', 'minutes': 1}],
+            'request_kwargs': {'url': '{}/value/{}'.format(url, index % distinct_urls)},
+            'json_expression': 'value',
+        },
+        'alerter': {
+            'type': 'HTTPAlerter',
+            'message': 'bench',
+            'max_repeat': 1,
+            'request_kwargs': {'url': url + '/alert', 'data': {'reminder': index}},
+        },
+    }
+    if id:
+        config['id'] = 'bench-{}'.format(index)
+    return config
+
+
+def _daemon(config_path, **kwargs):
+    kwargs.setdefault('scheduler_type', 'wheel')
+    return ReminderDaemon(blocking=False, config_path=config_path, watch_configs=False, **kwargs)
+
+
+def _write_configs(directory, size, url):
+    paths = []
+    for index in range(size):
+        subdirectory = os.path.join(directory, 'g{}'.format(index // 1000))
+        os.makedirs(subdirectory, exist_ok=True)
+        path = os.path.join(subdirectory, 'r{}.yaml'.format(index))
+        with open(path, 'w') as f:
+            yaml.safe_dump({'reminder': http_reminder(index, url, id=False)}, f)
+        paths.append(path)
+    return paths
+
+
+def _wait(predicate, timeout=120.0):
+    """Poll ``predicate`` until true; return seconds waited."""
+    started = time.perf_counter()
+    while not predicate() and time.perf_counter() - started < timeout:
+        time.sleep(0.01)
+    return time.perf_counter() - started
+
+
+def check_pipeline(size, stub, workers=16):
+    """
+    Run ``Reminder.check()`` once for each of ``size`` reminders from a thread pool,
+    through watcher fetch, coercion, evaluation and alert delivery.
+    """
+    directory = tempfile.mkdtemp(prefix='reminders-bench-')
+    daemon = _daemon(directory)
+    try:
+        started = time.perf_counter()
+        reminders = [daemon.add_reminder(http_reminder(index, stub.url), schedule=False) for index in range(size)]
+        build_seconds = time.perf_counter() - started
+        latencies = [0.0] * size
+
+        def check(index):
+            check_started = time.perf_counter()
+            reminders[index].check()
+            latencies[index] = time.perf_counter() - check_started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(check, range(size)))
+        seconds = time.perf_counter() - started
+        outbox = daemon.outbox
+        drain_seconds = _wait(lambda: outbox.delivered + outbox.failed >= outbox.enqueued)
+        stats = stub.stats()
+        return {
+            'ops': size,
+            'seconds': seconds,
+            'latencies': latencies,
+            'build_seconds': build_seconds,
+            'upstream_requests': stats['get'],
+            'cache_hits': daemon.response_cache.hits,
+            'cache_coalesced': daemon.response_cache.coalesced,
+            'alerts_enqueued': outbox.enqueued,
+            'alerts_delivered': outbox.delivered,
+            'alert_drain_seconds': drain_seconds,
+        }
+    finally:
+        daemon.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def startup_load(size, stub):
+    """Load ``size`` YAML files with :meth:`ReminderDaemon.load_all`, cold and then from the config cache."""
+    directory = tempfile.mkdtemp(prefix='reminders-bench-')
+    cache_path = os.path.join(tempfile.mkdtemp(prefix='reminders-bench-cache-'), 'configs.cache')
+    try:
+        _write_configs(directory, size, stub.url)
+        daemon = _daemon(directory, config_cache=cache_path)
+        report = daemon.load_all()
+        daemon.stop()
+        daemon = _daemon(directory, config_cache=cache_path)
+        cached = daemon.load_all()
+        daemon.stop()
+        return {
+            'ops': report.files,
+            'seconds': report.total,
+            'reminders': report.reminders,
+            'errors': len(report.errors),
+            'timings': report.timings,
+            'cached_seconds': cached.total,
+            'cached_timings': cached.timings,
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+        shutil.rmtree(os.path.dirname(cache_path), ignore_errors=True)
+
+
+def reload_churn(size, stub, edits=1000, seed=0):
+    """
+    Load ``size`` files, then apply ``edits`` changes picked at random: condition
+    edits (reloaded in place), watcher edits (reminder replaced) and delete/recreate.
+    """
+    directory = tempfile.mkdtemp(prefix='reminders-bench-')
+    daemon = _daemon(directory)
+    try:
+        paths = _write_configs(directory, size, stub.url)
+        daemon.load_all(use_processes=size >= 1000)
+        rng = random.Random(seed)
+        edits = min(edits, size * 3)
+        latencies = []
+        kinds = {'condition': 0, 'watcher': 0, 'recreate': 0}
+        started = time.perf_counter()
+        for edit in range(edits):
+            index = rng.randrange(size)
+            path = paths[index]
+            config = http_reminder(index, stub.url, id=False)
+            kind = ('condition', 'watcher', 'recreate')[edit % 3]
+            kinds[kind] += 1
+            if kind == 'condition':
+                config['condition'] = 'status >= {}'.format(rng.randrange(50, 100))
+            elif kind == 'watcher':
+                config['watcher']['request_kwargs']['url'] += '?v={}'.format(edit)
+            with open(path, 'w') as f:
+                yaml.safe_dump({'reminder': config}, f)
+            edit_started = time.perf_counter()
+            if kind == 'recreate':
+                daemon.remove_config(path)
+            daemon.load_yaml(path)
+            latencies.append(time.perf_counter() - edit_started)
+        seconds = time.perf_counter() - started
+        return {'ops': edits, 'seconds': seconds, 'latencies': latencies, 'reminders': len(daemon.registry),
+                'edits': kinds}
+    finally:
+        daemon.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def message_storm(size, stub, messages_per_reminder=10, max_messages=500000, max_workers=8):
+    """
+    Subscribe ``size`` MQTT reminders on an in-process broker, publish a burst of
+    messages and wait for the evaluation queue to drain.
+    """
+    directory = tempfile.mkdtemp(prefix='reminders-bench-')
+    broker = LocalBroker()
+    daemon = _daemon(directory, mqtt_kwargs={'client_factory': broker.client},
+                     evaluation_kwargs={'max_workers': max_workers})
+    try:
+        for index in range(size):
+            daemon.add_reminder({
+                'id': 'storm-{}'.format(index),
+                'condition': 'status > 98',
+                'watcher': {'type': 'MQTTWatcher', 'hostname': 'bench', 'schedules': [],
+                            'topic_kwargs': ['sensors/{}/value'.format(index)]},
+            }, schedule=False)
+        messages = min(size * messages_per_reminder, max_messages)
+        latencies = [0.0] * messages
+        started = time.perf_counter()
+        for message in range(messages):
+            publish_started = time.perf_counter()
+            broker.publish('sensors/{}/value'.format(message % size), str(message % 100))
+            latencies[message] = time.perf_counter() - publish_started
+        publish_seconds = time.perf_counter() - started
+        queue = daemon.evaluations
+        drain_seconds = _wait(lambda: queue.depth == 0 and queue.evaluated + queue.coalesced >= queue.received)
+        seconds = time.perf_counter() - started
+        return {
+            'ops': messages,
+            'seconds': seconds,
+            'latencies': latencies,
+            'publish_seconds': publish_seconds,
+            'drain_seconds': drain_seconds,
+            'received': queue.received,
+            'coalesced': queue.coalesced,
+            'evaluated': queue.evaluated,
+        }
+    finally:
+        daemon.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def _schedule(size, stub, scheduler_type, run_seconds=3.0):
+    directory = tempfile.mkdtemp(prefix='reminders-bench-')
+    daemon = _daemon(directory, scheduler_type=scheduler_type)
+    try:
+        latencies = [0.0] * size
+        started = time.perf_counter()
+        for index in range(size):
+            add_started = time.perf_counter()
+            daemon.add_reminder(http_reminder(index, stub.url))
+            latencies[index] = time.perf_counter() - add_started
+        seconds = time.perf_counter() - started
+        daemon.start()
+        time.sleep(run_seconds)
+        lag = daemon.metrics.histogram('reminders_scheduler_lag_seconds')
+        return {
+            'ops': size,
+            'seconds': seconds,
+            'latencies': latencies,
+            'jobs': len(daemon.scheduler.get_jobs()),
+            'fired': lag.count,
+            'lag_p50': lag.quantile(0.5),
+            'lag_p99': lag.quantile(0.99),
+        }
+    finally:
+        daemon.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def schedule_wheel(size, stub):
+    """Schedule check jobs of ``size`` reminders on the timing wheel and run them briefly."""
+    return _schedule(size, stub, 'wheel')
+
+
+def schedule_apscheduler(size, stub, max_size=20000):
+    """Schedule check jobs of ``size`` reminders on APScheduler and run them briefly."""
+    if size > max_size:
+        # Adding jobs to a running APScheduler is quadratic; beyond this a run takes many minutes
+        return {'skipped': 'size above {}'.format(max_size)}
+    return _schedule(size, stub, 'apscheduler')
+
+
+#: Scenarios by name, in the order they run.
+SCENARIOS = {
+    'check_pipeline': check_pipeline,
+    'startup_load': startup_load,
+    'reload_churn': reload_churn,
+    'message_storm': message_storm,
+    'schedule_wheel': schedule_wheel,
+    'schedule_apscheduler': schedule_apscheduler,
+}
@@ -0,0 +1,93 @@
+import json
+import multiprocessing
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """
+    ``GET /value/<n>`` returns ``{"value": n % 100}``, ``POST /alert`` accepts alerts
+    and ``GET /stats`` returns request counts.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, status, body=b''):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        if self.path == '/stats':
+            with server.lock:
+                stats = dict(server.stats)
+            self._send(200, json.dumps(stats).encode('utf8'))
+            return
+        if server.delay:
+            time.sleep(server.delay)
+        with server.lock:
+            server.stats['get'] += 1
+        try:
+            value = int(self.path.rsplit('/', 1)[-1]) % 100
+        except ValueError:
+            value = 0
+        self._send(200, json.dumps({'value': value}).encode('utf8'))
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        with self.server.lock:
+            self.server.stats['post'] += 1
+        self._send(204)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve(port_queue, delay):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    server.delay = delay
+    server.lock = threading.Lock()
+    server.stats = {'get': 0, 'post': 0}
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+class StubServer(object):
+    """Stub HTTP service standing in for watched APIs and alert receivers, run in its own process."""
+
+    def __init__(self, delay=0.0):
+        """
+        Create StubServer object.
+
+        :param float delay: Seconds each GET takes, to simulate upstream latency.
+        """
+        self.delay = delay
+        self.url = None
+        self._process = None
+
+    def start(self):
+        """Start server process and return its base url."""
+        context = multiprocessing.get_context('spawn')
+        ports = context.Queue()
+        self._process = context.Process(target=_serve, args=(ports, self.delay), daemon=True)
+        self._process.start()
+        self.url = 'http://127.0.0.1:{}'.format(ports.get(timeout=30))
+        return self.url
+
+    def stats(self):
+        """Return ``{'get': n, 'post': n}`` request counts."""
+        with urllib.request.urlopen(self.url + '/stats') as response:
+            return json.loads(response.read().decode('utf8'))
+
+    def stop(self):
+        """Stop server process."""
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
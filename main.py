@@ -1,4 +1,5 @@
 from reminders.reminder import Reminder, ReminderDaemon
+from reminders.supervisor import Supervisor
 import logging
 import logging.config
 import os
@@ -30,16 +31,30 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--debug", help="Enable debug logging",
                         action='store_true')
+    parser.add_argument("--config-cache", help="Cache parsed configs in this file to speed up restarts")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="Run reminders in this many worker processes")
+    parser.add_argument("--state-store",
+                        help="SQLite file persisting alert state; daemons sharing it split reminders and fail over")
+    parser.add_argument("--scheduler", choices=['apscheduler', 'wheel'], default='apscheduler',
+                        help="Scheduler backend; 'wheel' scales to very many jobs")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Serve Prometheus metrics on this port (shards use consecutive ports)")
     args = parser.parse_args()
     logger_level = logging.DEBUG if args.debug else logging.INFO
-    reminder_daemon = ReminderDaemon(timezone='US/Eastern', config_path='./reminders/config/reminders', logger_level=logger_level)
+    store_kwargs = {'path': args.state_store} if args.state_store else None
+    if args.shards > 1:
+        supervisor = Supervisor(config_path='./reminders/config/reminders', shards=args.shards,
+                                daemon_kwargs={'timezone': 'US/Eastern', 'store_kwargs': store_kwargs,
+                                               'scheduler_type': args.scheduler, 'metrics_port': args.metrics_port}, logger_level=logger_level)
+        supervisor.run()
+        return
+    reminder_daemon = ReminderDaemon(timezone='US/Eastern', config_path='./reminders/config/reminders', logger_level=logger_level,
+                                     config_cache=args.config_cache, store_kwargs=store_kwargs,
+                                     scheduler_type=args.scheduler, metrics_port=args.metrics_port)
     if args.debug:
         reminder_daemon.logger.setLevel(logging.DEBUG)
-    for _, _, files in os.walk(reminder_daemon.config_path):
-        for file_ in files:
-           filename, extension = os.path.splitext(file_)
-           if extension in ['.yaml', '.yml']:
-               reminder_daemon.load_yaml(file_)
+    reminder_daemon.load_all()
     reminder_daemon.start()
 
 if __name__ == '__main__':
@@ -1,11 +1,19 @@
-import logging
-import requests
 import json
+import time
+from datetime import datetime, timedelta, timezone
+from .components import component_for
+from .sessions import SessionPool
+from .outbox import AlertOutbox
+from .logs import Lazy, logger_for
 
 class Alerter(object):
     """Base Alert object to handle reminder notifications."""
+    #: ``True`` if payloads for the same destination may be delivered together.
+    batch = False
+    #: Identity of where alerts are sent, used to group batches.
+    destination = None
 
-    def __init__(self, reminder, message, notifiers=None, repeat_interval={}, max_repeat=0,
+    def __init__(self, reminder, message, notifiers=None, repeat_interval=None, max_repeat=0,
                  alert_on_activate=True, *args, **kwargs):
         """
         Create Alerter object.
@@ -22,50 +30,118 @@ class Alerter(object):
             When ``True`` alert will be emitted as soon as activated rather than
             waiting for first scheduled job to trigger.
         """
-        self.logger = logging.getLogger(__name__)
+        self.logger = logger_for(reminder, __name__)
         self.reminder = reminder
         self.message = message
-        self.repeat_interval = repeat_interval
+        self.repeat_interval = dict(repeat_interval or {})
         self.repeat_interval.update({'trigger': 'interval', 'func': self.alert})
         self.max_repeat = max_repeat
         self.current_repeats = 0
+        self.last_alert = None
         self.alert_on_activate = alert_on_activate
         self.jobs = []
         self.active = False
-        self.logger.setLevel(self.reminder._logger.level)
-        self.logger.debug('New Alerter created: {}'.format(self.__dict__))
+        self.logger.debug('New Alerter created: %s', Lazy(vars, self))
 
     def alert(self):
         """Send alert"""
+        daemon = self.reminder._daemon
+        if daemon is not None and not daemon.owns(self.reminder):
+            self.logger.debug('suspending alerts because reminder lease was lost')
+            self.suspend()
+            return
         self.logger.debug('emitting alert')
         if self.current_repeats < self.max_repeat:
             self.current_repeats += 1
+            self.last_alert = time.time()
+            self._save_state()
         else:
             self.logger.debug('deactivating alerts due to max_repeat')
             self.deactivate()
 
+    def deliver(self, payloads):
+        """
+        Deliver payloads queued through :class:`~reminders.outbox.AlertOutbox`.
+        Raise to have the outbox retry delivery.
+
+        :param list payloads: Payloads passed to enqueue, in order.
+        """
+        raise NotImplementedError('deliver() not implemented by {}'.format(type(self).__name__))
+
     def activate(self):
-        """Activate alerts"""
+        """Activate alerts. Does nothing if already active."""
+        if self.active:
+            return
         self.active = True
         self.logger.debug('alert activated')
         if self.alert_on_activate:
             self.alert()
-        # TODO Make job scheduling better handled without jumping through multiple classes
-        job = self.reminder._daemon.scheduler.add_job(**self.repeat_interval)
+            if not self.active:
+                # max_repeat already reached by the initial alert
+                return
+        self._add_repeat_job()
+        self._save_state()
+
+    def _add_repeat_job(self, next_run_time=None):
+        job = dict(self.repeat_interval)
+        if next_run_time is not None:
+            job['next_run_time'] = next_run_time
+        job = self.reminder._daemon.add_job(self.reminder, **job)
         self.logger.debug('alert job added to scheduler')
         self.jobs.append(job)
-        self.reminder.job_ids.append(job.id)
+
+    def _remove_jobs(self):
+        for job in self.jobs:
+            self.reminder._daemon.remove_job(self.reminder, job.id)
+        self.jobs = []
+        self.logger.debug('all alert jobs removed from scheduler')
 
     def deactivate(self):
         """Deactivate all existing alerts."""
         self.active = False
         self.logger.debug('alert deactivated')
         self.current_repeats = 0
-        # TODO Handle job addition/removal better
-        for job in self.jobs:
-            self.reminder._daemon.scheduler.remove_job(job.id)
-            self.reminder.job_ids.remove(job.id)
-        self.logger.debug('all alert jobs removed from scheduler')
+        self._remove_jobs()
+        self._save_state()
+
+    def suspend(self):
+        """
+        Stop alerting without changing persisted state, so the node taking over
+        the reminder can :meth:`restore` it.
+        """
+        self.active = False
+        self._remove_jobs()
+
+    @property
+    def state(self):
+        """Alert state persisted across restarts and failover."""
+        return {'active': self.active, 'current_repeats': self.current_repeats, 'last_alert': self.last_alert}
+
+    def _save_state(self):
+        store = getattr(self.reminder._daemon, 'state_store', None)
+        if store is not None:
+            store.put_state(self.reminder.id, self.state)
+
+    def restore(self, state):
+        """
+        Resume from persisted state without emitting an alert.
+        An active alert's next repeat is scheduled one interval after its last alert.
+
+        :param dict state: State as returned by :attr:`state`.
+        """
+        self.current_repeats = state.get('current_repeats', 0)
+        self.last_alert = state.get('last_alert')
+        if not state.get('active') or self.active:
+            return
+        self.active = True
+        next_run_time = None
+        interval = timedelta(**{key: value for key, value in self.repeat_interval.items()
+                                if key in ('weeks', 'days', 'hours', 'minutes', 'seconds')})
+        if self.last_alert is not None and interval:
+            due = max(self.last_alert + interval.total_seconds(), time.time())
+            next_run_time = datetime.fromtimestamp(due, timezone.utc)
+        self._add_repeat_job(next_run_time)
+        self.logger.debug('alert restored: %s', state)
 
 
 class LogAlerter(Alerter):
@@ -78,13 +154,13 @@ class LogAlerter(Alerter):
         """Emit alert to log"""
         super().alert()
         if self.active:
-            self.logger.warn(self.message)
+            self.logger.warning(self.message)
 
 
 class HTTPAlerter(Alerter):
     """Alerts via POST to HTTP REST interface"""
 
-    def __init__(self, request_kwargs, json_params=True, *args, **kwargs):
+    def __init__(self, request_kwargs, json_params=True, batch=False, *args, **kwargs):
         """
         Create HTTPAlerter object
         
@@ -92,15 +168,39 @@ class HTTPAlerter(Alerter):
             Dictionary containing keyword arguments to be passed to requests.post()
         :param bool json_params:
             Indicates if request_kwargs['data'] should be transmitted as JSON string.
+        :param bool batch:
+            Combine alerts for the same destination into one POST whose body is a JSON
+            list of the individual ``data`` payloads. Requires ``json_params``.
         """
         super().__init__(*args, **kwargs)
+        if batch and not json_params:
+            raise ValueError('HTTPAlerter batch requires json_params')
+        self.json_params = json_params
+        self.batch = batch
         if json_params and request_kwargs.get('data'):
             request_kwargs['data'] = json.dumps(request_kwargs['data'])
         self.request_kwargs = request_kwargs
+        self.destination = json.dumps({k: v for k, v in request_kwargs.items() if k != 'data'},
+                                      sort_keys=True, default=str)
 
     def alert(self):
-        """Emit Alert"""
+        """Queue alert for delivery by the daemon's :class:`~reminders.outbox.AlertOutbox`."""
         super().alert()
         if self.active:
-            self.logger.debug('posting HTTPAlert: {}'.format(self.request_kwargs))
-            requests.post(**self.request_kwargs)
+            self.logger.debug('queueing HTTPAlert: %s', self.request_kwargs)
+            component_for(self.reminder, 'outbox', AlertOutbox).enqueue(self, self.request_kwargs)
+
+    def deliver(self, payloads):
+        """
+        POST queued alerts.
+
+        :raises requests.HTTPError: on 429 or 5xx responses so delivery is retried.
+        """
+        request_kwargs = payloads[0]
+        if len(payloads) > 1:
+            request_kwargs = dict(request_kwargs, data='[{}]'.format(','.join(p.get('data') or 'null' for p in payloads)))
+        response = component_for(self.reminder, 'session_pool', SessionPool).post(**request_kwargs)
+        if response.status_code == 429 or response.status_code >= 500:
+            response.raise_for_status()
+        elif response.status_code >= 400:
+            self.logger.error('HTTPAlert rejected with status %s', response.status_code)
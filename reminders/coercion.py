@@ -0,0 +1,161 @@
+import re
+from datetime import datetime
+from functools import lru_cache
+from dateparser import parse as dateparse
+
+_NUMBER_RE = re.compile(r'^[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?$')
+_ISO_RE = re.compile(r'^\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?(Z|[+-]\d{2}:?\d{2})?$')
+_BOOLEANS = {'true': True, 'false': False, 'yes': True, 'no': False, 'on': True, 'off': False}
+_DATEPARSE_SETTINGS = {'STRICT_PARSING': True}
+
+#: Supported values for a reminder's ``status_type``.
+STATUS_TYPES = ('auto', 'number', 'bool', 'datetime', 'string')
+
+
+def parse_number(value):
+    """
+    Return int or float for numeric string.
+
+    :raises ValueError: if value is not numeric.
+    """
+    if not _NUMBER_RE.match(value):
+        raise ValueError('not a number: {!r}'.format(value))
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def parse_bool(value):
+    """
+    Return bool for boolean string such as ``true``/``false`` or ``on``/``off``.
+
+    :raises ValueError: if value is not a recognized boolean.
+    """
+    try:
+        return _BOOLEANS[value.lower()]
+    except KeyError:
+        raise ValueError('not a boolean: {!r}'.format(value))
+
+
+def parse_iso8601(value):
+    """
+    Return datetime for ISO-8601 string.
+
+    :raises ValueError: if value is not ISO-8601.
+    """
+    if not _ISO_RE.match(value):
+        raise ValueError('not an ISO-8601 timestamp: {!r}'.format(value))
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    elif len(value) > 5 and value[-5] in '+-' and value[-3] != ':':
+        value = value[:-2] + ':' + value[-2:]
+    return datetime.fromisoformat(value)
+
+
+_parse_iso8601_cached = lru_cache(maxsize=4096)(parse_iso8601)
+
+
+@lru_cache(maxsize=4096)
+def _not_a_date(value):
+    # Whether dateparser accepts a string does not depend on the current time, only the
+    # datetime it returns does ("2 hours ago"), so only the rejections are cached
+    return dateparse(value, settings=_DATEPARSE_SETTINGS) is None
+
+
+def _dateparse(value):
+    if _not_a_date(value):
+        return None
+    return dateparse(value, settings=_DATEPARSE_SETTINGS)
+
+
+def parse_datetime(value):
+    """
+    Return datetime for string, trying ISO-8601 before falling back to dateparser.
+
+    :raises ValueError: if value can not be parsed as a date.
+    """
+    try:
+        return _parse_iso8601_cached(value)
+    except ValueError:
+        pass
+    d = _dateparse(value)
+    if d is None:
+        raise ValueError('not a date: {!r}'.format(value))
+    return d
+
+
+@lru_cache(maxsize=4096)
+def _coerce_fast(value):
+    """Return value parsed as bool, number or ISO-8601, or ``_UNPARSED``."""
+    lowered = value.lower()
+    if lowered in ('true', 'false'):
+        return lowered == 'true'
+    for parser in (parse_number, parse_iso8601):
+        try:
+            return parser(value)
+        except ValueError:
+            pass
+    return _UNPARSED
+
+
+def _coerce_auto(value):
+    parsed = _coerce_fast(value)
+    if parsed is not _UNPARSED:
+        return parsed
+    d = _dateparse(value)
+    return d if d else value
+
+
+_UNPARSED = object()
+_coerce_typed = {
+    'number': lru_cache(maxsize=4096)(parse_number),
+    'bool': lru_cache(maxsize=4096)(parse_bool),
+    'datetime': parse_datetime,
+    'string': str,
+}
+
+
+def coerce_status(value, status_type=None):
+    """
+    Convert raw watcher value into a type conditions can compare against.
+
+    With no ``status_type`` (or ``auto``) strings are tried as ``true``/``false``, number
+    and ISO-8601 timestamp in that order, with dateparser as the last resort; anything
+    unparsable is returned unchanged. Non-string values pass through as-is.
+    Numbers, booleans and ISO-8601 timestamps are cached, so repeated values cost a
+    dictionary lookup. Dates parsed by dateparser are not, as relative ones such as
+    ``2 hours ago`` depend on the current time.
+
+    Dicts of named values (see :class:`~reminders.watchers.HTTPWatcher`) are coerced
+    per field; ``status_type`` may then be a dict of field name to type.
+
+    :param value: Raw value returned by watcher.
+    :param status_type: One of :data:`STATUS_TYPES`, or dict of those per field.
+    :raises ValueError:
+        if value can not be converted to declared ``status_type``, or ``status_type``
+        is a dict and value is not.
+    """
+    if isinstance(value, dict):
+        types = status_type if isinstance(status_type, dict) else {}
+        default = None if isinstance(status_type, dict) else status_type
+        return {name: coerce_status(v, types.get(name, default)) for name, v in value.items()}
+    if value is None:
+        return None
+    if isinstance(status_type, dict):
+        raise ValueError('per-field status_type requires named values, got {!r}'.format(value))
+    if isinstance(value, bytes):
+        value = value.decode('utf8')
+    if not status_type or status_type == 'auto':
+        return _coerce_auto(value) if isinstance(value, str) else value
+    if status_type == 'string':
+        return str(value)
+    if isinstance(value, str):
+        return _coerce_typed[status_type](value.strip())
+    if status_type == 'number' and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    if status_type == 'bool' and isinstance(value, bool):
+        return value
+    if status_type == 'datetime' and isinstance(value, datetime):
+        return value
+    raise ValueError('unable to convert {!r} to {}'.format(value, status_type))
@@ -0,0 +1,46 @@
+import atexit
+import logging
+import threading
+
+_defaults = {}
+_defaults_lock = threading.Lock()
+
+
+def component_for(reminder, attr, factory):
+    """
+    Return the component a reminder's daemon holds as ``attr``, such as its
+    ``session_pool`` or ``outbox``. Reminders without a daemon share one
+    process-wide instance per ``attr``, created by calling ``factory`` and
+    stopped when the interpreter exits.
+
+    :param Reminder reminder: Reminder whose daemon owns the component.
+    :param str attr: Attribute of :class:`~reminders.reminder.ReminderDaemon` holding the component.
+    :param callable factory: Creates the process-wide instance, usually the component's class.
+    """
+    component = getattr(getattr(reminder, '_daemon', None), attr, None)
+    if component is not None:
+        return component
+    component = _defaults.get(attr)
+    if component is None:
+        with _defaults_lock:
+            component = _defaults.get(attr)
+            if component is None:
+                component = _defaults[attr] = factory()
+    return component
+
+
+@atexit.register
+def _stop_defaults():
+    with _defaults_lock:
+        components = list(_defaults.values())
+        _defaults.clear()
+    # Stop everything that dispatches work before closing what that work uses, e.g. the outbox before sessions
+    for method in ('stop', 'close'):
+        for component in components:
+            stop = getattr(component, method, None)
+            if stop is None:
+                continue
+            try:
+                stop()
+            except Exception:
+                logging.getLogger(__name__).error('Error stopping %s', type(component).__name__, exc_info=True)
@@ -0,0 +1,92 @@
+import ast
+import threading
+from simpleeval import SimpleEval, InvalidExpression
+
+_compiled = {}
+_lock = threading.Lock()
+
+#: Names always available to conditions in addition to those supplied by Reminder.
+BUILTIN_NAMES = frozenset(('True', 'False', 'None'))
+
+
+class InvalidCondition(ValueError):
+    """Raised when a reminder condition can not be compiled."""
+
+
+def compile_condition(condition, names=()):
+    """
+    Return parsed expression tree for ``condition``.
+    Trees are cached process-wide by condition text so identical conditions
+    across reminders share one compiled form.
+
+    :param str condition: Condition expression to compile.
+    :param names:
+        Names the condition is allowed to reference.
+        Empty to skip name validation.
+    :raises InvalidCondition: if condition is not a valid expression or uses unknown names.
+    """
+    node = _compiled.get(condition)
+    if node is None:
+        try:
+            node = SimpleEval.parse(str(condition))
+        except (SyntaxError, InvalidExpression) as e:
+            raise InvalidCondition('Unable to compile condition {!r}: {}'.format(condition, e)) from e
+        with _lock:
+            node = _compiled.setdefault(condition, node)
+    if names:
+        unknown = referenced_names(node) - BUILTIN_NAMES - set(names)
+        if unknown:
+            raise InvalidCondition('Condition {!r} uses unknown names: {}'.format(condition, ', '.join(sorted(unknown))))
+    return node
+
+
+def referenced_names(node):
+    """
+    Return set of names used in compiled condition.
+
+    :param node: Tree returned by :func:`compile_condition`.
+    :rtype: set
+    """
+    return {n.id for n in ast.walk(node) if isinstance(n, ast.Name)}
+
+
+def _number(node):
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value = _number(node.operand)
+        return -value if value is not None and isinstance(node.op, ast.USub) else value
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return node.value
+    return None
+
+
+def numeric_thresholds(node):
+    """
+    Return names compared directly against numbers in compiled condition,
+    such as ``status`` and ``100`` in ``status > 100``.
+
+    :param node: Tree returned by :func:`compile_condition`.
+    :returns: ``(name, number)`` pairs.
+    :rtype: list
+    """
+    thresholds = []
+    for compare in ast.walk(node):
+        if not isinstance(compare, ast.Compare):
+            continue
+        operands = [compare.left] + compare.comparators
+        for left, right in zip(operands, operands[1:]):
+            for name, value in ((left, right), (right, left)):
+                number = _number(value)
+                if isinstance(name, ast.Name) and number is not None:
+                    thresholds.append((name.id, number))
+    return thresholds
+
+
+def cache_size():
+    """Return number of distinct compiled conditions."""
+    return len(_compiled)
+
+
+def clear_cache():
+    """Remove all compiled conditions from cache."""
+    with _lock:
+        _compiled.clear()
@@ -0,0 +1,119 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DelayedDispatcher(object):
+    """
+    Runs items on a worker pool once their delay has passed.
+    Items wait in a heap ordered by due time; a dispatcher thread hands each due
+    item to ``handler`` as soon as a worker is free, so items not yet started stay
+    in the heap where their owner can still merge into them.
+    Shared by :class:`~reminders.evaluation.EvaluationQueue` and :class:`~reminders.outbox.AlertOutbox`.
+    """
+
+    def __init__(self, handler, max_workers=4, name='reminders', on_due=None):
+        """
+        Create DelayedDispatcher object.
+
+        :param callable handler: Called with each due item on a worker thread.
+        :param int max_workers: Number of worker threads, and so of items handled at once.
+        :param str name: Prefix of thread names.
+        :param callable on_due:
+            Called with each item as it leaves the heap, while :attr:`lock` is held,
+            so owners can stop merging into it.
+        """
+        self._logger = logging.getLogger(__name__)
+        self.handler = handler
+        self.max_workers = max_workers
+        self.name = name
+        self.on_due = on_due
+        #: Guards the heap. Reentrant, so owners can hold it around :meth:`push` to update their own state.
+        self.lock = threading.Condition(threading.RLock())
+        self._heap = []
+        self._sequence = itertools.count()
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._executor = None
+        self._thread = None
+        self._running = False
+
+    @property
+    def running(self):
+        """``True`` between :meth:`start` and :meth:`stop`."""
+        return self._running
+
+    @property
+    def depth(self):
+        """Number of items waiting to be handled."""
+        return len(self._heap)
+
+    def start(self):
+        """Start dispatcher thread and worker pool."""
+        with self.lock:
+            if self._running:
+                return
+            self._running = True
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+            self._thread = threading.Thread(target=self._dispatch, name=self.name + '-dispatch', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stop dispatching and wait for items being handled.
+
+        :returns: Items that were still waiting, which are dropped.
+        :rtype: list
+        """
+        with self.lock:
+            if not self._running:
+                return []
+            self._running = False
+            dropped = [item for _, _, item in self._heap]
+            self._heap.clear()
+            self.lock.notify()
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+        return dropped
+
+    def push(self, item, delay=0.0):
+        """
+        Queue ``item`` to be handled after ``delay`` seconds. Dropped if the dispatcher is not running.
+
+        :param item: Passed to ``handler``.
+        :param float delay: Seconds from now.
+        :returns: ``True`` if item was queued.
+        :rtype: bool
+        """
+        with self.lock:
+            if not self._running:
+                return False
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._sequence), item))
+            self.lock.notify()
+            return True
+
+    def _dispatch(self):
+        while True:
+            # Wait for a free worker before taking an item, so waiting items stay in the heap
+            self._slots.acquire()
+            with self.lock:
+                while self._running and (not self._heap or self._heap[0][0] > time.monotonic()):
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self.lock.wait(timeout)
+                if not self._running:
+                    self._slots.release()
+                    return
+                _, _, item = heapq.heappop(self._heap)
+                if self.on_due:
+                    self.on_due(item)
+            self._executor.submit(self._run, item)
+
+    def _run(self, item):
+        try:
+            self.handler(item)
+        except Exception:
+            self._logger.error('Error handling %s', self.name, exc_info=True)
+        finally:
+            self._slots.release()
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import threading
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+def aiohttp_request_kwargs(request_kwargs):
+    """
+    Translate requests-style keyword arguments to their aiohttp equivalents.
+
+    :param dict request_kwargs: Keyword arguments as passed to requests.get()
+    :rtype: dict
+    """
+    kwargs = dict(request_kwargs)
+    timeout = kwargs.pop('timeout', None)
+    if isinstance(timeout, (tuple, list)):
+        kwargs['timeout'] = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+    elif timeout is not None:
+        kwargs['timeout'] = aiohttp.ClientTimeout(total=timeout)
+    auth = kwargs.pop('auth', None)
+    if isinstance(auth, (tuple, list)):
+        kwargs['auth'] = aiohttp.BasicAuth(*auth)
+    if kwargs.pop('verify', True) is False:
+        kwargs['ssl'] = False
+    for unsupported in ('cert', 'proxies', 'stream'):
+        kwargs.pop(unsupported, None)
+    return kwargs
+
+
+class AsyncEngine(object):
+    """Runs reminder checks concurrently on a single asyncio event loop."""
+
+    def __init__(self, concurrency=100, limit_per_host=0, timeout=10, *args, **kwargs):
+        """
+        Create AsyncEngine object.
+
+        :param int concurrency: Maximum number of checks in flight at once.
+        :param int limit_per_host:
+            Maximum number of simultaneous connections per host. ``0`` for no limit.
+        :param timeout: Default total timeout in seconds for HTTP requests.
+        :raises ImportError: if aiohttp is not installed.
+        """
+        if aiohttp is None:
+            # Without it every HTTP poll would run in the loop's few executor threads
+            raise ImportError('aiohttp is required for async execution; install python-reminders[async]')
+        self._logger = logging.getLogger(__name__)
+        self.concurrency = concurrency
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.loop = None
+        self.http_session = None
+        self.submitted = 0
+        self.skipped = 0
+        self._semaphore = None
+        self._thread = None
+        self._inflight = set()
+        self._inflight_lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.loop is not None and self.loop.is_running()
+
+    def start(self):
+        """Start event loop in a dedicated thread."""
+        if self.running:
+            return
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(started,), name='reminders-async', daemon=True)
+        self._thread.start()
+        started.wait()
+        self._logger.debug('async engine started with concurrency %s', self.concurrency)
+
+    def _run(self, started):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._setup())
+        self.loop.call_soon(started.set)
+        self.loop.run_forever()
+
+    async def _setup(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.limit_per_host)
+        # Shared by every reminder, so don't carry cookies from one reminder's responses to another's requests
+        self.http_session = aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar(),
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    def submit(self, reminder):
+        """
+        Schedule ``reminder.async_check()`` on the event loop without blocking caller.
+        Checks for a reminder that still has one in flight are skipped.
+
+        :param Reminder reminder: Reminder to check.
+        :returns: Future for the check or ``None`` if skipped.
+        :rtype: concurrent.futures.Future
+        """
+        key = id(reminder)
+        with self._inflight_lock:
+            if key in self._inflight:
+                self.skipped += 1
+                self._logger.debug('skipping check because previous check is still running')
+                return None
+            self._inflight.add(key)
+            self.submitted += 1
+        return asyncio.run_coroutine_threadsafe(self._check(reminder), self.loop)
+
+    async def _check(self, reminder):
+        try:
+            async with self._semaphore:
+                await reminder.async_check()
+        except Exception:
+            self._logger.error('Error running async check', exc_info=True)
+        finally:
+            with self._inflight_lock:
+                self._inflight.discard(id(reminder))
+
+    def stop(self):
+        """Close HTTP session and stop event loop."""
+        if not self.running:
+            return
+        if self.http_session is not None:
+            asyncio.run_coroutine_threadsafe(self.http_session.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+        self.loop = None
@@ -0,0 +1,74 @@
+import logging
+from .dispatch import DelayedDispatcher
+
+
+class EvaluationQueue(object):
+    """
+    Debounced queue of reminder checks for push-based watchers.
+    A reminder is queued at most once at a time: notifications arriving while it
+    is waiting are coalesced, and the check reads the latest status when it runs.
+    Checks run on a worker pool rather than on the thread that delivered the event.
+    """
+
+    def __init__(self, max_workers=4, debounce=0.0, *args, **kwargs):
+        """
+        Create EvaluationQueue object.
+
+        :param int max_workers: Number of worker threads running checks.
+        :param float debounce:
+            Default seconds to wait after the first notification before checking,
+            collapsing any notifications received in the meantime.
+        """
+        self._logger = logging.getLogger(__name__)
+        self.max_workers = max_workers
+        self.debounce = debounce
+        self.received = 0
+        self.coalesced = 0
+        self.evaluated = 0
+        self._pending = {}
+        self._dispatcher = DelayedDispatcher(self._evaluate, max_workers, 'reminders-eval', on_due=self._due)
+
+    def start(self):
+        """Start dispatcher thread and worker pool."""
+        self._dispatcher.start()
+
+    def stop(self):
+        """Stop dispatching and wait for running checks to finish. Queued checks are dropped."""
+        with self._dispatcher.lock:
+            self._pending.clear()
+        self._dispatcher.stop()
+
+    @property
+    def depth(self):
+        """Number of reminders waiting to be checked."""
+        return len(self._pending)
+
+    def submit(self, reminder, debounce=None):
+        """
+        Queue check of reminder unless one is already waiting.
+
+        :param Reminder reminder: Reminder to check.
+        :param float debounce: Seconds to wait before checking; defaults to queue's debounce.
+        """
+        if not self._dispatcher.running:
+            self.start()
+        delay = self.debounce if debounce is None else debounce
+        with self._dispatcher.lock:
+            self.received += 1
+            key = id(reminder)
+            if key in self._pending:
+                self.coalesced += 1
+                return
+            self._pending[key] = reminder
+            self._dispatcher.push(reminder, delay)
+
+    def _due(self, reminder):
+        # Notifications from now on queue a new check, as this one may already have read the status
+        self._pending.pop(id(reminder), None)
+
+    def _evaluate(self, reminder):
+        try:
+            reminder.check()
+            self.evaluated += 1
+        except Exception:
+            self._logger.error('Error evaluating reminder', exc_info=True)
@@ -0,0 +1,288 @@
+import hashlib
+import logging
+import os
+import pickle
+import time
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import yaml
+
+#: File extensions treated as reminder configs.
+CONFIG_EXTENSIONS = ('.yaml', '.yml')
+
+#: libyaml based loader when PyYAML was built with it, pure Python otherwise.
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+ParsedConfig = namedtuple('ParsedConfig', ['path', 'digest', 'config', 'error'])
+ParsedConfig.__doc__ = """
+Result of reading one config file.
+``config`` is the list of YAML documents in the file; ``error`` is set instead on failure.
+"""
+
+
+def discover_configs(config_path):
+    """
+    Return absolute paths of all config files below ``config_path``.
+
+    :param str config_path: Directory to search recursively.
+    :rtype: list
+    """
+    paths = []
+    for root, _, files in os.walk(config_path):
+        for file_ in files:
+            if os.path.splitext(file_)[1] in CONFIG_EXTENSIONS:
+                paths.append(os.path.abspath(os.path.join(root, file_)))
+    return sorted(paths)
+
+
+def read_config(path, known_digest=None):
+    """
+    Read, hash and parse config file.
+    Module level so it can run in worker processes.
+
+    :param str path: Absolute path of config file.
+    :param str known_digest:
+        Digest of an already parsed version of the file. If the contents still
+        hash to it, parsing is skipped and ``config`` is ``None``.
+    :rtype: ParsedConfig
+    """
+    try:
+        with open(path, 'rb') as f:
+            content = f.read()
+        digest = hashlib.sha256(content).hexdigest()
+        if digest == known_digest:
+            return ParsedConfig(path, digest, None, None)
+        documents = [document for document in yaml.load_all(content, Loader=SafeLoader) if document]
+        return ParsedConfig(path, digest, documents, None)
+    except (OSError, yaml.YAMLError) as e:
+        return ParsedConfig(path, None, None, '{}: {}'.format(type(e).__name__, e))
+
+
+def reminder_entries(path, documents):
+    """
+    Return reminder configs defined in a config file, keyed by reminder id.
+
+    Each YAML document may hold a single ``reminder`` mapping, a ``reminders`` list,
+    or both. Ids given in a reminder's ``id`` key only need to be unique within the
+    file; they are qualified as ``<path>#<id>``. Reminders without an id use their
+    position in the file, except a file holding a single reminder, which keeps the
+    file path as id.
+
+    :param str path: Absolute path of config file.
+    :param list documents: Parsed YAML documents.
+    :rtype: OrderedDict
+    :raises ValueError: if the file structure is invalid or ids are duplicated.
+    """
+    configs = []
+    for document in documents:
+        if not isinstance(document, dict):
+            raise ValueError('config document must be a mapping, not {}'.format(type(document).__name__))
+        if document.get('reminder'):
+            configs.append(document['reminder'])
+        reminders = document.get('reminders') or []
+        if not isinstance(reminders, list):
+            raise ValueError('"reminders" must be a list')
+        configs.extend(reminders)
+    entries = OrderedDict()
+    for index, config in enumerate(configs):
+        if not isinstance(config, dict):
+            raise ValueError('reminder #{} must be a mapping'.format(index))
+        local_id = config.get('id')
+        if local_id is not None:
+            reminder_id = '{}#{}'.format(path, local_id)
+        elif len(configs) == 1:
+            reminder_id = path
+        else:
+            reminder_id = '{}#{}'.format(path, index)
+        if reminder_id in entries:
+            raise ValueError('duplicate reminder id {!r}'.format(local_id))
+        entries[reminder_id] = dict(config, id=reminder_id)
+    return entries
+
+
+def _read_config(args):
+    return read_config(*args)
+
+
+def read_configs(paths, workers=None, use_processes=True, min_parallel=64, cache=None):
+    """
+    Read many config files in parallel.
+
+    :param list paths: Absolute paths of config files.
+    :param int workers: Number of workers. Defaults to the number of CPUs.
+    :param bool use_processes:
+        Parse in a process pool, avoiding the GIL for pure Python YAML parsing.
+        Otherwise a thread pool is used.
+    :param int min_parallel: Below this many files parsing is done inline.
+    :param ConfigCache cache: Cache of previously parsed files to skip parsing where possible.
+    :returns: ParsedConfig for each path, in order.
+    :rtype: list
+    """
+    results = {}
+    pending = []
+    for path in paths:
+        cached = cache.get(path) if cache is not None else None
+        if cached is not None:
+            results[path] = cached
+        else:
+            pending.append((path, cache.digest(path) if cache is not None else None))
+    if len(pending) < min_parallel:
+        parsed_configs = [read_config(*args) for args in pending]
+    else:
+        workers = workers or os.cpu_count() or 1
+        Executor = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with Executor(max_workers=workers) as executor:
+            parsed_configs = list(executor.map(_read_config, pending,
+                                               chunksize=max(1, len(pending) // (workers * 4))))
+    for parsed in parsed_configs:
+        if cache is not None and not parsed.error:
+            if parsed.config is None:
+                parsed = cache.get(parsed.path, check_stat=False)
+            cache.put(parsed)
+        results[parsed.path] = parsed
+    return [results[path] for path in paths]
+
+
+class ConfigCache(object):
+    """
+    On-disk cache of parsed config files, keyed by path and validated by
+    modification time, size and content hash.
+    Each config is stored pickled so the cache file is compact and fast to load.
+
+    .. note:: The cache file must only be writable by the daemon, as it is unpickled on load.
+    """
+    #: Bumped whenever the cache layout changes so stale caches are ignored.
+    version = 2
+
+    def __init__(self, path):
+        """
+        Create ConfigCache object.
+
+        :param str path: Location of cache file.
+        """
+        self._logger = logging.getLogger(__name__)
+        self.path = path
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+
+    def load(self):
+        """Read cache file, starting empty if it is missing, unreadable or from another version."""
+        try:
+            with open(self.path, 'rb') as f:
+                version, entries = pickle.load(f)
+        except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError) as e:
+            self._logger.debug('not using config cache %s: %s', self.path, e)
+            return
+        if version == self.version:
+            self.entries = entries
+
+    def save(self):
+        """Write cache file atomically if it changed."""
+        if not self.dirty:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((self.version, self.entries), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    def get(self, path, check_stat=True):
+        """
+        Return cached ParsedConfig for path if file is unchanged.
+
+        :param str path: Absolute path of config file.
+        :param bool check_stat:
+            Compare modification time and size with the file on disk.
+            Pass ``False`` once the content hash is known to match.
+        :rtype: ParsedConfig
+        """
+        entry = self.entries.get(path)
+        if entry is None:
+            self.misses += 1
+            return None
+        mtime_ns, size, digest, data = entry
+        if check_stat:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self.misses += 1
+                return None
+            if (stat.st_mtime_ns, stat.st_size) != (mtime_ns, size):
+                self.misses += 1
+                return None
+        self.hits += 1
+        return ParsedConfig(path, digest, pickle.loads(data), None)
+
+    def digest(self, path):
+        """Return content hash of cached version of path, if any."""
+        entry = self.entries.get(path)
+        return entry[2] if entry is not None else None
+
+    def put(self, parsed):
+        """
+        Store parsed config.
+        The config is serialized immediately, so later changes to it are not cached.
+
+        :param ParsedConfig parsed: Successfully parsed config.
+        """
+        try:
+            stat = os.stat(parsed.path)
+        except OSError:
+            return
+        entry = (stat.st_mtime_ns, stat.st_size, parsed.digest,
+                 pickle.dumps(parsed.config, protocol=pickle.HIGHEST_PROTOCOL))
+        if self.entries.get(parsed.path) != entry:
+            self.entries[parsed.path] = entry
+            self.dirty = True
+
+    def discard(self, path):
+        """Remove path from cache."""
+        if self.entries.pop(path, None) is not None:
+            self.dirty = True
+
+    def prune(self, paths):
+        """Remove cached entries for files not in ``paths``."""
+        for path in set(self.entries) - set(paths):
+            self.discard(path)
+
+
+class LoadReport(object):
+    """Outcome and per-phase timings of a bulk config load."""
+
+    def __init__(self):
+        self.files = 0
+        self.reminders = 0
+        self.skipped = 0
+        self.errors = []
+        self.timings = OrderedDict()
+
+    def time(self, phase):
+        """Return context manager adding elapsed seconds to ``timings[phase]``."""
+        return _PhaseTimer(self, phase)
+
+    @property
+    def total(self):
+        return sum(self.timings.values())
+
+    def __str__(self):
+        phases = ', '.join('{} {:.3f}s'.format(phase, seconds) for phase, seconds in self.timings.items())
+        return 'loaded {} reminders from {} files ({} unchanged, {} errors) in {:.3f}s: {}'.format(
+            self.reminders, self.files, self.skipped, len(self.errors), self.total, phases)
+
+
+class _PhaseTimer(object):
+
+    def __init__(self, report, phase):
+        self.report = report
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        self.report.timings[self.phase] = self.report.timings.get(self.phase, 0.0) + elapsed
+        return False
@@ -0,0 +1,144 @@
+import itertools
+import logging
+
+
+class Lazy(object):
+    """
+    Log argument computed only if the record is actually formatted, e.g.
+    ``logger.debug('state: %s', Lazy(vars, self))``.
+    """
+    __slots__ = ('func', 'args')
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        return str(self.func(*self.args))
+
+    def __repr__(self):
+        return repr(self.func(*self.args))
+
+
+class _Fields(object):
+    """Renders event fields as ``key=value`` pairs when the record is formatted."""
+    __slots__ = ('fields',)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        return ' '.join('{}={!r}'.format(key, value) for key, value in self.fields.items())
+
+
+class LogContext(object):
+    """
+    Logging state shared by a reminder and its watcher and alerter: fields added to
+    every record, a debug switch that does not touch any logger's level, and
+    counters used to sample high-frequency events.
+    """
+
+    def __init__(self, debug=False, sample=1, **fields):
+        """
+        Create LogContext object.
+
+        :param bool debug:
+            Emit debug records of this context even if the loggers are set to a higher level.
+        :param int sample:
+            Emit one in this many occurrences of each sampled event. Ignored while ``debug`` is on.
+        :param fields: Added to every record as attributes, e.g. ``reminder='id'``.
+        """
+        self.debug = debug
+        self.sample = max(1, int(sample or 1))
+        self.fields = fields
+        # Logger format strings are %-style, so the prefix must not introduce placeholders
+        self.prefix = ''
+        if fields:
+            self.prefix = '[{}] '.format(' '.join(str(value) for value in fields.values())).replace('%', '%%')
+        self._counters = {}
+
+    def sampled(self, event):
+        """
+        Count occurrence of ``event`` and return ``True`` if it should be emitted.
+
+        :param str event: Event name.
+        :rtype: bool
+        """
+        if self.debug or self.sample == 1:
+            return True
+        counter = self._counters.get(event)
+        if counter is None:
+            counter = self._counters.setdefault(event, itertools.count())
+        # next() on itertools.count is atomic, so no lock is needed across check threads
+        return next(counter) % self.sample == 0
+
+    def logger(self, name):
+        """
+        Return logger for module ``name`` bound to this context.
+
+        :rtype: ContextLogger
+        """
+        return ContextLogger(logging.getLogger(name), self)
+
+
+class ContextLogger(logging.LoggerAdapter):
+    """
+    Logger adapter prefixing messages with its :class:`LogContext` and adding the
+    context's fields to records. All methods return before any formatting when the
+    level is disabled, so guarded calls cost one level check.
+    """
+
+    def __init__(self, logger, context):
+        """
+        Create ContextLogger object.
+
+        :param logging.Logger logger: Module logger; its level is never changed.
+        :param LogContext context: Context of the reminder being logged about.
+        """
+        super().__init__(logger, context.fields)
+        self.context = context
+
+    def process(self, msg, kwargs):
+        extra = kwargs.get('extra')
+        kwargs['extra'] = dict(self.extra, **extra) if extra else self.extra
+        return self.context.prefix + msg, kwargs
+
+    def isEnabledFor(self, level):
+        return (self.context.debug and level >= logging.DEBUG) or self.logger.isEnabledFor(level)
+
+    def log(self, level, msg, *args, **kwargs):
+        if not self.isEnabledFor(level):
+            return
+        msg, kwargs = self.process(msg, kwargs)
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, msg, *args, **kwargs)
+        else:
+            # Per-reminder debug: bypass the logger's own level check but still go through its handlers
+            self.logger._log(level, msg, args, **kwargs)
+
+    def event(self, name, level=logging.DEBUG, sampled=False, **fields):
+        """
+        Log structured event. Fields are added to the record as ``fields`` and
+        rendered as ``key=value`` only if the record is formatted.
+
+        :param str name: Event name, also the record's ``event`` attribute.
+        :param int level: Log level.
+        :param bool sampled: Emit only one in ``context.sample`` occurrences, for events fired on every check.
+        :param fields: Event data; values may be :class:`Lazy`.
+        """
+        if not self.isEnabledFor(level) or (sampled and not self.context.sampled(name)):
+            return
+        self.log(level, '%s %s', name, _Fields(fields), extra={'event': name, 'fields': fields})
+
+
+def logger_for(reminder, name):
+    """
+    Return logger for module ``name`` bound to the :class:`LogContext` of ``reminder``,
+    or to an empty context if it has none.
+
+    :param Reminder reminder: Reminder being logged about.
+    :param str name: Module name, usually ``__name__``.
+    :rtype: ContextLogger
+    """
+    context = getattr(reminder, 'log_context', None)
+    return (context or LogContext()).logger(name)
@@ -0,0 +1,347 @@
+import bisect
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+#: Default histogram bucket upper bounds in seconds.
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+#: Content type of :meth:`MetricsRegistry.render` output.
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(key, _escape(value)) for key, value in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if not isinstance(value, int) else str(value)
+
+
+class Counter(object):
+    """Monotonically increasing count."""
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """Add ``amount`` to counter."""
+        with self._lock:
+            self.value += amount
+
+
+class Histogram(object):
+    """Distribution of observed values over fixed buckets, with their count and sum."""
+    __slots__ = ('buckets', 'counts', 'count', 'sum', '_lock')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """Record one value."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def time(self):
+        """
+        Return context manager observing the wall time of its block.
+
+        :rtype: Timer
+        """
+        return Timer(self)
+
+    def quantile(self, q):
+        """
+        Estimate quantile ``q`` as the upper bound of the bucket containing it.
+
+        :param float q: Quantile between 0 and 1.
+        :returns: Bucket bound, ``inf`` if it falls in the last bucket, or ``None`` without observations.
+        :rtype: float
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return float('inf')
+
+
+class Timer(object):
+    """Context manager observing elapsed wall time into a :class:`Histogram`."""
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class ReminderMetrics(object):
+    """Histograms recorded on the hot path of one reminder."""
+    __slots__ = ('check', 'check_cpu', 'fetch', 'coerce', 'eval')
+
+    def __init__(self, registry, **labels):
+        self.check = registry.histogram('reminders_check_seconds', 'Wall time of whole checks.', **labels)
+        self.check_cpu = registry.histogram('reminders_check_cpu_seconds', 'CPU time of whole checks.', **labels)
+        self.fetch = registry.histogram('reminders_fetch_seconds', 'Wall time of watcher.update().', **labels)
+        self.coerce = registry.histogram('reminders_coerce_seconds', 'Wall time of status coercion.', **labels)
+        self.eval = registry.histogram('reminders_eval_seconds', 'Wall time of condition evaluation.', **labels)
+
+
+class MetricsRegistry(object):
+    """
+    Counters, histograms and gauges of a daemon.
+    Read them through :meth:`snapshot` and :meth:`top`, or scrape :meth:`render`
+    in Prometheus text format, e.g. from a :class:`MetricsServer`.
+    """
+
+    def __init__(self, per_reminder=True, buckets=DEFAULT_BUCKETS, *args, **kwargs):
+        """
+        Create MetricsRegistry object.
+
+        :param bool per_reminder:
+            Label hot-path histograms with the reminder id. Disable to keep only
+            aggregates when running very many reminders.
+        :param tuple buckets: Histogram bucket bounds in seconds.
+        """
+        self.per_reminder = per_reminder
+        self.buckets = tuple(buckets)
+        self._families = {}
+        # (label, value) -> {(name, labels tuple)}, so removing a reminder's series is O(its series)
+        self._index = {}
+        self._callbacks = {}
+        self._lock = threading.Lock()
+
+    def _metric(self, name, kind, help, factory, labels):
+        key = tuple(sorted(labels.items()))
+        family = self._families.get(name)
+        metric = family[2].get(key) if family is not None else None
+        if metric is None:
+            with self._lock:
+                family = self._families.setdefault(name, (kind, help, {}))
+                if family[0] != kind:
+                    raise ValueError('metric {} already registered as {}'.format(name, family[0]))
+                metric = family[2].get(key)
+                if metric is None:
+                    metric = family[2][key] = factory()
+                    for pair in key:
+                        self._index.setdefault(pair, set()).add((name, key))
+        return metric
+
+    def counter(self, name, help='', **labels):
+        """
+        Return counter ``name`` with ``labels``, creating it if needed.
+
+        :rtype: Counter
+        """
+        return self._metric(name, 'counter', help, Counter, labels)
+
+    def histogram(self, name, help='', buckets=None, **labels):
+        """
+        Return histogram ``name`` with ``labels``, creating it if needed.
+
+        :rtype: Histogram
+        """
+        return self._metric(name, 'histogram', help, lambda: Histogram(buckets or self.buckets), labels)
+
+    def callback(self, name, help, func, kind='gauge'):
+        """
+        Register metric read from ``func`` at collection time, for values other
+        components already count.
+
+        :param str name: Metric name.
+        :param str help: Description.
+        :param func: Returns a number, or an iterable of ``(labels dict, number)`` pairs.
+        :param str kind: ``gauge`` or ``counter``.
+        """
+        with self._lock:
+            self._callbacks[name] = (kind, help, func)
+
+    def reminder_metrics(self, reminder_id):
+        """
+        Return hot-path histograms for a reminder; shared aggregates if ``per_reminder`` is off.
+
+        :param str reminder_id: Reminder id.
+        :rtype: ReminderMetrics
+        """
+        return ReminderMetrics(self, reminder=reminder_id) if self.per_reminder else ReminderMetrics(self)
+
+    def remove(self, **labels):
+        """Drop all metrics whose labels include ``labels``, e.g. those of a removed reminder."""
+        if not labels:
+            raise ValueError('remove() needs at least one label')
+        with self._lock:
+            series = set.intersection(*(self._index.get(pair, set()) for pair in labels.items()))
+            for name, key in series:
+                del self._families[name][2][key]
+                for pair in key:
+                    indexed = self._index[pair]
+                    indexed.discard((name, key))
+                    if not indexed:
+                        del self._index[pair]
+
+    def collect(self):
+        """
+        Return current values of all metrics.
+
+        :returns: ``(name, kind, help, {labels tuple: metric or number})`` per metric family.
+        :rtype: list
+        """
+        with self._lock:
+            families = [(name, kind, help, dict(metrics)) for name, (kind, help, metrics) in self._families.items()]
+            callbacks = list(self._callbacks.items())
+        for name, (kind, help, func) in callbacks:
+            try:
+                value = func()
+            except Exception:
+                logging.getLogger(__name__).debug('metric callback %s failed', name, exc_info=True)
+                continue
+            if isinstance(value, (int, float)):
+                samples = {(): value}
+            else:
+                samples = {tuple(sorted(labels.items())): number for labels, number in value}
+            families.append((name, kind, help, samples))
+        return sorted(families, key=lambda family: family[0])
+
+    def snapshot(self):
+        """
+        Return plain data of all metrics.
+        Counters and gauges map to numbers; histograms to dicts of ``count``, ``sum``,
+        ``p50`` and ``p99``.
+
+        :returns: ``{name: {labels tuple: value}}``
+        :rtype: dict
+        """
+        snapshot = {}
+        for name, kind, _, samples in self.collect():
+            values = snapshot[name] = {}
+            for labels, metric in samples.items():
+                if isinstance(metric, Histogram):
+                    values[labels] = {'count': metric.count, 'sum': metric.sum,
+                                      'p50': metric.quantile(0.5), 'p99': metric.quantile(0.99)}
+                elif isinstance(metric, Counter):
+                    values[labels] = metric.value
+                else:
+                    values[labels] = metric
+        return snapshot
+
+    def top(self, name, n=10, by='sum', label='reminder'):
+        """
+        Return the label values with the largest totals of a histogram, e.g. the
+        reminders spending most time in checks.
+
+        :param str name: Histogram name, such as ``reminders_check_cpu_seconds``.
+        :param int n: Number of entries.
+        :param str by: ``sum`` or ``count``.
+        :param str label: Label to rank.
+        :returns: ``(label value, total)`` pairs, largest first.
+        :rtype: list
+        """
+        family = self._families.get(name)
+        if family is None:
+            return []
+        ranked = []
+        for labels, metric in list(family[2].items()):
+            labels = dict(labels)
+            if label in labels:
+                ranked.append((labels[label], getattr(metric, by)))
+        return sorted(ranked, key=lambda item: item[1], reverse=True)[:n]
+
+    def render(self):
+        """
+        Return all metrics in Prometheus text exposition format.
+
+        :rtype: str
+        """
+        lines = []
+        for name, kind, help, samples in self.collect():
+            lines.append('# HELP {} {}'.format(name, help.replace('\\', '\\\\').replace('\n', '\\n')))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            for labels, metric in sorted(samples.items()):
+                if isinstance(metric, Histogram):
+                    total = 0
+                    for bound, count in zip(metric.buckets + (float('inf'),), metric.counts):
+                        total += count
+                        le = '+Inf' if bound == float('inf') else repr(float(bound))
+                        lines.append('{}_bucket{} {}'.format(name, _format_labels(labels, ('le', le)), total))
+                    lines.append('{}_sum{} {}'.format(name, _format_labels(labels), _format_value(metric.sum)))
+                    lines.append('{}_count{} {}'.format(name, _format_labels(labels), metric.count))
+                else:
+                    value = metric.value if isinstance(metric, Counter) else metric
+                    lines.append('{}{} {}'.format(name, _format_labels(labels), _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsServer(object):
+    """Serves a registry's :meth:`~MetricsRegistry.render` output at ``/metrics`` over HTTP."""
+
+    def __init__(self, registry, host='127.0.0.1', port=9466):
+        """
+        Create MetricsServer object.
+
+        :param MetricsRegistry registry: Metrics to expose.
+        :param str host: Address to listen on.
+        :param int port: Port to listen on; ``0`` picks a free port.
+        """
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """Start serving in a background thread."""
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logging.getLogger(__name__).debug(format, *args)
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='reminders-metrics', daemon=True)
+        self._thread.start()
+        logging.getLogger(__name__).info('serving metrics on http://%s:%d/metrics', self.host, self.port)
+
+    def stop(self):
+        """Stop serving."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
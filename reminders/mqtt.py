@@ -0,0 +1,342 @@
+import logging
+import threading
+from collections import namedtuple
+
+try:
+    import paho.mqtt.client as paho
+except ImportError:
+    paho = None
+
+BrokerKey = namedtuple('BrokerKey', ['hostname', 'port', 'tls', 'username', 'password'])
+BrokerKey.__doc__ = 'Identity of a broker connection; watchers with equal keys share one client.'
+
+Message = namedtuple('Message', ['topic', 'payload', 'qos', 'retain'])
+Message.__doc__ = 'Message as delivered by :class:`LocalBroker`, mirroring paho MQTTMessage attributes.'
+
+
+def validate_filter(topic_filter):
+    """
+    Check topic filter follows MQTT wildcard rules.
+
+    :param str topic_filter: Topic filter, optionally containing ``+`` and ``#``.
+    :raises ValueError: if filter is invalid.
+    """
+    levels = topic_filter.split('/')
+    for i, level in enumerate(levels):
+        if level == '#' and i != len(levels) - 1:
+            raise ValueError('"#" must be the last level of topic filter {!r}'.format(topic_filter))
+        if level not in ('+', '#') and ('+' in level or '#' in level):
+            raise ValueError('wildcards must occupy a whole level in topic filter {!r}'.format(topic_filter))
+
+
+class _TrieNode(object):
+    __slots__ = ('children', 'subscribers')
+
+    def __init__(self):
+        self.children = {}
+        self.subscribers = set()
+
+
+class TopicTrie(object):
+    """Maps MQTT topic filters to subscribers and finds all subscribers matching a topic."""
+
+    def __init__(self):
+        self._root = _TrieNode()
+
+    def subscribe(self, topic_filter, subscriber):
+        """
+        Add subscriber for topic filter.
+
+        :param str topic_filter: Topic filter, optionally containing ``+`` and ``#``.
+        :param subscriber: Hashable object to return from :func:`match`.
+        """
+        validate_filter(topic_filter)
+        node = self._root
+        for level in topic_filter.split('/'):
+            node = node.children.setdefault(level, _TrieNode())
+        node.subscribers.add(subscriber)
+
+    def unsubscribe(self, topic_filter, subscriber):
+        """
+        Remove subscriber from topic filter, pruning nodes left empty.
+
+        :returns: ``True`` if no subscribers remain for topic filter.
+        :rtype: bool
+        """
+        path = [self._root]
+        levels = topic_filter.split('/')
+        for level in levels:
+            node = path[-1].children.get(level)
+            if node is None:
+                return True
+            path.append(node)
+        path[-1].subscribers.discard(subscriber)
+        remaining = not path[-1].subscribers
+        for level, parent, node in zip(reversed(levels), reversed(path[:-1]), reversed(path[1:])):
+            if node.subscribers or node.children:
+                break
+            del parent.children[level]
+        return remaining
+
+    def match(self, topic):
+        """
+        Return subscribers whose filters match topic.
+
+        :param str topic: Topic of received message.
+        :rtype: set
+        """
+        levels = topic.split('/')
+        matches = set()
+        # Wildcards at the first level do not match topics starting with '$'
+        stack = [(self._root, 0, topic.startswith('$'))]
+        while stack:
+            node, i, no_wildcard = stack.pop()
+            if not no_wildcard:
+                hash_node = node.children.get('#')
+                if hash_node is not None:
+                    matches.update(hash_node.subscribers)
+            if i == len(levels):
+                matches.update(node.subscribers)
+                continue
+            child = node.children.get(levels[i])
+            if child is not None:
+                stack.append((child, i + 1, False))
+            if not no_wildcard:
+                plus_node = node.children.get('+')
+                if plus_node is not None:
+                    stack.append((plus_node, i + 1, False))
+        return matches
+
+
+def paho_client(key):
+    """
+    Default client factory creating a paho client configured for broker ``key``.
+
+    :param BrokerKey key: Broker to create client for.
+    """
+    if paho is None:
+        raise ImportError('paho-mqtt is required for MQTTWatcher')
+    if hasattr(paho, 'CallbackAPIVersion'):
+        client = paho.Client(paho.CallbackAPIVersion.VERSION2)
+    else:
+        client = paho.Client()
+    if key.username:
+        client.username_pw_set(key.username, key.password)
+    if key.tls:
+        client.tls_set()
+    return client
+
+
+class MQTTConnection(object):
+    """Single broker connection dispatching messages to subscribers through a TopicTrie."""
+
+    def __init__(self, key, client, qos=0, keepalive=60):
+        """
+        Create MQTTConnection object.
+
+        :param BrokerKey key: Broker this connection belongs to.
+        :param client: paho Client (or compatible stand-in).
+        :param int qos: QoS used for subscriptions.
+        :param int keepalive: Keepalive interval in seconds.
+        """
+        self._logger = logging.getLogger(__name__)
+        self.key = key
+        self.client = client
+        self.qos = qos
+        self.keepalive = keepalive
+        self.trie = TopicTrie()
+        self.filters = {}
+        self.connected = False
+        self._lock = threading.Lock()
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+
+    def start(self):
+        """Connect in background and start network loop."""
+        self.client.connect_async(self.key.hostname, self.key.port, self.keepalive)
+        self.client.loop_start()
+
+    def stop(self):
+        """Stop network loop and disconnect."""
+        self.client.disconnect()
+        self.client.loop_stop()
+        self.connected = False
+
+    def subscribe(self, topic_filter, subscriber):
+        """Route messages matching ``topic_filter`` to ``subscriber.listener_callback``."""
+        with self._lock:
+            self.trie.subscribe(topic_filter, subscriber)
+            count = self.filters.get(topic_filter, 0)
+            self.filters[topic_filter] = count + 1
+        if not count and self.connected:
+            self.client.subscribe(topic_filter, self.qos)
+
+    def unsubscribe(self, topic_filter, subscriber):
+        """Stop routing ``topic_filter`` to ``subscriber``."""
+        with self._lock:
+            if topic_filter not in self.filters:
+                return
+            self.trie.unsubscribe(topic_filter, subscriber)
+            self.filters[topic_filter] -= 1
+            last = not self.filters[topic_filter]
+            if last:
+                del self.filters[topic_filter]
+        if last and self.connected:
+            self.client.unsubscribe(topic_filter)
+
+    @property
+    def subscriber_count(self):
+        return sum(self.filters.values())
+
+    def _on_connect(self, client, userdata, flags, rc, *args):
+        self.connected = True
+        with self._lock:
+            filters = list(self.filters)
+        self._logger.debug('connected to %s:%s, subscribing to %d filters', self.key.hostname, self.key.port, len(filters))
+        if filters:
+            client.subscribe([(f, self.qos) for f in filters])
+
+    def _on_message(self, client, userdata, msg):
+        with self._lock:
+            subscribers = self.trie.match(msg.topic)
+        for subscriber in subscribers:
+            try:
+                subscriber.listener_callback(client, userdata, msg)
+            except Exception:
+                self._logger.error('Error dispatching message on %s', msg.topic, exc_info=True)
+
+
+class MQTTManager(object):
+    """Daemon-level pool of broker connections shared by all MQTT watchers."""
+
+    def __init__(self, client_factory=paho_client, qos=0, keepalive=60, *args, **kwargs):
+        """
+        Create MQTTManager object.
+
+        :param callable client_factory:
+            Called with a :class:`BrokerKey` to create a client.
+            Defaults to paho; use :meth:`LocalBroker.client` for an in-process stand-in.
+        :param int qos: QoS used for subscriptions.
+        :param int keepalive: Keepalive interval in seconds.
+        """
+        self._logger = logging.getLogger(__name__)
+        self.client_factory = client_factory
+        self.qos = qos
+        self.keepalive = keepalive
+        self.connections = {}
+        self._lock = threading.Lock()
+
+    def connection_for(self, key):
+        """
+        Return connection for broker ``key``, connecting if needed.
+
+        :param BrokerKey key: Broker identity.
+        :rtype: MQTTConnection
+        """
+        with self._lock:
+            connection = self.connections.get(key)
+            if connection is None:
+                connection = MQTTConnection(key, self.client_factory(key), self.qos, self.keepalive)
+                self.connections[key] = connection
+                connection.start()
+                self._logger.debug('opened MQTT connection to %s:%s', key.hostname, key.port)
+        return connection
+
+    def subscribe(self, watcher):
+        """Subscribe watcher to all of its topics on its broker."""
+        connection = self.connection_for(watcher.broker_key)
+        for topic in watcher.topics:
+            connection.subscribe(topic, watcher)
+
+    def unsubscribe(self, watcher):
+        """Remove watcher from its broker, closing the connection when no subscribers remain."""
+        with self._lock:
+            connection = self.connections.get(watcher.broker_key)
+        if connection is None:
+            return
+        for topic in watcher.topics:
+            connection.unsubscribe(topic, watcher)
+        with self._lock:
+            if not connection.subscriber_count and self.connections.get(watcher.broker_key) is connection:
+                del self.connections[watcher.broker_key]
+                connection.stop()
+
+    def stop(self):
+        """Close all broker connections."""
+        with self._lock:
+            connections = list(self.connections.values())
+            self.connections.clear()
+        for connection in connections:
+            connection.stop()
+
+
+class LocalBroker(object):
+    """
+    In-process broker stand-in.
+    Pass :meth:`client` as ``client_factory`` to :class:`MQTTManager` and use
+    :meth:`publish` to deliver messages synchronously to subscribed clients.
+    """
+
+    def __init__(self):
+        self.trie = TopicTrie()
+        self.clients = []
+        self.published = 0
+
+    def client(self, key=None):
+        """Create client connected to this broker."""
+        client = LocalClient(self)
+        self.clients.append(client)
+        return client
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        """Deliver message to every client subscribed to a matching filter."""
+        if isinstance(payload, str):
+            payload = payload.encode('utf8')
+        self.published += 1
+        msg = Message(topic, payload, qos, retain)
+        for client in self.trie.match(topic):
+            if client.on_message:
+                client.on_message(client, None, msg)
+
+
+class LocalClient(object):
+    """Subset of paho Client interface used by :class:`MQTTConnection`."""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.on_connect = None
+        self.on_message = None
+        self.filters = set()
+
+    def username_pw_set(self, username, password=None):
+        pass
+
+    def tls_set(self, *args, **kwargs):
+        pass
+
+    def connect_async(self, host, port=1883, keepalive=60):
+        pass
+
+    def loop_start(self):
+        if self.on_connect:
+            self.on_connect(self, None, {}, 0)
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        for topic_filter in list(self.filters):
+            self.unsubscribe(topic_filter)
+
+    def subscribe(self, topic, qos=0):
+        filters = topic if isinstance(topic, list) else [(topic, qos)]
+        for topic_filter, _ in filters:
+            self.filters.add(topic_filter)
+            self.broker.trie.subscribe(topic_filter, self)
+
+    def unsubscribe(self, topic):
+        self.filters.discard(topic)
+        self.broker.trie.unsubscribe(topic, self)
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.broker.publish(topic, payload, qos, retain)
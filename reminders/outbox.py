@@ -0,0 +1,116 @@
+import logging
+import random
+from .components import component_for
+from .dispatch import DelayedDispatcher
+from .metrics import MetricsRegistry
+
+
+class _Delivery(object):
+    """One or more alert payloads bound for the same destination."""
+
+    __slots__ = ('alerter', 'destination', 'payloads', 'attempts')
+
+    def __init__(self, alerter, destination, payload):
+        self.alerter = alerter
+        self.destination = destination
+        self.payloads = [payload]
+        self.attempts = 0
+
+
+class AlertOutbox(object):
+    """
+    Asynchronous alert delivery.
+    Alerters enqueue payloads and return immediately; a dedicated worker pool
+    delivers them with bounded concurrency, retrying failures with exponential
+    backoff. Alerters with ``batch`` enabled have payloads for the same
+    destination collected for ``batch_window`` seconds and delivered together.
+    """
+
+    def __init__(self, max_workers=4, max_retries=3, backoff=1.0, max_backoff=60.0, batch_window=1.0,
+                 max_batch=100, *args, **kwargs):
+        """
+        Create AlertOutbox object.
+
+        :param int max_workers: Maximum number of deliveries in progress at once.
+        :param int max_retries: Number of times a failed delivery is retried.
+        :param float backoff: Seconds before first retry; doubled on each further retry.
+        :param float max_backoff: Upper bound for retry delay in seconds.
+        :param float batch_window: Seconds to collect payloads for batching alerters.
+        :param int max_batch: Maximum number of payloads delivered in one batch.
+        """
+        self._logger = logging.getLogger(__name__)
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.enqueued = 0
+        self.delivered = 0
+        self.retried = 0
+        self.failed = 0
+        self._batches = {}
+        self._dispatcher = DelayedDispatcher(self._deliver, max_workers, 'reminders-alert', on_due=self._due)
+
+    def start(self):
+        """Start dispatcher thread and delivery workers."""
+        self._dispatcher.start()
+
+    def stop(self):
+        """Stop dispatching and wait for in-progress deliveries. Undelivered alerts are dropped."""
+        with self._dispatcher.lock:
+            self._batches.clear()
+        dropped = self._dispatcher.stop()
+        if dropped:
+            self._logger.warning('dropping %d undelivered alerts', sum(len(d.payloads) for d in dropped))
+
+    @property
+    def depth(self):
+        """Number of deliveries waiting to be sent or retried."""
+        return self._dispatcher.depth
+
+    def enqueue(self, alerter, payload):
+        """
+        Queue payload for delivery by ``alerter.deliver()``.
+
+        :param Alerter alerter:
+            Alerter providing ``deliver(payloads)``, ``destination`` and ``batch``.
+        :param payload: Alerter specific payload, such as request keyword arguments.
+        """
+        if not self._dispatcher.running:
+            self.start()
+        with self._dispatcher.lock:
+            self.enqueued += 1
+            if alerter.batch:
+                key = (id(alerter.deliver.__func__), alerter.destination)
+                delivery = self._batches.get(key)
+                if delivery is not None and len(delivery.payloads) < self.max_batch:
+                    delivery.payloads.append(payload)
+                    return
+                delivery = self._batches[key] = _Delivery(alerter, key, payload)
+                self._dispatcher.push(delivery, self.batch_window)
+            else:
+                self._dispatcher.push(_Delivery(alerter, None, payload))
+
+    def _due(self, delivery):
+        # Close the batch so payloads enqueued from now on start a new one
+        if self._batches.get(delivery.destination) is delivery:
+            del self._batches[delivery.destination]
+
+    def _deliver(self, delivery):
+        try:
+            with component_for(delivery.alerter.reminder, 'metrics', MetricsRegistry).histogram(
+                    'reminders_alert_delivery_seconds', 'Wall time of alert deliveries, including failed attempts.').time():
+                delivery.alerter.deliver(delivery.payloads)
+            self.delivered += len(delivery.payloads)
+        except Exception:
+            delivery.attempts += 1
+            if delivery.attempts > self.max_retries:
+                self.failed += len(delivery.payloads)
+                self._logger.error('giving up on alert delivery after %d attempts', delivery.attempts, exc_info=True)
+            else:
+                delay = min(self.max_backoff, self.backoff * 2 ** (delivery.attempts - 1))
+                delay *= random.uniform(0.5, 1.0)
+                self.retried += 1
+                self._logger.warning('alert delivery failed, retrying in %.1fs', delay, exc_info=True)
+                self._dispatcher.push(delivery, delay)
@@ -0,0 +1,95 @@
+import threading
+
+
+class ReminderRegistry(object):
+    """
+    Reminders of a daemon indexed by id, config path, watcher target and scheduler job id.
+    All additions, removals and lookups are constant time in the number of reminders.
+    """
+
+    def __init__(self):
+        self._by_id = {}
+        self._by_config = {}
+        self._by_target = {}
+        self._by_job = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self):
+        return iter(list(self._by_id.values()))
+
+    def __contains__(self, reminder):
+        return self._by_id.get(reminder.id) is reminder
+
+    def add(self, reminder):
+        """
+        Index reminder under its id, config path, watcher target and current job ids.
+
+        :param Reminder reminder: Reminder to add. Its id must not already be registered.
+        :raises KeyError: if a different reminder with the same id is registered.
+        """
+        with self._lock:
+            existing = self._by_id.get(reminder.id)
+            if existing is not None and existing is not reminder:
+                raise KeyError('reminder id {!r} already registered'.format(reminder.id))
+            self._by_id[reminder.id] = reminder
+            if reminder.config_path:
+                self._by_config.setdefault(reminder.config_path, {})[reminder.id] = reminder
+            target = reminder.watcher.target if reminder.watcher else None
+            if target:
+                self._by_target.setdefault(target, {})[reminder.id] = reminder
+            for job_id in reminder.job_ids:
+                self._by_job[job_id] = reminder
+
+    def remove(self, reminder):
+        """Remove reminder from all indexes."""
+        with self._lock:
+            if self._by_id.get(reminder.id) is not reminder:
+                return
+            del self._by_id[reminder.id]
+            self._discard(self._by_config, reminder.config_path, reminder.id)
+            self._discard(self._by_target, reminder.watcher.target if reminder.watcher else None, reminder.id)
+            for job_id in reminder.job_ids:
+                self._by_job.pop(job_id, None)
+
+    @staticmethod
+    def _discard(index, key, reminder_id):
+        group = index.get(key)
+        if group is not None:
+            group.pop(reminder_id, None)
+            if not group:
+                del index[key]
+
+    def add_job(self, job_id, reminder):
+        """Index scheduler job belonging to reminder."""
+        self._by_job[job_id] = reminder
+
+    def remove_job(self, job_id):
+        """Forget scheduler job."""
+        self._by_job.pop(job_id, None)
+
+    def get(self, reminder_id):
+        """Return reminder with id or ``None``."""
+        return self._by_id.get(reminder_id)
+
+    def for_config(self, config_path):
+        """Return reminders loaded from config file."""
+        return list(self._by_config.get(config_path, {}).values())
+
+    def for_target(self, target):
+        """Return reminders whose watcher polls ``target``, such as an HTTP host or MQTT broker."""
+        return list(self._by_target.get(target, {}).values())
+
+    def for_job(self, job_id):
+        """Return reminder owning scheduler job or ``None``."""
+        return self._by_job.get(job_id)
+
+    @property
+    def config_paths(self):
+        return list(self._by_config)
+
+    @property
+    def targets(self):
+        return list(self._by_target)
@@ -6,12 +6,54 @@ from dateparser import parse as dateparse
 from apscheduler.schedulers.background import BackgroundScheduler, BlockingScheduler
 from watchdog.observers import Observer
 from watchdog.events import PatternMatchingEventHandler
-import yaml
-from .watchers import HTTPWatcher, MQTTWatcher
+from .watchers import HTTPWatcher, MQTTWatcher, ResponseCache
 from .alerters import LogAlerter
+from .sessions import SessionPool, HostUnavailable
+from .engine import AsyncEngine
+from .mqtt import MQTTManager
+from .evaluation import EvaluationQueue
+from .outbox import AlertOutbox
+from .registry import ReminderRegistry
+from .store import store_from, preferred_owner
+from .metrics import MetricsRegistry, MetricsServer
+from .logs import LogContext
+from .wheel import WheelScheduler
+from .components import component_for
+from .schedules import spread_job, interval_seconds, AdaptiveInterval, RateLimiter
+from .loader import discover_configs, read_config, read_configs, reminder_entries, LoadReport, ConfigCache, \
+    CONFIG_EXTENSIONS
+from .conditions import compile_condition, referenced_names, numeric_thresholds
+from .coercion import coerce_status, STATUS_TYPES
 import os
-from simpleeval import SimpleEval
+from simpleeval import SimpleEval, NameNotDefined
 import importlib
+import threading
+import socket
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED, \
+    EVENT_JOB_MAX_INSTANCES
+import copy
+from collections import namedtuple
+
+StatusSnapshot = namedtuple('StatusSnapshot', ['raw', 'value'])
+StatusSnapshot.__doc__ = 'Watcher status fetched once and held for the duration of a single check.'
+
+
+class _Unavailable(object):
+    """Type of :data:`UNAVAILABLE`."""
+
+    def __repr__(self):
+        return 'UNAVAILABLE'
+
+    def __bool__(self):
+        return False
+
+
+#: Status of a check that failed fast because the watched host's circuit is open or rate limit exhausted.
+UNAVAILABLE = _Unavailable()
+
 
 class Reminder(object):
     """
@@ -19,54 +61,187 @@ class Reminder(object):
     """
     watcher_type_map = {'http': HTTPWatcher, 'mqtt': MQTTWatcher}
     alerter_type_map = {'log': LogAlerter}
+    eval_names = ('status', 'now')
+    eval_functions = {
+        'pendulum': pendulum,
+        'date': pendulum.instance
+    }
+    #: Names whose value changes over time even if the watched resource does not.
+    time_names = ('now', 'pendulum')
 
-    def __init__(self, condition, daemon=None, watcher=None, alerter=None):
+    def __init__(self, condition, daemon=None, watcher=None, alerter=None, status_type=None, id=None,
+                 config_path=None, debug=False):
         """
         Create Reminder object.
 
         :param str condition:
             An expression to indicate that an alert should be sent.
             Should evaluate to True or False only.
+            Compiled once here; invalid conditions raise
+            :class:`~reminders.conditions.InvalidCondition`.
         :param ReminderDaemon daemon:
             A ReminderDaemon instance where jobs will be scheduled.
         :param Watcher watcher:
             A Watcher instance to handle resource monitoring.
         :param Alerter alerter:
             An Alerter instance to handle sending notifications for Reminder.
+        :param status_type:
+            Declared type of watcher status, one of ``auto``, ``number``, ``bool``,
+            ``datetime`` or ``string``. Defaults to ``auto`` detection.
+            For watchers with named fields this may be a dict of field name to type;
+            a dict is rejected with :class:`ValueError` for watchers without them.
+        :param str id:
+            Stable identifier of reminder. Defaults to ``config_path`` or a random id.
+        :param str config_path: Absolute path of config file reminder was loaded from.
+        :param bool debug: Log this reminder at debug level regardless of the configured log level.
         """
-        self._logger = logging.getLogger(__name__)
         self._daemon = daemon
-        try:
-            self._logger.setLevel(self._daemon.logger.level)
-        except AttributeError:
-            pass
+        self.config_path = config_path
+        self.id = id or config_path or uuid.uuid4().hex
+        #: Logging context shared with watcher and alerter, see :class:`~reminders.logs.LogContext`.
+        self.log_context = LogContext(debug=debug, sample=getattr(daemon, 'log_sample', 1), reminder=self.id)
+        self._logger = self.log_context.logger(__name__)
+        #: Hot-path histograms, see :class:`~reminders.metrics.ReminderMetrics`.
+        self.metrics = component_for(self, 'metrics', MetricsRegistry).reminder_metrics(self.id)
+        self.definition = self.definition_from(dict(condition=condition, watcher=watcher, alerter=alerter,
+                                                    status_type=status_type, debug=debug))
         self.jobs = []
         self.job_ids = []
-        self.condition = condition
+        self.check_job_ids = []
+        self._condition = None
+        self.watcher = None
+        self.alerter = None
+        self._status_type = None
+        self.fetch_count = 0
+        self.check_count = 0
+        self.skipped_count = 0
+        self.unavailable_count = 0
+        #: :class:`~reminders.schedules.AdaptiveInterval` of an adaptive check schedule, if any.
+        self.adaptive = None
+        self._previous_raw = None
+        self._snapshot = None
+        self._check_lock = threading.Lock()
         if watcher:
             self._logger.debug('creating watcher from: %s', watcher)
             watcher['reminder'] = self
             WatcherClass = getattr(importlib.import_module('reminders.watchers'), watcher.get('type'))
             self.watcher = WatcherClass(**watcher)
-            jobs = self.watcher.schedules
-            for job in jobs:
-                job['func'] = self.check
-                self._logger.debug('added job to jobs: %s', job)
-                self.jobs.append(job)
+        try:
+            # Validated after watcher so per-field types can be checked against its field names
+            self.status_type = status_type
+            if self.watcher:
+                self.set_schedules(self.watcher.schedules)
+            self.set_alerter(alerter)
+            # Compiled after watcher so its field names are known; NullWatcher may have already set it.
+            if self._condition is None:
+                self.condition = condition
+        except Exception:
+            # Watcher may already be subscribed or holding shared resources; don't leave them to a half-built reminder
+            if self.watcher:
+                self.watcher.close()
+            raise
+        self.simple_eval = SimpleEval()
+        self.simple_eval.names = self._lookup_name
+        self.simple_eval.functions = dict(self.eval_functions)
+
+    @staticmethod
+    def definition_from(reminder_config):
+        """
+        Return comparable copy of the parts of a reminder config that can change on reload.
+
+        :param dict reminder_config: Reminder configuration as loaded from YAML.
+        :rtype: dict
+        """
+        watcher = copy.deepcopy(reminder_config.get('watcher')) or {}
+        schedules = watcher.pop('schedules', None)
+        return {
+            'condition': reminder_config.get('condition'),
+            'status_type': reminder_config.get('status_type'),
+            'watcher': watcher,
+            'schedules': schedules,
+            'alerter': copy.deepcopy(reminder_config.get('alerter')),
+            'debug': bool(reminder_config.get('debug')),
+        }
+
+    def set_schedules(self, schedules):
+        """
+        Replace job definitions used to check reminder.
+        Jobs already scheduled are not affected; see :meth:`ReminderDaemon.reload_reminder`.
+
+        :param list schedules: Scheduler job keyword arguments.
+        """
+        self.watcher.schedules = schedules
+        self.jobs = []
+        for job in schedules:
+            job = dict(job, func=self.check)
+            self._logger.debug('added job to jobs: %s', job)
+            self.jobs.append(job)
+
+    def set_alerter(self, alerter):
+        """
+        Replace alerter, deactivating the current one first.
+
+        :param dict alerter: Alerter configuration or ``None``.
+        """
+        if self.alerter and self.alerter.active:
+            self.alerter.deactivate()
+        self.alerter = None
         if alerter:
             self._logger.debug('creating alerter from: %s', alerter)
             alerter['reminder'] = self
             AlerterClass = getattr(importlib.import_module('reminders.alerters'), alerter.get('type'))
             self.alerter = AlerterClass(**alerter)
-        self.simple_eval = SimpleEval()
-        self.simple_eval.names.update({
-            'status': self.status,
-            'now': self.now,
-        })
-        self.simple_eval.functions = {
-            'pendulum': pendulum,
-            'date': pendulum.instance
-        }
+        # New alerter starts inactive, so the next check must evaluate even if status is unchanged
+        self._force_eval = True
+
+    @property
+    def debug(self):
+        """``True`` if this reminder logs at debug level regardless of the configured log level."""
+        return self.log_context.debug
+
+    @debug.setter
+    def debug(self, debug):
+        self.log_context.debug = bool(debug)
+
+    @property
+    def status_type(self):
+        """Declared type of watcher status."""
+        return self._status_type
+
+    @status_type.setter
+    def status_type(self, status_type):
+        for declared in (status_type.values() if isinstance(status_type, dict) else [status_type]):
+            if declared and declared not in STATUS_TYPES:
+                raise ValueError('Unknown status_type {!r}, expected one of {}'.format(declared, STATUS_TYPES))
+        if isinstance(status_type, dict):
+            fields = self.watcher.fields if self.watcher else ()
+            if not fields:
+                raise ValueError('status_type per field requires a watcher with named fields')
+            unknown = sorted(set(status_type).difference(fields))
+            if unknown:
+                raise ValueError('status_type declares {} but watcher has no such named fields'.format(
+                    ', '.join(map(str, unknown))))
+        self._status_type = status_type
+        self._force_eval = True
+
+    @property
+    def condition(self):
+        """Condition expression. Setting it compiles the expression."""
+        return self._condition
+
+    @condition.setter
+    def condition(self, condition):
+        self._compiled_condition = compile_condition(condition, self.condition_names)
+        self._time_dependent = bool(referenced_names(self._compiled_condition).intersection(self.time_names))
+        self._thresholds = numeric_thresholds(self._compiled_condition)
+        self._condition = condition
+        self._force_eval = True
+
+    @property
+    def condition_names(self):
+        """Names a condition may reference."""
+        fields = self.watcher.fields if self.watcher else ()
+        return self.eval_names + tuple(self.eval_functions) + tuple(fields)
 
     @property
     def now(self):
@@ -75,19 +250,68 @@ class Reminder(object):
 
     @property
     def status(self):
+        """
+        Status of watched resource.
+        During :func:`check` this is the snapshot fetched at the start of the check,
+        so the watcher is only queried once no matter how often the condition uses it.
+        """
         if self.watcher:
-            try:
-                d = dateparse(self.watcher.update(), settings={'STRICT_PARSING': True})
-                if d:
-                    return d
-                else:
-                    return self.watcher.update()
-            except TypeError:
-                return None
+            snapshot = self._snapshot if self._snapshot is not None else self.fetch_status()
+            return snapshot.value
         else:
             self._logger.error('No watcher associated', exc_info=True)
             return None
 
+    def fetch_status(self):
+        """
+        Query watcher once and coerce the result to :attr:`status_type`.
+        If the watched host's guard rejects the request both values are :data:`UNAVAILABLE`.
+
+        :returns: raw watcher value along with the parsed value
+        :rtype: StatusSnapshot
+        """
+        try:
+            with self.metrics.fetch.time():
+                raw = self.watcher.update()
+        except HostUnavailable as e:
+            return self._unavailable(e)
+        return self._snapshot_from(raw)
+
+    async def async_fetch_status(self):
+        """Coroutine version of :func:`fetch_status`."""
+        try:
+            with self.metrics.fetch.time():
+                raw = await self.watcher.async_update()
+        except HostUnavailable as e:
+            return self._unavailable(e)
+        return self._snapshot_from(raw)
+
+    def _unavailable(self, error):
+        self.unavailable_count += 1
+        self._logger.debug('status unavailable: %s', error)
+        return StatusSnapshot(UNAVAILABLE, UNAVAILABLE)
+
+    def _snapshot_from(self, raw):
+        self.fetch_count += 1
+        try:
+            with self.metrics.coerce.time():
+                value = coerce_status(raw, self.status_type)
+        except ValueError:
+            self._logger.warning('Unable to convert status %r to %s', raw, self.status_type)
+            value = None
+        return StatusSnapshot(raw, value)
+
+    def _lookup_name(self, node):
+        """Resolve names used in condition at evaluation time."""
+        if node.id in self.eval_names:
+            return getattr(self, node.id)
+        if self.watcher and node.id in self.watcher.fields:
+            status = self.status
+            return status.get(node.id) if isinstance(status, dict) else None
+        if node.id in self.simple_eval.functions:
+            return self.simple_eval.functions[node.id]
+        raise NameNotDefined(node.id, self.condition)
+
     def test_condition(self):
         """
         .. deprecated:: 0.1
@@ -104,24 +328,105 @@ class Reminder(object):
 
     def eval(self):
         """
-        Evaluate self.expression
+        Evaluate self.condition using its precompiled form
 
         :returns:   True if alert should be started
         :rtype:     bool
         """
         try:
-            return self.simple_eval.eval(self.condition)
+            with self.metrics.eval.time():
+                return self.simple_eval.eval(self.condition, previously_parsed=self._compiled_condition)
         except TypeError:
             self._logger.error('Error evaluating expression.', exc_info=True)
             return None
 
     def check(self):
-        """Runs self.test_condition() and sends Alert if True."""
-        if self.eval() and self.alerter:
-            self._logger.debug('activating alert')
+        """
+        Runs self.eval() and sends Alert if True.
+        Watcher is queried once per check and the result reused for the whole evaluation.
+        """
+        with self._check_lock:
+            started, cpu_started = time.perf_counter(), time.thread_time()
+            try:
+                self._evaluate(self.fetch_status() if self.watcher else None)
+            finally:
+                self.metrics.check_cpu.observe(time.thread_time() - cpu_started)
+                self.metrics.check.observe(time.perf_counter() - started)
+
+    async def async_check(self):
+        """
+        Coroutine version of :func:`check` used by :class:`~reminders.engine.AsyncEngine`.
+        Only the watcher query is awaited; evaluation runs inline on the event loop.
+        CPU time is only measured for the evaluation, as the loop runs other checks while this one awaits.
+        """
+        started = time.perf_counter()
+        try:
+            snapshot = await self.async_fetch_status() if self.watcher else None
+            cpu_started = time.thread_time()
+            try:
+                self._evaluate(snapshot)
+            finally:
+                self.metrics.check_cpu.observe(time.thread_time() - cpu_started)
+        finally:
+            self.metrics.check.observe(time.perf_counter() - started)
+
+    def _evaluate(self, snapshot):
+        """
+        Evaluate condition against ``snapshot`` and activate alerter if needed.
+        Skipped when the watcher reports an unchanged status and the condition
+        does not depend on the current time, since the result can not differ,
+        unless condition, status_type or alerter were replaced since the last evaluation.
+        Also skipped if another daemon node holds this reminder's lease.
+        """
+        if self._daemon is not None and not self._daemon.owns(self):
+            self._logger.event('evaluation_skipped', reason='not lease owner', sampled=True)
+            return
+        self.check_count += 1
+        if snapshot is not None and snapshot.value is UNAVAILABLE:
+            self._logger.event('evaluation_skipped', reason='status unavailable', sampled=True)
+            return
+        if self.watcher and not self.watcher.changed and not self._time_dependent and not self._force_eval:
+            self.skipped_count += 1
+            self._logger.event('evaluation_skipped', reason='status unchanged', sampled=True)
+            if self.adaptive:
+                self.adaptive.observe(False)
+            return
+        self._force_eval = False
+        self._snapshot = snapshot
+        try:
+            result = self.eval()
+        finally:
+            self._snapshot = None
+        if self.adaptive:
+            # Compare extracted status rather than trusting watcher.changed, since a
+            # response without validators counts as changed even if the status is not
+            raw = snapshot.raw if snapshot is not None else None
+            changed, self._previous_raw = raw != self._previous_raw, raw
+            self.adaptive.observe(changed, bool(result) or self._near_threshold(snapshot))
+        if result and self.alerter:
+            self._logger.event('alert_activating', status=snapshot.raw if snapshot is not None else None)
             self.alerter.activate()
         else:
-            self._logger.debug('checked successfully - no alert necessary')
+            self._logger.event('checked', result=result, sampled=True)
+
+    def _near_threshold(self, snapshot):
+        """Return ``True`` if a watched value is within ``adaptive.near`` of a number the condition compares it to."""
+        if snapshot is None:
+            return False
+        for name, threshold in self._thresholds:
+            if name == 'status':
+                value = snapshot.value
+            elif isinstance(snapshot.value, dict):
+                value = snapshot.value.get(name)
+            else:
+                continue
+            try:
+                distance = abs(float(value) - threshold)
+            except (TypeError, ValueError):
+                continue
+            if distance <= self.adaptive.near * (abs(threshold) or 1):
+                return True
+        return False
 
     def activate(self):
         """TBD - May be unnecessary at this level."""
@@ -134,7 +439,12 @@ class Reminder(object):
 
 class ReminderDaemon(object):
     """Parent Daemon to keep track of scheduled jobs and watch for config file changes."""
-    def __init__(self, blocking=True, timezone='UTC', config_path='.', logger_level=None, *args, **kwargs):
+    def __init__(self, blocking=True, timezone='UTC', config_path='.', logger_level=None, session_kwargs=None,
+                 execution='thread', async_kwargs=None, cache_kwargs=None, mqtt_kwargs=None, evaluation_kwargs=None,
+                 outbox_kwargs=None, config_cache=None, watch_configs=True, store_kwargs=None, node_id=None,
+                 node_group='default', lease_ttl=30, scheduler_type='apscheduler', wheel_kwargs=None,
+                 spread_schedules=True, max_polls_per_second=None, metrics_kwargs=None, metrics_port=None,
+                 metrics_host='127.0.0.1', log_sample=100, *args, **kwargs):
         """
         Create ReminderDaemon object.
 
@@ -142,70 +452,450 @@ class ReminderDaemon(object):
             Determines if Scheduler should be BlockingScheduler or BackgroundScheduler.
         :param str timzone: Timezone for the scheduler to use when scheduling jobs.
         :param str config_path: Path to configuration files.
-        :param int logger_level: Level to set logger to.
+        :param int logger_level: Level to set the ``reminders`` package logger to.
+        :param dict session_kwargs:
+            Keyword arguments for the :class:`~reminders.sessions.SessionPool` shared
+            by all HTTP watchers and alerters (pool sizes, default timeout, and per-host
+            rate limits and circuit breakers through ``guard_kwargs`` and ``hosts``).
+        :param str execution:
+            ``thread`` to run checks in scheduler worker threads or ``async`` to run
+            them concurrently on a single event loop via :class:`~reminders.engine.AsyncEngine`.
+            ``async`` requires aiohttp (``pip install python-reminders[async]``).
+        :param dict async_kwargs:
+            Keyword arguments for the AsyncEngine, such as ``concurrency``.
+        :param dict cache_kwargs:
+            Keyword arguments for the :class:`~reminders.watchers.ResponseCache` used to
+            coalesce identical watcher requests, such as ``ttl``.
+        :param dict mqtt_kwargs:
+            Keyword arguments for the :class:`~reminders.mqtt.MQTTManager` that owns
+            the broker connections shared by MQTT watchers.
+        :param dict evaluation_kwargs:
+            Keyword arguments for the :class:`~reminders.evaluation.EvaluationQueue` that
+            runs checks triggered by push-based watchers, such as ``max_workers`` and ``debounce``.
+        :param dict outbox_kwargs:
+            Keyword arguments for the :class:`~reminders.outbox.AlertOutbox` delivering
+            alerts, such as ``max_workers``, ``max_retries`` and ``batch_window``.
+        :param str config_cache:
+            Path of a :class:`~reminders.loader.ConfigCache` file. When set, parsed configs
+            are cached there so a restart with unchanged files skips YAML parsing.
+        :param bool watch_configs:
+            Watch ``config_path`` for changes. Disabled for shards of a
+            :class:`~reminders.supervisor.Supervisor`, which forwards changes itself.
+        :param dict store_kwargs:
+            Configuration of the :class:`~reminders.store.StateStore` holding alert state and
+            leases, see :func:`~reminders.store.store_from`. Without a store alert state is
+            kept in memory only and this daemon owns all its reminders.
+        :param str node_id: Id of this daemon among nodes sharing the store. Defaults to host, pid and a random suffix.
+        :param str node_group: Only nodes of the same group split reminders between them.
+        :param float lease_ttl:
+            Seconds a node owns its reminders without renewing. A dead node's reminders
+            are taken over after at most this long; leases are renewed every third of it.
+        :param str scheduler_type:
+            ``apscheduler`` or ``wheel`` to schedule jobs on a :class:`~reminders.wheel.WheelScheduler`,
+            which scales to far more jobs.
+        :param dict wheel_kwargs: Keyword arguments for the WheelScheduler, such as ``tick`` and ``max_workers``.
+        :param bool spread_schedules:
+            Give each interval schedule a fixed phase derived from its reminder id, so
+            checks are spread evenly over the interval instead of all firing together.
+            A schedule can opt out with ``spread: false``.
+        :param float max_polls_per_second:
+            Limit on scheduled checks started per second across all reminders. Checks
+            over the limit wait for their turn.
+        :param dict metrics_kwargs:
+            Keyword arguments for the daemon's :class:`~reminders.metrics.MetricsRegistry`,
+            such as ``per_reminder``.
+        :param int metrics_port: Serve metrics in Prometheus text format on this port.
+        :param str metrics_host: Address to serve metrics on.
+        :param int log_sample:
+            Log one in this many per-check debug events of each kind per reminder.
+            Reminders with ``debug`` enabled log every event.
         """
         self.logger = logging.getLogger(__name__)
         if logger_level:
-            self.logger.setLevel(logger_level)
+            # Set once on the package logger; module loggers inherit it
+            logging.getLogger(__package__).setLevel(logger_level)
+        self.log_sample = log_sample
         self.logger.debug('initializing daemon')
-        self.scheduler = BlockingScheduler(timezone=timezone) if blocking else BackgroundScheduler(timezone=timezone)
-        self.reminders = []
-        self.configs = {}
+        # Created first so reminders and components built below can find it
+        self.metrics = MetricsRegistry(**(metrics_kwargs or {}))
+        self.metrics_server = MetricsServer(self.metrics, metrics_host, metrics_port) if metrics_port is not None \
+            else None
+        if scheduler_type == 'wheel':
+            self.scheduler = WheelScheduler(blocking=blocking, timezone=timezone, **(wheel_kwargs or {}))
+        elif scheduler_type == 'apscheduler':
+            self.scheduler = BlockingScheduler(timezone=timezone) if blocking else BackgroundScheduler(timezone=timezone)
+        else:
+            raise ValueError('scheduler_type must be "apscheduler" or "wheel", not {!r}'.format(scheduler_type))
+        self.session_pool = SessionPool(**(session_kwargs or {}))
+        self.response_cache = ResponseCache(**(cache_kwargs or {}))
+        self.mqtt = MQTTManager(**(mqtt_kwargs or {}))
+        self.evaluations = EvaluationQueue(**(evaluation_kwargs or {}))
+        self.outbox = AlertOutbox(**(outbox_kwargs or {}))
+        if execution not in ('thread', 'async'):
+            raise ValueError('execution must be "thread" or "async", not {!r}'.format(execution))
+        self.engine = AsyncEngine(**(async_kwargs or {})) if execution == 'async' else None
+        self.registry = ReminderRegistry()
+        self.spread_schedules = spread_schedules
+        self.poll_limiter = RateLimiter(max_polls_per_second) if max_polls_per_second else None
+        self._config_hashes = {}
+        self.config_cache = ConfigCache(config_cache) if config_cache else None
+        if self.config_cache:
+            self.config_cache.load()
+        self.state_store = store_from(store_kwargs) if store_kwargs is not None else None
+        self.node_id = node_id or '{}:{}:{}'.format(socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+        self.node_group = node_group
+        self.lease_ttl = lease_ttl
+        self._owned = frozenset()
+        self._lease_deadline = 0
+        self._lease_lock = threading.Lock()
         self.timezone = timezone
+        self._jobs_in_flight = 0
+        # Submission events arrive on the scheduler thread, completions on worker threads
+        self._jobs_in_flight_lock = threading.Lock()
+        self._scheduler_lag = self.metrics.histogram(
+            'reminders_scheduler_lag_seconds', 'Delay between scheduled and actual job submission.')
+        self._scheduler_missed = self.metrics.counter(
+            'reminders_scheduler_missed_total', 'Job runs skipped because they were late or still running.')
+        self.scheduler.add_listener(self._on_job_event, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR |
+                                    EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES)
+        self._register_metrics()
         self._observer = Observer()
-        self.config_path = config_path
-        self._watchdog_handler = PatternMatchingEventHandler('*.yaml;*.yml')
+        self.config_path = os.path.abspath(config_path)
+        self.watch_configs = watch_configs
+        self._watchdog_handler = PatternMatchingEventHandler(['*' + ext for ext in CONFIG_EXTENSIONS])
         self._watchdog_handler.on_created = self.on_created
         self._watchdog_handler.on_modified = self.on_created
         self._watchdog_handler.on_deleted = self.on_deleted
-        self._observer.schedule(self._watchdog_handler, self.config_path)
+        self._observer.schedule(self._watchdog_handler, self.config_path, recursive=True)
+
+    def _on_job_event(self, event):
+        if event.code == EVENT_JOB_SUBMITTED:
+            with self._jobs_in_flight_lock:
+                self._jobs_in_flight += 1
+            lag = (datetime.now(dt_timezone.utc) - max(event.scheduled_run_times)).total_seconds()
+            self._scheduler_lag.observe(max(lag, 0.0))
+        elif event.code in (EVENT_JOB_EXECUTED, EVENT_JOB_ERROR):
+            with self._jobs_in_flight_lock:
+                self._jobs_in_flight -= 1
+        else:
+            self._scheduler_missed.inc()
+
+    def _register_metrics(self):
+        """Expose counters kept by the daemon's components."""
+        metrics = self.metrics
+        metrics.callback('reminders_registered', 'Reminders loaded.', lambda: len(self.registry))
+        metrics.callback('reminders_alerts_active', 'Reminders with an active alert.',
+                         lambda: sum(1 for r in self.registry if r.alerter and r.alerter.active))
+        metrics.callback('reminders_scheduler_jobs', 'Jobs scheduled.', lambda: len(self.scheduler.get_jobs()))
+        metrics.callback('reminders_scheduler_jobs_in_flight', 'Jobs submitted to the worker pool and not finished.',
+                         lambda: self._jobs_in_flight)
+        metrics.callback('reminders_evaluation_queue_depth', 'Push-triggered checks waiting to run.',
+                         lambda: self.evaluations.depth)
+        metrics.callback('reminders_outbox_depth', 'Alert deliveries waiting.', lambda: self.outbox.depth)
+        for name in ('enqueued', 'delivered', 'retried', 'failed'):
+            metrics.callback('reminders_outbox_{}_total'.format(name), 'Alert payloads {}.'.format(name),
+                             lambda name=name: getattr(self.outbox, name), kind='counter')
+        for name in ('hits', 'misses', 'coalesced'):
+            metrics.callback('reminders_response_cache_{}_total'.format(name), 'Response cache {}.'.format(name),
+                             lambda name=name: getattr(self.response_cache, name), kind='counter')
+        metrics.callback('reminders_host_rejected_total', 'Requests rejected by host rate limits and circuit breakers.',
+                         lambda: [({'host': key[1]}, guard.rejected) for key, guard in
+                                  list(self.session_pool.guards.items())], kind='counter')
+        metrics.callback('reminders_host_circuit_open', '1 while the host circuit breaker is open.',
+                         lambda: [({'host': key[1]}, int(guard.state != guard.CLOSED)) for key, guard in
+                                  list(self.session_pool.guards.items())])
+        if self.engine:
+            metrics.callback('reminders_engine_submitted_total', 'Checks submitted to the async engine.',
+                             lambda: self.engine.submitted, kind='counter')
+            metrics.callback('reminders_engine_skipped_total', 'Checks skipped because one was in flight.',
+                             lambda: self.engine.skipped, kind='counter')
+        if metrics.per_reminder:
+            for name, attribute, help in (('checks', 'check_count', 'Checks run.'),
+                                          ('fetches', 'fetch_count', 'Watcher queries.'),
+                                          ('evaluations_skipped', 'skipped_count', 'Checks skipped as unchanged.'),
+                                          ('unavailable', 'unavailable_count', 'Checks failed fast by a host guard.')):
+                metrics.callback('reminders_{}_total'.format(name), help,
+                                 lambda attribute=attribute: [({'reminder': r.id}, getattr(r, attribute))
+                                                              for r in self.registry], kind='counter')
 
     def start(self):
         """Start the observer and scheduler associated with daemon."""
-        self._observer.start()
+        if self.metrics_server:
+            self.metrics_server.start()
+        if self.engine:
+            self.engine.start()
+        if self.watch_configs:
+            self._observer.start()
+        if self.state_store:
+            self.renew_leases()
+            self.scheduler.add_job(self.renew_leases, 'interval', seconds=self.lease_ttl / 3.0)
         self.scheduler.start()
 
-    def add_reminder(self, reminder_config):
+    def stop(self):
+        """Stop scheduler, observer and async engine and release pooled connections."""
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self._observer.is_alive():
+            self._observer.stop()
+        if self.engine:
+            self.engine.stop()
+        self.mqtt.stop()
+        self.evaluations.stop()
+        self.outbox.stop()
+        self.session_pool.close()
+        if self.config_cache:
+            self.config_cache.save()
+        if self.state_store:
+            with self._lease_lock:
+                self.state_store.release(self.node_id, self._owned)
+                self._owned = frozenset()
+                # Leave the group now so other nodes take our reminders on their next renewal, not after lease_ttl
+                self.state_store.heartbeat(self.node_id, self.node_group, 0)
+            self.state_store.close()
+
+    def owns(self, reminder):
+        """
+        Return ``True`` if this node may check and alert for reminder.
+        Always true without a state store; otherwise the node must hold an unexpired lease.
+
+        :param Reminder reminder: Reminder to test.
+        :rtype: bool
+        """
+        if self.state_store is None:
+            return True
+        return reminder.id in self._owned and time.monotonic() < self._lease_deadline
+
+    def renew_leases(self):
+        """
+        Heartbeat, then renew or take leases of the reminders this node should own and
+        release the rest. Reminders gained have their alert state restored and checks
+        scheduled; reminders lost are suspended.
+
+        :returns: Ids of reminders owned after renewal.
+        :rtype: frozenset
+        """
+        with self._lease_lock:
+            started = time.monotonic()
+            nodes = self.state_store.heartbeat(self.node_id, self.node_group, self.lease_ttl)
+            reminders = {reminder.id: reminder for reminder in self.registry}
+            wanted = [reminder_id for reminder_id in reminders
+                      if preferred_owner(reminder_id, nodes) == self.node_id]
+            self.state_store.release(self.node_id, self._owned.difference(wanted))
+            owned = frozenset(self.state_store.acquire(self.node_id, wanted, self.lease_ttl))
+            previous, self._owned = self._owned, owned
+            # Leases were granted after ``started``, so they can not expire before this
+            self._lease_deadline = started + self.lease_ttl
+        for reminder_id in previous - owned:
+            reminder = reminders.get(reminder_id)
+            if reminder is not None:
+                self._suspend(reminder)
+        for reminder_id in owned - previous:
+            self._resume(reminders[reminder_id])
+        if owned != previous:
+            self.logger.info('node %s owns %d of %d reminders (%d nodes)',
+                             self.node_id, len(owned), len(reminders), len(nodes))
+        return owned
+
+    def _suspend(self, reminder):
+        self.logger.debug('lease lost for reminder %s', reminder.id)
+        self._unschedule_checks(reminder)
+        if reminder.alerter and reminder.alerter.active:
+            reminder.alerter.suspend()
+
+    def _resume(self, reminder):
+        self.logger.debug('lease acquired for reminder %s', reminder.id)
+        state = self.state_store.get_state(reminder.id)
+        if state and reminder.alerter:
+            reminder.alerter.restore(state)
+        if not reminder.check_job_ids:
+            self._schedule_checks(reminder)
+
+    @property
+    def reminders(self):
+        """List of all reminders registered with daemon."""
+        return list(self.registry)
+
+    def add_reminder(self, reminder_config, config_path=None, schedule=True):
         """
         Create new reminder and add to daemon.
 
         :param dict reminder_config:
             Dictionary configuration for creating Reminder.
             Typically loaded from YAML file.
+        :param str config_path: Path of config file the reminder was loaded from.
+        :param bool schedule: Schedule check jobs now rather than leaving it to the caller.
+        :returns: The new reminder.
+        :rtype: Reminder
         """
         reminder_config['daemon'] = self
+        if config_path:
+            reminder_config.setdefault('config_path', config_path)
         reminder = Reminder(**reminder_config)
-        self.update(reminder)
+        self.update(reminder, schedule)
+        return reminder
 
-    def update(self, reminder):
+    def update(self, reminder, schedule=True):
         """
         Update Daemon with new Reminder object.
-        Operates by either appending new reminder or replacing existing reminder.
+        Operates by either appending new reminder or replacing existing reminder with the same id.
 
         :param Reminder reminder: Reminder to be added or updated.
+        :param bool schedule: Schedule check jobs now rather than leaving it to the caller.
         """
-        if reminder not in self.reminders:
-            for job in reminder.jobs:
-                self.logger.debug('adding job to scheduler: %s', job)
-                try:
-                    job_def = self.scheduler.add_job(**job)
-                    reminder.job_ids.append(job_def.id)
-                except TypeError:
-                    logger.error('Unable to add job to scheduler', exc_info=True)
-            self.reminders.append(reminder)
-        else:
-            self.remove_reminder(reminder)
-            self.update(reminder)
+        existing = self.registry.get(reminder.id)
+        if existing is reminder:
+            return
+        if existing is not None:
+            self.remove_reminder(existing, release=False)
+        if schedule:
+            self._schedule_checks(reminder)
+        self.registry.add(reminder)
+
+    def _schedule_checks(self, reminder):
+        if not self.owns(reminder):
+            return
+        # Watchers issuing the same request share a phase, so their polls stay aligned and
+        # are coalesced by the response cache
+        request_key = getattr(reminder.watcher, 'request_key', None)
+        for index, job in enumerate(reminder.jobs):
+            self.logger.debug('adding job to scheduler: %s', job)
+            job = dict(job)
+            if job.pop('spread', self.spread_schedules):
+                job = spread_job(job, request_key or '{}#{}'.format(reminder.id, index))
+            if self.engine:
+                job = dict(job, func=self.engine.submit, args=[reminder])
+            if self.poll_limiter:
+                job = dict(job, func=self._limited, args=[job['func']] + list(job.get('args') or []))
+            try:
+                adaptive = job.pop('adaptive', None)
+                if adaptive:
+                    min_seconds = interval_seconds(job)
+                    if min_seconds is None:
+                        raise TypeError('adaptive schedules require an interval trigger')
+                    # Outermost, so skipped runs don't take a poll token
+                    reminder.adaptive = AdaptiveInterval(min_seconds, **adaptive)
+                    job = dict(job, func=reminder.adaptive.poll, args=[job['func']] + list(job.get('args') or []))
+                reminder.check_job_ids.append(self.add_job(reminder, **job).id)
+            except TypeError:
+                self.logger.error('Unable to add job to scheduler', exc_info=True)
+
+    def _limited(self, func, *args):
+        self.poll_limiter.acquire()
+        func(*args)
 
-    def remove_reminder(self, reminder):
+    def _unschedule_checks(self, reminder):
+        for job_id in reminder.check_job_ids:
+            self.remove_job(reminder, job_id)
+        reminder.check_job_ids = []
+        reminder.adaptive = None
+
+    def reload_reminder(self, reminder, reminder_config):
+        """
+        Apply changed config to an existing reminder, touching only what changed.
+        Condition, status_type, schedules, alerter and debug are updated in place so alert
+        state survives edits that don't affect the alerter. A changed watcher
+        replaces the whole reminder.
+
+        :param Reminder reminder: Reminder currently registered.
+        :param dict reminder_config: New configuration for reminder.
+        :returns: Names of changed sections.
+        :rtype: set
+        """
+        definition = Reminder.definition_from(reminder_config)
+        changed = {key for key, value in definition.items() if value != reminder.definition.get(key)}
+        if not changed:
+            return changed
+        if 'watcher' in changed:
+            self.add_reminder(reminder_config, config_path=reminder.config_path)
+            return changed
+        if 'condition' in changed:
+            reminder.condition = definition['condition']
+        if 'status_type' in changed:
+            reminder.status_type = definition['status_type']
+        if 'schedules' in changed:
+            self._unschedule_checks(reminder)
+            reminder.set_schedules(copy.deepcopy(definition['schedules']))
+            self._schedule_checks(reminder)
+        if 'alerter' in changed:
+            reminder.set_alerter(copy.deepcopy(definition['alerter']))
+        if 'debug' in changed:
+            reminder.debug = definition['debug']
+        reminder.definition = definition
+        return changed
+
+    def set_debug(self, reminder_id, debug=True):
+        """
+        Turn debug logging of one reminder, its watcher and alerter on or off
+        without changing the level of any logger.
+
+        :param str reminder_id: Id of reminder.
+        :param bool debug: Enable or disable.
+        :raises KeyError: if no reminder has this id.
+        """
+        reminder = self.registry.get(reminder_id)
+        if reminder is None:
+            raise KeyError(reminder_id)
+        reminder.debug = debug
+
+    def add_job(self, reminder, **job):
+        """
+        Schedule job on behalf of reminder and track it so it is removed with the reminder.
+
+        :param Reminder reminder: Reminder owning the job.
+        :param job: Keyword arguments for ``scheduler.add_job()``.
+        :returns: Scheduled job.
+        """
+        job_def = self.scheduler.add_job(**job)
+        reminder.job_ids.append(job_def.id)
+        self.registry.add_job(job_def.id, reminder)
+        return job_def
+
+    def remove_job(self, reminder, job_id):
+        """
+        Remove job previously added with :func:`add_job`.
+
+        :param Reminder reminder: Reminder owning the job.
+        :param str job_id: Id of job to remove.
+        """
+        self.scheduler.remove_job(job_id)
+        reminder.job_ids.remove(job_id)
+        self.registry.remove_job(job_id)
+
+    def remove_reminder(self, reminder, release=True, keep_state=False):
         """
         Remove reminder from Daemon.
 
         :param Reminder reminder: The Reminder to be removed.
+        :param bool release:
+            Forget its persisted state and metrics and give up its lease. ``False`` when
+            it is being replaced by a reminder with the same id.
+        :param bool keep_state:
+            Suspend rather than deactivate its alert and keep its persisted state, for a
+            reminder moving to another daemon that will restore it.
         """
+        self.registry.remove(reminder)
+        owned = self.owns(reminder)
+        if reminder.alerter and reminder.alerter.active:
+            if keep_state:
+                reminder.alerter.suspend()
+            else:
+                reminder.alerter.deactivate()
         for job_id in reminder.job_ids:
             self.scheduler.remove_job(job_id)
-        self.reminders.remove(reminder)
+        reminder.job_ids = []
+        reminder.check_job_ids = []
+        if reminder.watcher:
+            reminder.watcher.close()
+        if release:
+            self.metrics.remove(reminder=reminder.id)
+        if self.state_store and owned and release:
+            if not keep_state:
+                self.state_store.delete_state(reminder.id)
+            with self._lease_lock:
+                self.state_store.release(self.node_id, [reminder.id])
+                self._owned = self._owned.difference([reminder.id])
 
     def on_created(self, event):
         """
@@ -214,10 +904,9 @@ class ReminderDaemon(object):
         :param event: Event object representing the file system event.
         :event type: watchdog.events.FileSystemEvent
         """
-        self.logger.debug('creation event received for {}'.format(event.src_path))
+        self.logger.debug('creation event received for %s', event.src_path)
         if not event.is_directory:
-            path = os.path.basename(event.src_path)
-            self.load_yaml(path)
+            self.load_yaml(os.path.abspath(event.src_path))
         else:
             self.logger.debug('skipping event because it is directory')
 
@@ -225,19 +914,140 @@ class ReminderDaemon(object):
         """
         Read and process yaml config.
 
-        :param str path: The path of yaml config to load.
+        :param str path: The path of yaml config to load, absolute or relative to ``config_path``.
         """
         self.logger.debug('loading yaml config from %s', path)
-        path = os.path.join(self.config_path, path)
-        with open(path) as f:
-            config = yaml.safe_load(f.read())
-            reminder_config = config.get('reminder')
+        parsed = read_config(os.path.join(self.config_path, path))
+        if parsed.error:
+            self.logger.error('Unable to read reminder config from %s: %s', parsed.path, parsed.error)
+            return
+        errors = []
+        try:
+            self.apply_config(parsed, errors=errors)
+        except Exception as e:
+            self.logger.debug('Unable to load reminder config from %s', parsed.path, exc_info=True)
+            errors.append((parsed.path, '{}: {}'.format(type(e).__name__, e)))
+        for path, error in errors:
+            self.logger.error('Unable to load reminder config from %s: %s', path, error)
+        if errors and self.config_cache:
+            self.config_cache.discard(parsed.path)
+
+    def apply_config(self, parsed, schedule=True, errors=None):
+        """
+        Add, reload or remove the reminders defined by a parsed config file.
+        Each reminder is diffed individually, so editing one reminder in a manifest
+        leaves the others untouched.
+
+        :param ParsedConfig parsed: Config as returned by :func:`~reminders.loader.read_config`.
+        :param bool schedule: Schedule check jobs of new reminders now.
+        :param list errors:
+            Receives ``(path, message)`` for reminders that fail to load; they are
+            logged if not given. Other reminders in the file are still applied.
+        :returns: Newly added reminders, or ``None`` if file is unchanged since last load.
+        :rtype: list
+        :raises ValueError: if the file structure is invalid.
+        """
+        path = parsed.path
+        if self._config_hashes.get(path) == parsed.digest:
+            self.logger.debug('skipping %s because its contents are unchanged', path)
+            return None
+        added = self.apply_entries(path, reminder_entries(path, parsed.config), schedule, errors)
+        self._config_hashes[path] = parsed.digest
+        return added
+
+    def apply_entries(self, path, entries, schedule=True, errors=None, moved=()):
+        """
+        Make the reminders registered for config file ``path`` match ``entries``.
+
+        :param str path: Absolute path of config file.
+        :param OrderedDict entries:
+            Reminder configs keyed by id, as returned by :func:`~reminders.loader.reminder_entries`.
+        :param bool schedule: Schedule check jobs of new reminders now.
+        :param list errors: See :func:`apply_config`.
+        :param moved:
+            Ids of reminders missing from ``entries`` because another daemon takes them
+            over. Their alert state is kept for the new owner to restore.
+        :returns: Newly added reminders.
+        :rtype: list
+        """
+        for stale in self.registry.for_config(path):
+            if stale.id not in entries:
+                self.logger.info('removing reminder %s', stale.id)
+                self.remove_reminder(stale, keep_state=stale.id in moved)
+        added = []
+        for reminder_id, reminder_config in entries.items():
             self.logger.debug('loaded reminder_config: %s', reminder_config)
-            if reminder_config:
-                self.add_reminder(reminder_config)
-                self.logger.info('loaded reminder config from %s', path)
-                self.configs[os.path.basename(path)] = self.reminders[-1]
-        # self.configs[path] = config
+            existing = self.registry.get(reminder_id)
+            try:
+                if existing is not None and existing.config_path == path:
+                    changed = self.reload_reminder(existing, reminder_config)
+                    if changed:
+                        self.logger.info('reloaded reminder %s, changed: %s', reminder_id, ', '.join(sorted(changed)))
+                else:
+                    added.append(self.add_reminder(reminder_config, config_path=path, schedule=schedule))
+                    self.logger.info('loaded reminder %s', reminder_id)
+            except Exception as e:
+                if errors is None:
+                    self.logger.error('Unable to load reminder %s', reminder_id, exc_info=True)
+                else:
+                    self.logger.debug('Unable to load reminder %s', reminder_id, exc_info=True)
+                    errors.append((path, '{}: {}: {}'.format(reminder_id, type(e).__name__, e)))
+        return added
+
+    def load_all(self, paths=None, workers=None, use_processes=True):
+        """
+        Load many config files at once.
+        Files are read and parsed in parallel, reminders are then built and validated,
+        and finally all their check jobs are scheduled in one pass.
+
+        :param list paths: Config files to load. Defaults to every config below ``config_path``.
+        :param int workers: Number of parser workers. Defaults to the number of CPUs.
+        :param bool use_processes: Parse in worker processes rather than threads.
+        :returns: Counts, errors and per-phase timings.
+        :rtype: LoadReport
+        """
+        report = LoadReport()
+        discovered = paths is None
+        with report.time('discover'):
+            if discovered:
+                paths = discover_configs(self.config_path)
+            else:
+                paths = [os.path.join(self.config_path, path) for path in paths]
+            report.files = len(paths)
+        with report.time('parse'):
+            parsed_configs = read_configs(paths, workers, use_processes, cache=self.config_cache)
+        added = []
+        with report.time('build'):
+            for parsed in parsed_configs:
+                if parsed.error:
+                    report.errors.append((parsed.path, parsed.error))
+                    continue
+                try:
+                    reminders = self.apply_config(parsed, schedule=False, errors=report.errors)
+                except Exception as e:
+                    self.logger.debug('Unable to load reminder config from %s', parsed.path, exc_info=True)
+                    report.errors.append((parsed.path, '{}: {}'.format(type(e).__name__, e)))
+                    continue
+                if reminders is None:
+                    report.skipped += 1
+                else:
+                    added.extend(reminders)
+        with report.time('schedule'):
+            for reminder in added:
+                self._schedule_checks(reminder)
+        report.reminders = len(added)
+        if self.config_cache:
+            with report.time('cache'):
+                for path, _ in report.errors:
+                    self.config_cache.discard(path)
+                if discovered:
+                    # Only a full scan knows which files are gone
+                    self.config_cache.prune(paths)
+                self.config_cache.save()
+        for path, error in report.errors:
+            self.logger.error('Unable to load reminder config from %s: %s', path, error)
+        self.logger.info('%s', report)
+        return report
 
     def on_deleted(self, event):
         """
@@ -247,10 +1057,21 @@ class ReminderDaemon(object):
         :event type: watchdog.events.FileSystemEvent
         """
         self.logger.debug('deletion event for %s', event.src_path)
-        path = os.path.basename(event.src_path)
-        if path in self.configs:
-            self.remove_reminder(self.configs[path])
-            del self.configs[path]
+        self.remove_config(os.path.abspath(event.src_path))
+
+    def remove_config(self, path):
+        """
+        Remove all reminders loaded from config file.
+
+        :param str path: Absolute path of config file.
+        """
+        self._config_hashes.pop(path, None)
+        if self.config_cache:
+            self.config_cache.discard(path)
+        reminders = self.registry.for_config(path)
+        for reminder in reminders:
+            self.remove_reminder(reminder)
+        if reminders:
             self.logger.info('removed config for %s', path)
         else:
-            self.logger.debug('No action taken for deletion event because it doesn\'t appear to exist in configs: %s', self.configs)
+            self.logger.debug('No action taken for deletion event because %s doesn\'t appear to be a loaded config', path)
@@ -0,0 +1,202 @@
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+#: Keyword arguments of an interval trigger that make up its period.
+INTERVAL_UNITS = ('weeks', 'days', 'hours', 'minutes', 'seconds')
+
+
+def interval_seconds(job):
+    """
+    Return period of an interval job in seconds.
+
+    :param dict job: Scheduler job keyword arguments.
+    :returns: Period, or ``None`` if job does not use an interval trigger.
+    :rtype: float
+    """
+    if job.get('trigger') != 'interval':
+        return None
+    return timedelta(**{unit: job[unit] for unit in INTERVAL_UNITS if unit in job}).total_seconds() or None
+
+
+def phase(key):
+    """
+    Return stable fraction in ``[0, 1)`` derived from ``key``.
+
+    :param str key: Identifier such as a reminder id.
+    :rtype: float
+    """
+    return int.from_bytes(hashlib.md5(key.encode('utf8')).digest()[:8], 'big') / 2.0 ** 64
+
+
+def spread_start(key, period, now=None):
+    """
+    Return start date placing an interval job at a fixed phase of its period.
+    Phases are aligned to the epoch rather than to load time, so a reminder keeps
+    its slot across restarts and on whichever node runs it.
+
+    :param str key: Identifier the phase is derived from.
+    :param float period: Interval in seconds.
+    :param float now: Current time as a timestamp. Defaults to :func:`time.time`.
+    :returns: First fire time after ``now``.
+    :rtype: datetime
+    """
+    now = time.time() if now is None else now
+    offset = phase(key) * period
+    start = offset + period * -(-(now - offset) // period)
+    return datetime.fromtimestamp(start, timezone.utc)
+
+
+def spread_job(job, key, now=None):
+    """
+    Return copy of interval ``job`` with a ``start_date`` from :func:`spread_start`.
+    Jobs with another trigger or an explicit start are returned unchanged.
+
+    :param dict job: Scheduler job keyword arguments.
+    :param str key: Identifier the phase is derived from.
+    :rtype: dict
+    """
+    period = interval_seconds(job)
+    if period is None or 'start_date' in job or 'next_run_time' in job:
+        return job
+    return dict(job, start_date=spread_start(key, period, now))
+
+
+class AdaptiveInterval(object):
+    """
+    Polling interval of one reminder that moves between a minimum and maximum.
+    The check job fires at the minimum interval and :meth:`poll` skips runs until
+    the current interval has passed. The interval grows by ``backoff`` each time the
+    status comes back unchanged and drops to the minimum when it changes, when the
+    condition holds, or when a watched value is near a number the condition compares it to.
+    """
+
+    def __init__(self, min_seconds, max_seconds, backoff=2.0, near=0.1, *args, **kwargs):
+        """
+        Create AdaptiveInterval object.
+
+        :param float min_seconds: Shortest interval; the period of the underlying job.
+        :param float max_seconds: Longest interval.
+        :param float backoff: Factor the interval grows by per unchanged poll.
+        :param float near:
+            Relative distance to a threshold considered close, e.g. ``0.1`` means a
+            status of 92 is close for ``status > 100``.
+        """
+        if max_seconds < min_seconds:
+            raise ValueError('max_seconds must not be less than min_seconds')
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.backoff = backoff
+        self.near = near
+        self.interval = min_seconds
+        self.polls = 0
+        self.skipped = 0
+        self._last_poll = None
+        self._next_poll = 0
+        self._was_near = False
+
+    def due(self):
+        """Return ``True`` if the current interval has passed since the last poll."""
+        # Half a period of slack so a job firing slightly early still counts
+        return time.monotonic() >= self._next_poll - self.min_seconds / 2.0
+
+    def poll(self, func, *args):
+        """Call ``func(*args)`` if due, otherwise skip this run."""
+        if not self.due():
+            self.skipped += 1
+            return
+        self.polls += 1
+        self._last_poll = time.monotonic()
+        self._next_poll = self._last_poll + self.interval
+        func(*args)
+
+    def observe(self, changed, near=None):
+        """
+        Adjust interval after a poll.
+
+        :param bool changed: Status differed from the previous poll.
+        :param bool near:
+            Condition held or a value was close to its threshold.
+            ``None`` reuses the previous answer, for polls that were not evaluated.
+        """
+        if near is None:
+            near = self._was_near
+        self._was_near = near
+        if changed or near:
+            self.interval = self.min_seconds
+        else:
+            self.interval = min(self.max_seconds, self.interval * self.backoff)
+        if self._last_poll is not None:
+            self._next_poll = self._last_poll + self.interval
+
+
+class RateLimiter(object):
+    """
+    Thread-safe token bucket.
+    Callers reserve a token and wait for their turn, so a backlog is released at
+    exactly ``rate`` per second instead of in bursts.
+    """
+
+    def __init__(self, rate, burst=1):
+        """
+        Create RateLimiter object.
+
+        :param float rate: Tokens added per second.
+        :param int burst: Maximum tokens accumulated while idle.
+        """
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = float(rate)
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """
+        Take a token, borrowing from the future if none is available.
+
+        :returns: Seconds caller must wait before using the token.
+        :rtype: float
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def try_acquire(self):
+        """
+        Take a token only if one is available now.
+
+        :rtype: bool
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def acquire(self, timeout=None):
+        """
+        Take a token, sleeping until it is available.
+
+        :param float timeout: Give up without taking a token if the wait would be longer.
+        :returns: ``True`` if a token was taken.
+        :rtype: bool
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            delay = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if timeout is not None and delay > timeout:
+                return False
+            self._tokens -= 1
+        if delay:
+            time.sleep(delay)
+        return True
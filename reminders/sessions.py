@@ -0,0 +1,228 @@
+import http.cookiejar
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from .schedules import RateLimiter
+
+
+class HostUnavailable(requests.exceptions.ConnectionError):
+    """Raised instead of sending a request the host's :class:`HostGuard` does not allow."""
+
+
+class CircuitOpen(HostUnavailable):
+    """Raised while a host's circuit breaker is open."""
+
+
+class RateLimited(HostUnavailable):
+    """Raised when a host's rate limit has no token available in time."""
+
+
+class HostGuard(object):
+    """
+    Rate limit and circuit breaker for one host, shared by every request to it.
+
+    The circuit opens after ``failure_threshold`` consecutive failures; requests then
+    fail immediately with :class:`CircuitOpen` instead of waiting on a host that is
+    down. After ``reset_timeout`` seconds a single trial request is let through and
+    its outcome closes or reopens the circuit.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, rate=None, burst=1, max_wait=0.0, failure_threshold=5, reset_timeout=30.0, *args, **kwargs):
+        """
+        Create HostGuard object.
+
+        :param float rate: Requests per second allowed to host, or ``None`` for no limit.
+        :param int burst: Requests allowed at once after the host has been idle.
+        :param float max_wait: Longest a blocking request waits for a token before failing with :class:`RateLimited`.
+        :param int failure_threshold: Consecutive failures that open the circuit, or ``0`` to disable it.
+        :param float reset_timeout: Seconds the circuit stays open before a trial request.
+        """
+        self.limiter = RateLimiter(rate, burst) if rate else None
+        self.max_wait = max_wait
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.rejected = 0
+        self.opened = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self, wait=True):
+        """
+        Claim permission to send one request.
+
+        :param bool wait: Wait up to ``max_wait`` for a rate limit token. ``False`` in event loops.
+        :raises CircuitOpen: if the circuit is open.
+        :raises RateLimited: if no token is available in time.
+        """
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial = False
+            if self.state == self.OPEN or (self.state == self.HALF_OPEN and self._trial):
+                self.rejected += 1
+                raise CircuitOpen('circuit open after {} failures'.format(self.failures))
+            if self.state == self.HALF_OPEN:
+                self._trial = True
+        if self.limiter and not self.limiter.acquire(self.max_wait if wait else 0):
+            with self._lock:
+                self.rejected += 1
+                self._trial = False
+            raise RateLimited('rate limit of {}/s exceeded'.format(self.limiter.rate))
+
+    def success(self):
+        """Record request that got a usable response."""
+        with self._lock:
+            self.failures = 0
+            self._trial = False
+            self.state = self.CLOSED
+
+    def failure(self):
+        """Record request that errored, timed out or got a 429 or 5xx response."""
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.state == self.HALF_OPEN or (self.failure_threshold and self.state == self.CLOSED and
+                                                 self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self.opened += 1
+
+    def record(self, status_code):
+        """Record outcome of a request from its response status code."""
+        if status_code == 429 or status_code >= 500:
+            self.failure()
+        else:
+            self.success()
+
+
+class SessionPool(object):
+    """Pool of keep-alive HTTP sessions shared by all watchers and alerters of a daemon."""
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, max_retries=0, timeout=10, guard_kwargs=None, hosts=None,
+                 *args, **kwargs):
+        """
+        Create SessionPool object.
+
+        :param int pool_connections: Number of connection pools to cache per session.
+        :param int pool_maxsize: Maximum number of connections kept alive per host.
+        :param int max_retries: Number of retries for failed connections.
+        :param timeout:
+            Default timeout passed to requests when the caller does not specify one.
+            May be a number or a (connect, read) tuple.
+        :param dict guard_kwargs:
+            Keyword arguments for the :class:`HostGuard` of every host, such as ``rate``
+            and ``failure_threshold``.
+        :param dict hosts: Per-host overrides of ``guard_kwargs``, keyed by ``host[:port]``.
+        """
+        self._logger = logging.getLogger(__name__)
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.sessions = {}
+        self.guard_kwargs = dict(guard_kwargs or {})
+        self.hosts = {host.lower(): dict(self.guard_kwargs, **overrides) for host, overrides in (hosts or {}).items()}
+        self.guards = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host_key(url):
+        """
+        Return key identifying the host a url belongs to.
+
+        :param str url: Request url.
+        :returns: (scheme, netloc) tuple
+        :rtype: tuple
+        """
+        parts = urlsplit(url)
+        return parts.scheme.lower(), parts.netloc.lower()
+
+    def session_for(self, url):
+        """
+        Return the keep-alive session used for the host of ``url``, creating it if needed.
+
+        :param str url: Request url.
+        :rtype: requests.Session
+        """
+        key = self.host_key(url)
+        session = self.sessions.get(key)
+        if session is None:
+            with self._lock:
+                session = self.sessions.get(key)
+                if session is None:
+                    session = self._new_session()
+                    self.sessions[key] = session
+                    self._logger.debug('created session for %s://%s', *key)
+        return session
+
+    def guard_for(self, url):
+        """
+        Return the HostGuard for the host of ``url``, creating it if needed.
+
+        :param str url: Request url.
+        :rtype: HostGuard
+        """
+        key = self.host_key(url)
+        guard = self.guards.get(key)
+        if guard is None:
+            with self._lock:
+                guard = self.guards.get(key)
+                if guard is None:
+                    guard = HostGuard(**self.hosts.get(key[1], self.guard_kwargs))
+                    self.guards[key] = guard
+        return guard
+
+    def _new_session(self):
+        session = requests.Session()
+        # Session is shared by every reminder polling the host, so cookies one receives must not reach others
+        session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize,
+                              max_retries=self.max_retries, pool_block=False)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def request(self, method, url, **kwargs):
+        """
+        Send request through the pooled session for ``url``, subject to the host's :class:`HostGuard`.
+
+        :param str method: HTTP method.
+        :param str url: Request url.
+        :param kwargs: Keyword arguments passed to :meth:`requests.Session.request`.
+        :rtype: requests.Response
+        :raises HostUnavailable: without sending if the host's guard does not allow the request.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        guard = self.guard_for(url)
+        guard.allow()
+        try:
+            response = self.session_for(url).request(method, url, **kwargs)
+        except requests.RequestException:
+            guard.failure()
+            raise
+        guard.record(response.status_code)
+        return response
+
+    def get(self, url, **kwargs):
+        """Pooled equivalent of requests.get()"""
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """Pooled equivalent of requests.post()"""
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        """Close all sessions and release their connections."""
+        with self._lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
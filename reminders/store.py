@@ -0,0 +1,242 @@
+import hashlib
+import importlib
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+
+
+def preferred_owner(name, nodes):
+    """
+    Return the node that should own ``name`` using rendezvous hashing.
+    Adding or removing a node only moves the names that node gains or loses.
+
+    :param str name: Lease name, usually a reminder id.
+    :param list nodes: Ids of live nodes.
+    :rtype: str
+    """
+    if not nodes:
+        return None
+    return max(nodes, key=lambda node: hashlib.md5('{}\0{}'.format(node, name).encode('utf8')).digest())
+
+
+class StateStore(object):
+    """
+    Storage shared by daemon nodes for alert state, node heartbeats and leases.
+    Subclass to add a backend; see :func:`store_from`.
+
+    A lease gives one node the exclusive right to check and alert for a reminder
+    until it expires. Expiry times are wall clock seconds, so nodes sharing a store
+    need reasonably synchronised clocks.
+    """
+
+    def get_state(self, name):
+        """
+        Return persisted state for ``name``.
+
+        :param str name: Reminder id.
+        :returns: State dict, or ``None`` if nothing was stored.
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def put_state(self, name, state):
+        """
+        Persist state for ``name``.
+
+        :param str name: Reminder id.
+        :param dict state: JSON serialisable state.
+        """
+        raise NotImplementedError
+
+    def delete_state(self, name):
+        """Forget persisted state for ``name``."""
+        raise NotImplementedError
+
+    def heartbeat(self, node, group, ttl):
+        """
+        Mark node alive for ``ttl`` seconds.
+
+        :param str node: Id of calling node.
+        :param str group: Nodes only share reminders with nodes of the same group.
+        :param float ttl: Seconds until node is considered dead; ``0`` removes node from the group.
+        :returns: Ids of live nodes in ``group``, including ``node`` unless ``ttl`` is ``0``.
+        :rtype: list
+        """
+        raise NotImplementedError
+
+    def acquire(self, node, names, ttl):
+        """
+        Take or renew leases. A lease is granted if it is free, expired or already held by ``node``.
+
+        :param str node: Id of calling node.
+        :param list names: Lease names wanted by node.
+        :param float ttl: Seconds until granted leases expire.
+        :returns: Names of ``names`` now held by node.
+        :rtype: set
+        """
+        raise NotImplementedError
+
+    def release(self, node, names):
+        """Give up leases held by ``node`` so other nodes can take them immediately."""
+        raise NotImplementedError
+
+    def close(self):
+        """Release resources held by store."""
+
+
+class MemoryStateStore(StateStore):
+    """In-process store. State is lost on exit; leases are only shared by daemons of one process."""
+
+    def __init__(self, *args, **kwargs):
+        self._state = {}
+        self._nodes = {}
+        self._leases = {}
+        self._lock = threading.Lock()
+
+    def get_state(self, name):
+        with self._lock:
+            state = self._state.get(name)
+            return dict(state) if state is not None else None
+
+    def put_state(self, name, state):
+        with self._lock:
+            self._state[name] = dict(state)
+
+    def delete_state(self, name):
+        with self._lock:
+            self._state.pop(name, None)
+
+    def heartbeat(self, node, group, ttl):
+        now = time.time()
+        with self._lock:
+            self._nodes[node] = (group, now + ttl)
+            return sorted(n for n, (g, expires) in self._nodes.items() if g == group and expires > now)
+
+    def acquire(self, node, names, ttl):
+        now = time.time()
+        granted = set()
+        with self._lock:
+            for name in names:
+                owner, expires = self._leases.get(name, (None, 0))
+                if owner == node or expires <= now:
+                    self._leases[name] = (node, now + ttl)
+                    granted.add(name)
+        return granted
+
+    def release(self, node, names):
+        with self._lock:
+            for name in names:
+                if self._leases.get(name, (None, 0))[0] == node:
+                    del self._leases[name]
+
+
+class SQLiteStateStore(StateStore):
+    """
+    Store backed by a SQLite database file.
+    Daemons on one host, or on hosts sharing a filesystem with working locks,
+    can use the same file to split reminders and fail over.
+    """
+
+    def __init__(self, path='reminders.db', timeout=10, *args, **kwargs):
+        """
+        Create SQLiteStateStore object.
+
+        :param str path: Database file, created if missing.
+        :param float timeout: Seconds to wait for another process holding the database lock.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        with self._lock:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS state '
+                             '(name TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS nodes '
+                             '(node TEXT PRIMARY KEY, node_group TEXT NOT NULL, expires REAL NOT NULL)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS leases '
+                             '(name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)')
+
+    def _transaction(self, statements):
+        """Run ``statements(cursor)`` in a write transaction and return its result."""
+        with self._lock:
+            cursor = self._db.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                result = statements(cursor)
+            except BaseException:
+                cursor.execute('ROLLBACK')
+                raise
+            cursor.execute('COMMIT')
+            return result
+
+    def get_state(self, name):
+        with self._lock:
+            row = self._db.execute('SELECT state FROM state WHERE name = ?', (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_state(self, name, state):
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO state (name, state, updated) VALUES (?, ?, ?)',
+                             (name, json.dumps(state), time.time()))
+
+    def delete_state(self, name):
+        with self._lock:
+            self._db.execute('DELETE FROM state WHERE name = ?', (name,))
+
+    def heartbeat(self, node, group, ttl):
+        now = time.time()
+
+        def statements(cursor):
+            cursor.execute('INSERT OR REPLACE INTO nodes (node, node_group, expires) VALUES (?, ?, ?)',
+                           (node, group, now + ttl))
+            cursor.execute('DELETE FROM nodes WHERE expires <= ?', (now,))
+            return sorted(row[0] for row in cursor.execute(
+                'SELECT node FROM nodes WHERE node_group = ? AND expires > ?', (group, now)))
+        return self._transaction(statements)
+
+    def acquire(self, node, names, ttl):
+        now = time.time()
+        names = list(names)
+
+        def statements(cursor):
+            cursor.executemany(
+                'INSERT INTO leases (name, owner, expires) VALUES (?, ?, ?) '
+                'ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires '
+                'WHERE leases.owner = excluded.owner OR leases.expires <= ?',
+                ((name, node, now + ttl, now) for name in names))
+            held = {row[0] for row in cursor.execute(
+                'SELECT name FROM leases WHERE owner = ? AND expires > ?', (node, now))}
+            return held.intersection(names)
+        return self._transaction(statements)
+
+    def release(self, node, names):
+        names = list(names)
+        if names:
+            self._transaction(lambda cursor: cursor.executemany(
+                'DELETE FROM leases WHERE name = ? AND owner = ?', ((name, node) for name in names)))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def store_from(store_kwargs):
+    """
+    Create StateStore from configuration.
+
+    :param dict store_kwargs:
+        Keyword arguments for the store. ``type`` selects the class, either the name
+        of a class in this module or a dotted ``module.Class`` path for other backends.
+        Defaults to :class:`SQLiteStateStore`.
+    :rtype: StateStore
+    """
+    kwargs = dict(store_kwargs)
+    store_type = kwargs.pop('type', 'SQLiteStateStore')
+    module_name, _, class_name = store_type.rpartition('.')
+    module = importlib.import_module(module_name) if module_name else sys.modules[__name__]
+    store = getattr(module, class_name)(**kwargs)
+    logging.getLogger(__name__).debug('created %s state store', store_type)
+    return store
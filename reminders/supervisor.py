@@ -0,0 +1,234 @@
+import bisect
+import hashlib
+import logging
+import multiprocessing
+import os
+from collections import OrderedDict
+from watchdog.observers import Observer
+from watchdog.events import PatternMatchingEventHandler
+from .loader import CONFIG_EXTENSIONS, discover_configs, read_config, read_configs, reminder_entries
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode('utf8')).digest()[:8], 'big')
+
+
+class ShardRing(object):
+    """
+    Consistent hash ring mapping reminder ids to shards.
+    Changing the number of shards only moves about ``1/shards`` of the ids.
+    """
+
+    def __init__(self, shards, virtual_nodes=128):
+        """
+        Create ShardRing object.
+
+        :param int shards: Number of shards.
+        :param int virtual_nodes: Points on the ring per shard; more gives a more even spread.
+        """
+        self.shards = shards
+        self.virtual_nodes = virtual_nodes
+        points = sorted((_hash('{}-{}'.format(shard, node)), shard)
+                        for shard in range(shards) for node in range(virtual_nodes))
+        self._points = [point for point, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    def shard_for(self, key):
+        """
+        Return index of shard owning ``key``.
+
+        :param str key: Reminder id.
+        :rtype: int
+        """
+        i = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[i]
+
+
+def _run_shard(index, commands, daemon_kwargs, logger_level):
+    """Entry point of shard worker processes."""
+    # Imported here so spawned workers only pay for it once they run
+    from .reminder import ReminderDaemon
+    logging.basicConfig(level=logger_level or logging.INFO,
+                        format='%(asctime)s shard-{} %(name)s %(levelname)s %(message)s'.format(index))
+    # Shards with the same index on different hosts hold the same reminders and share leases
+    daemon_kwargs = dict(daemon_kwargs)
+    daemon_kwargs.setdefault('node_group', 'shard-{}'.format(index))
+    if daemon_kwargs.get('metrics_port'):
+        # Each shard serves its own metrics on consecutive ports
+        daemon_kwargs['metrics_port'] += index
+    daemon = ReminderDaemon(blocking=False, watch_configs=False, logger_level=logger_level, **daemon_kwargs)
+    daemon.start()
+    while True:
+        command, args = commands.get()
+        if command == 'stop':
+            break
+        try:
+            getattr(daemon, command)(*args)
+        except Exception:
+            daemon.logger.error('shard %d failed to run %s', index, command, exc_info=True)
+    daemon.stop()
+
+
+class Supervisor(object):
+    """
+    Runs reminders across several worker processes, each with its own
+    :class:`~reminders.reminder.ReminderDaemon`.
+    Reminders are assigned to shards by a consistent hash of their id. The supervisor
+    watches the config directory and forwards each file's reminders to the owning shards.
+    """
+
+    def __init__(self, config_path='.', shards=None, daemon_kwargs=None, logger_level=None, virtual_nodes=128,
+                 *args, **kwargs):
+        """
+        Create Supervisor object.
+
+        :param str config_path: Path to configuration files.
+        :param int shards: Number of worker processes. Defaults to the number of CPUs.
+        :param dict daemon_kwargs: Keyword arguments for each shard's ReminderDaemon.
+        :param int logger_level: Level to set logger to, in supervisor and shards.
+        :param int virtual_nodes: Points on the hash ring per shard.
+        """
+        self.logger = logging.getLogger(__name__)
+        if logger_level:
+            self.logger.setLevel(logger_level)
+        self.config_path = os.path.abspath(config_path)
+        self.daemon_kwargs = dict(daemon_kwargs or {}, config_path=self.config_path)
+        self.logger_level = logger_level
+        self.virtual_nodes = virtual_nodes
+        self.ring = ShardRing(shards or os.cpu_count() or 1, virtual_nodes)
+        self.workers = []
+        self._context = multiprocessing.get_context('spawn')
+        self._files = {}
+        self._hashes = {}
+        self._assigned = {}
+        self._observer = Observer()
+        self._watchdog_handler = PatternMatchingEventHandler(['*' + ext for ext in CONFIG_EXTENSIONS])
+        self._watchdog_handler.on_created = self.on_created
+        self._watchdog_handler.on_modified = self.on_created
+        self._watchdog_handler.on_deleted = self.on_deleted
+        self._observer.schedule(self._watchdog_handler, self.config_path, recursive=True)
+
+    @property
+    def shards(self):
+        return self.ring.shards
+
+    def _spawn(self, index):
+        commands = self._context.Queue()
+        process = self._context.Process(target=_run_shard, name='reminders-shard-{}'.format(index),
+                                        args=(index, commands, self.daemon_kwargs, self.logger_level))
+        process.start()
+        return process, commands
+
+    def _send(self, shard, command, *args):
+        self.workers[shard][1].put((command, args))
+
+    def start(self):
+        """Start shard processes, load all configs and watch for changes."""
+        self.workers = [self._spawn(index) for index in range(self.shards)]
+        self.load_all()
+        self._observer.start()
+
+    def run(self):
+        """Start and block until interrupted."""
+        self.start()
+        try:
+            for process, _ in list(self.workers):
+                process.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        """Stop watching configs and shut down all shards."""
+        if self._observer.is_alive():
+            self._observer.stop()
+        for index in range(len(self.workers)):
+            self._send(index, 'stop')
+        for process, _ in self.workers:
+            process.join()
+        self.workers = []
+
+    def load_all(self):
+        """Parse every config below ``config_path`` and distribute its reminders."""
+        for parsed in read_configs(discover_configs(self.config_path)):
+            self.apply(parsed)
+
+    def apply(self, parsed):
+        """
+        Forward the reminders of a parsed config file to their owning shards.
+
+        :param ParsedConfig parsed: Config as returned by :func:`~reminders.loader.read_config`.
+        """
+        if parsed.error:
+            self.logger.error('Unable to read reminder config from %s: %s', parsed.path, parsed.error)
+            return
+        if self._hashes.get(parsed.path) == parsed.digest:
+            return
+        try:
+            entries = reminder_entries(parsed.path, parsed.config)
+        except ValueError as e:
+            self.logger.error('Unable to load reminder config from %s: %s', parsed.path, e)
+            return
+        self._files[parsed.path] = entries
+        self._hashes[parsed.path] = parsed.digest
+        self._distribute(parsed.path, entries, force=True)
+
+    def _distribute(self, path, entries, force=False):
+        """Send each shard its part of ``entries``; unchanged parts are skipped unless ``force``."""
+        parts = [OrderedDict() for _ in range(self.shards)]
+        for reminder_id, reminder_config in entries.items():
+            parts[self.ring.shard_for(reminder_id)][reminder_id] = reminder_config
+        for shard, part in enumerate(parts):
+            previous = self._assigned.get((shard, path))
+            if not part and previous is None:
+                continue
+            if force or set(part) != previous:
+                # Reminders leaving this shard keep their alert state so the new shard can restore it
+                moved = sorted(previous.difference(part).intersection(entries)) if previous else []
+                self._send(shard, 'apply_entries', path, part, True, None, moved)
+            if part:
+                self._assigned[(shard, path)] = set(part)
+            else:
+                self._assigned.pop((shard, path), None)
+
+    def remove(self, path):
+        """Remove reminders of config file from every shard holding some."""
+        self._files.pop(path, None)
+        self._hashes.pop(path, None)
+        for shard in range(self.shards):
+            if self._assigned.pop((shard, path), None) is not None:
+                self._send(shard, 'remove_config', path)
+
+    def resize(self, shards):
+        """
+        Change number of shards and move reminders whose owner changed.
+        With a state store in ``daemon_kwargs`` active alerts of moved reminders are
+        restored by their new shard once the old one has released them.
+
+        :param int shards: New number of worker processes.
+        """
+        old = self.shards
+        if shards == old:
+            return
+        self.ring = ShardRing(shards, self.virtual_nodes)
+        for index in range(old, shards):
+            self.workers.append(self._spawn(index))
+        for path, entries in self._files.items():
+            self._distribute(path, entries)
+        for index in range(shards, old):
+            self._send(index, 'stop')
+            self.workers[index][0].join()
+            for key in [key for key in self._assigned if key[0] == index]:
+                del self._assigned[key]
+        del self.workers[shards:]
+        self.logger.info('resized from %d to %d shards', old, shards)
+
+    def on_created(self, event):
+        """Callback for watchdog created/modified events."""
+        if not event.is_directory:
+            self.apply(read_config(os.path.abspath(event.src_path)))
+
+    def on_deleted(self, event):
+        """Callback for watchdog deleted events."""
+        self.remove(os.path.abspath(event.src_path))
@@ -1,11 +1,214 @@
-import logging
+import asyncio
+import json
+import threading
+import time
+from collections import namedtuple
 from json import JSONDecodeError
-import requests
+from urllib.parse import urlsplit
 import jmespath
+from .components import component_for
+from .sessions import SessionPool
+from .engine import aiohttp_request_kwargs
+from .mqtt import BrokerKey, MQTTManager
+from .evaluation import EvaluationQueue
+from .logs import Lazy, logger_for
+
+
+CachedResponse = namedtuple('CachedResponse', ['body', 'etag', 'last_modified', 'version'])
+CachedResponse.__doc__ = """
+Decoded response shared by watchers issuing the same request.
+``version`` only changes when a new body is received, so a ``304 Not Modified``
+keeps the previous version.
+"""
+
+
+class ResponseCache(object):
+    """
+    Coalesces identical requests from different watchers.
+    Concurrent fetches of the same request share one in-flight call and the
+    decoded body is reused by later fetches until ``ttl`` expires.
+    The last response is kept after expiry so its validators can be used for
+    conditional requests, until the last watcher issuing the request releases it.
+    """
+
+    def __init__(self, ttl=1.0, *args, **kwargs):
+        """
+        Create ResponseCache object.
+
+        :param float ttl:
+            Seconds a decoded response is reused for.
+            ``0`` only coalesces requests that are in flight at the same time.
+        """
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = {}
+        self._users = {}
+        self._pending = {}
+        self._async_pending = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def request_key(method, request_kwargs):
+        """
+        Return identity of a request, equal for watchers issuing the same request.
+
+        :param str method: HTTP method.
+        :param dict request_kwargs: Keyword arguments passed to requests.
+        :rtype: str
+        """
+        return method.upper() + ' ' + json.dumps(request_kwargs, sort_keys=True, default=str)
+
+    def acquire(self, key):
+        """
+        Register a watcher issuing request ``key``.
+
+        :param str key: Request identity from :func:`request_key`.
+        """
+        with self._lock:
+            self._users[key] = self._users.get(key, 0) + 1
+
+    def release(self, key):
+        """
+        Unregister a watcher of request ``key``, dropping its response once no watcher issues it.
+
+        :param str key: Request identity from :func:`request_key`.
+        """
+        with self._lock:
+            users = self._users.get(key, 0) - 1
+            if users > 0:
+                self._users[key] = users
+            else:
+                self._users.pop(key, None)
+                self._entries.pop(key, None)
+
+    def _cached(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            self.hits += 1
+            return True, entry[1]
+        return False, None
+
+    def _store(self, key, response):
+        self._entries[key] = (time.monotonic(), response)
+
+    def previous(self, key):
+        """
+        Return last response stored for ``key`` regardless of age.
+
+        :rtype: CachedResponse
+        """
+        entry = self._entries.get(key)
+        return entry[1] if entry is not None else None
+
+    def fetch(self, key, loader):
+        """
+        Return response for ``key``, calling ``loader(previous)`` only if no fresh or in-flight result exists.
+
+        :param str key: Request identity from :func:`request_key`.
+        :param callable loader:
+            Performs the request given the previous :class:`CachedResponse` (or ``None``)
+            and returns a new CachedResponse.
+        :rtype: CachedResponse
+        """
+        with self._lock:
+            found, response = self._cached(key)
+            if found:
+                return response
+            pending = self._pending.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._pending[key] = _PendingFetch()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not owner:
+            return pending.wait()
+        try:
+            pending.result = loader(self.previous(key))
+            with self._lock:
+                self._store(key, pending.result)
+            return pending.result
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.event.set()
+
+    async def async_fetch(self, key, loader):
+        """
+        Coroutine version of :func:`fetch`.
+
+        :param str key: Request identity from :func:`request_key`.
+        :param loader: Coroutine function taking the previous response and returning a new one.
+        :rtype: CachedResponse
+        """
+        found, response = self._cached(key)
+        if found:
+            return response
+        future = self._async_pending.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+        self.misses += 1
+        future = self._async_pending[key] = asyncio.ensure_future(loader(self.previous(key)))
+        try:
+            response = await asyncio.shield(future)
+            self._store(key, response)
+            return response
+        finally:
+            del self._async_pending[key]
+
+    def clear(self):
+        """Drop all cached responses."""
+        with self._lock:
+            self._entries.clear()
+
+
+class _PendingFetch(object):
+    """Result slot for a fetch other threads are waiting on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        self.event.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+_expressions = {}
+
+
+def compile_expression(expression):
+    """
+    Return compiled JMESPath expression, shared by all watchers using the same text.
+
+    :param str expression: JMESPath expression.
+    :raises jmespath.exceptions.ParseError: if expression is invalid.
+    """
+    compiled = _expressions.get(expression)
+    if compiled is None:
+        compiled = _expressions.setdefault(expression, jmespath.compile(expression))
+    return compiled
 
 
 class Watcher(object):
     """Base Watcher object for resource monitoring"""
+    #: ``True`` if update() may block, in which case async_update() runs it in an executor.
+    blocking = True
+    #: Names of status fields conditions may reference directly.
+    fields = ()
+    #: ``False`` if the last update() returned a status known to be unchanged.
+    changed = True
+    #: Host polled by watcher, used to look up reminders by upstream.
+    target = None
 
     def __init__(self, reminder, schedules, *args, **kwargs):
         """
@@ -16,11 +219,10 @@ class Watcher(object):
             Initial job schedules for watcher to use.
             *Possibly going to be removed from base class*
         """
-        self._logger = logging.getLogger(__name__)
+        self._logger = logger_for(reminder, __name__)
         self.reminder = reminder
         self.schedules = schedules
-        self._logger.setLevel(reminder._logger.level)
-        self._logger.debug('new watcher created: {}'.format(self.__dict__))
+        self._logger.debug('new watcher created: %s', Lazy(vars, self))
 
     def update(self):
         """
@@ -29,11 +231,24 @@ class Watcher(object):
         """
         raise NotImplementedError('update() not yet implemented')
 
+    def close(self):
+        """Release resources held by watcher when its reminder is removed."""
+        pass
+
+    async def async_update(self):
+        """
+        Coroutine version of update() used by :class:`~reminders.engine.AsyncEngine`.
+        Defaults to running update() in the event loop's executor if it may block.
+        """
+        if not self.blocking:
+            return self.update()
+        return await asyncio.get_running_loop().run_in_executor(None, self.update)
+
 
 class HTTPWatcher(Watcher):
     """Watcher object for monitoring HTTP(S) REST Resource."""
 
-    def __init__(self, request_kwargs, json_expression, *args, **kwargs):
+    def __init__(self, request_kwargs, json_expression, conditional=True, *args, **kwargs):
         """
         Create HTTPWatcher object.
         note: 
@@ -41,51 +256,158 @@ class HTTPWatcher(Watcher):
 
         :param dict request_kwargs:
             Dictionary containing keyword arguments to be passed to requests.get()
-        :param str json_expression:
+            Requests are sent through the daemon's :class:`~reminders.sessions.SessionPool`.
+        :param json_expression:
             JMESPath expression to be used to retrieve status from results JSON object.
+            May also be a dict of ``name: expression`` in which case status is a dict of
+            the named results and each name can be used directly in the condition.
+        :param bool conditional:
+            Send ``If-None-Match``/``If-Modified-Since`` using validators from the previous
+            response. On ``304 Not Modified`` the previous body is reused and
+            :attr:`changed` is ``False``.
         """
         super().__init__(*args, **kwargs)
         self.request_kwargs = request_kwargs
         self.json_expression = json_expression
+        if isinstance(json_expression, dict):
+            for name in json_expression:
+                if not str(name).isidentifier():
+                    raise ValueError('json_expression name {!r} is not a valid identifier'.format(name))
+            self.expressions = {name: compile_expression(expr) for name, expr in json_expression.items()}
+            self.fields = tuple(self.expressions)
+        else:
+            self.expressions = compile_expression(json_expression)
+        self.conditional = conditional
+        self.target = urlsplit(request_kwargs.get('url', '')).netloc.lower() or None
+        self.request_key = ResponseCache.request_key('GET', request_kwargs)
+        self._version = None
+        component_for(self.reminder, 'response_cache', ResponseCache).acquire(self.request_key)
+
+    def close(self):
+        """Release cached response of request unless other watchers still issue it."""
+        component_for(self.reminder, 'response_cache', ResponseCache).release(self.request_key)
+
+    def extract(self, body):
+        """
+        Apply compiled expression(s) to decoded body.
+
+        :param body: Decoded JSON response.
+        :returns: Single result or dict of named results.
+        """
+        if isinstance(self.expressions, dict):
+            return {name: expression.search(body) for name, expression in self.expressions.items()}
+        return self.expressions.search(body)
 
     def update(self):
-        """Return resource status for Reminder to evaluate."""
-        response = requests.get(**self.request_kwargs)
+        """
+        Return resource status for Reminder to evaluate.
+        Watchers sharing a request reuse one decoded body via :class:`ResponseCache`.
+        """
+        cache = component_for(self.reminder, 'response_cache', ResponseCache)
+        return self._result(cache.fetch(self.request_key, self._fetch))
+
+    def _result(self, response):
+        self.changed = response.version != self._version
+        self._version = response.version
+        return self.extract(response.body)
+
+    def _conditional_kwargs(self, previous):
+        """Return request_kwargs with validator headers from ``previous`` added."""
+        if not self.conditional or previous is None or not (previous.etag or previous.last_modified):
+            return self.request_kwargs
+        headers = dict(self.request_kwargs.get('headers') or {})
+        if previous.etag:
+            headers['If-None-Match'] = previous.etag
+        if previous.last_modified:
+            headers['If-Modified-Since'] = previous.last_modified
+        return dict(self.request_kwargs, headers=headers)
+
+    def _response(self, previous, status_code, headers, body):
+        """Build CachedResponse, reusing ``previous`` on 304."""
+        if status_code == 304 and previous is not None:
+            self._logger.debug('resource not modified')
+            return previous
+        version = previous.version + 1 if previous is not None else 0
+        return CachedResponse(body, headers.get('ETag'), headers.get('Last-Modified'), version)
+
+    def _fetch(self, previous):
+        pool = component_for(self.reminder, 'session_pool', SessionPool)
+        response = pool.get(**self._conditional_kwargs(previous))
+        body = None
+        if response.status_code != 304:
+            try:
+                body = response.json()
+            except JSONDecodeError:
+                self._logger.error('Unable to decode JSON from %s', response)
+        return self._response(previous, response.status_code, response.headers, body)
+
+    async def async_update(self):
+        """Return resource status using the daemon's non-blocking HTTP session."""
+        session = getattr(getattr(self.reminder._daemon, 'engine', None), 'http_session', None)
+        if session is None:
+            return await super().async_update()
+        response = await component_for(self.reminder, 'response_cache', ResponseCache).async_fetch(
+            self.request_key, lambda previous: self._async_fetch(session, previous))
+        return self._result(response)
+
+    async def _async_fetch(self, session, previous):
+        pool = component_for(self.reminder, 'session_pool', SessionPool)
+        guard = pool.guard_for(self.request_kwargs.get('url', ''))
+        guard.allow(wait=False)
         try:
-            result = jmespath.search(self.json_expression, response.json())
-        except JSONDecodeError:
-            self._logger.error('Unable to decode JSON from {}'.format(response))
-            result = None
-        return result
+            async with session.get(**aiohttp_request_kwargs(self._conditional_kwargs(previous))) as response:
+                body = None
+                if response.status != 304:
+                    try:
+                        body = await response.json(content_type=None)
+                    except ValueError:
+                        self._logger.error('Unable to decode JSON from %s', response.url)
+        except Exception:
+            guard.failure()
+            raise
+        guard.record(response.status)
+        return self._response(previous, response.status, response.headers, body)
 
 
 class MQTTWatcher(Watcher):
     """Watcher object for monitoring MQTT Resource."""
+    blocking = False
 
-    def __init__(self, hostname, port=1883, tls=False, topic_kwargs=None, username=None, password=None, *args, **kwargs):
+    def __init__(self, hostname, port=1883, tls=False, topic_kwargs=None, username=None, password=None,
+                 debounce=None, *args, **kwargs):
         """
         Create MQTTWatcher object.
 
         :param str hostname: url for MQTT client to connect to.
         :param int port: port to be used for MQTT connection.
         :param bool tls: Use SSL/TLS for secure connection.
-        :param dict topic_kwargs: 
-            Dictionary containing:
-                * topic to monitor
-                * condition to start Alerter
-                * condition to cancel Alerter
+        :param topic_kwargs:
+            Topic filter(s) to monitor, as a `str`, a list, or a dict keyed by topic filter.
+            Filters may use ``+`` and ``#`` wildcards.
         .. note:: May be replaced with just topic as `str` in future.
         :param str username: Username for MQTT client authentication.
         :param str password: Password for MQTT client authentication.
+        :param float debounce:
+            Seconds to collect messages before evaluating the reminder against the latest one.
+            Defaults to the daemon's :class:`~reminders.evaluation.EvaluationQueue` setting.
+
+        Watchers with the same hostname, port, tls and credentials share one
+        connection from the daemon's :class:`~reminders.mqtt.MQTTManager`.
         """
         super().__init__(*args, **kwargs)
         self.topic_kwargs = topic_kwargs
-        self._client = paho.Client()
+        self.topics = [topic_kwargs] if isinstance(topic_kwargs, str) else list(topic_kwargs or [])
+        self.broker_key = BrokerKey(hostname, port, tls, username, password)
+        self.target = '{}:{}'.format(hostname, port)
+        self.debounce = debounce
         self.status = None
-        for topic in topic_kwargs:
-            self._client.message_add_callback(topic, listener_callback)
+        component_for(self.reminder, 'mqtt', MQTTManager).subscribe(self)
+
+    def close(self):
+        """Unsubscribe from broker."""
+        component_for(self.reminder, 'mqtt', MQTTManager).unsubscribe(self)
 
-    def listener_callback(client, userdata, msg):
+    def listener_callback(self, client, userdata, msg):
         """
         Callback to set status when msg received on monitored topic.
 
@@ -98,8 +420,8 @@ class MQTTWatcher(Watcher):
             self.status = msg.payload if isinstance(msg.payload, str) else msg.payload.decode('utf8')
         except UnicodeDecodeError:
             self.status = 'ERR'
-        # Trigger condition evaluation on callback
-        self.reminder.check()
+        # Queue condition evaluation rather than running it on the network thread
+        component_for(self.reminder, 'evaluations', EvaluationQueue).submit(self.reminder, self.debounce)
 
     def update(self):
         """Return status for Reminder evaluation."""
@@ -107,6 +429,7 @@ class MQTTWatcher(Watcher):
 
 class NullWatcher(Watcher):
     """Empty watcher for timed reminders"""
+    blocking = False
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
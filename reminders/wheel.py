@@ -0,0 +1,387 @@
+import logging
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from apscheduler.events import JobSubmissionEvent, JobExecutionEvent, EVENT_ALL, EVENT_JOB_SUBMITTED, \
+    EVENT_JOB_EXECUTED, EVENT_JOB_ERROR
+from apscheduler.jobstores.base import JobLookupError
+from apscheduler.triggers.base import BaseTrigger
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.util import astimezone, convert_to_datetime
+from .schedules import INTERVAL_UNITS
+
+#: Trigger names accepted by :meth:`WheelScheduler.add_job`.
+TRIGGERS = {'interval': IntervalTrigger, 'date': DateTrigger, 'cron': CronTrigger}
+#: Interval arguments handled natively by the wheel without an APScheduler trigger.
+NATIVE_INTERVAL_ARGS = INTERVAL_UNITS + ('start_date', 'jitter')
+#: APScheduler ``add_job`` options accepted for compatibility. The wheel always
+#: coalesces missed runs and never runs two instances of a job at once.
+IGNORED_OPTIONS = ('misfire_grace_time', 'coalesce', 'max_instances', 'replace_existing', 'jobstore', 'executor')
+
+
+class WheelJob(object):
+    """Job scheduled on a :class:`WheelScheduler`."""
+    __slots__ = ('id', 'name', 'func', 'args', 'kwargs', 'interval', 'jitter', 'trigger', 'base', 'due', 'slot',
+                 'running', 'previous_fire_time', '_scheduler')
+
+    def __init__(self, scheduler, func, args, kwargs, id, name, interval, trigger, jitter=0):
+        self._scheduler = scheduler
+        self.id = id
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        #: Period in ticks for native interval jobs, otherwise ``None``.
+        self.interval = interval
+        #: Maximum random delay in ticks added to each run of a native interval job.
+        self.jitter = jitter
+        #: APScheduler trigger computing fire times of other jobs.
+        self.trigger = trigger
+        #: Unjittered due tick of native interval jobs.
+        self.base = None
+        self.due = None
+        self.slot = None
+        self.running = False
+        self.previous_fire_time = None
+
+    @property
+    def next_run_time(self):
+        """Time job is next due, or ``None`` if it is not scheduled."""
+        if self.due is None:
+            return None
+        return self._scheduler.datetime_at(self.due)
+
+    def remove(self):
+        """Unschedule job."""
+        self._scheduler.remove_job(self.id)
+
+    def __repr__(self):
+        return '<WheelJob {} due {}>'.format(self.id, self.next_run_time)
+
+
+class TimingWheel(object):
+    """
+    Hierarchical timing wheel.
+    Level 0 has one slot per tick; each higher level has slots spanning a whole
+    revolution of the level below, and its jobs cascade down as their slot comes up.
+    Inserting and cancelling a job are O(1), as is advancing one tick apart from
+    the cascaded jobs.
+    """
+
+    def __init__(self, bits=8, levels=4):
+        """
+        Create TimingWheel object.
+
+        :param int bits: Slots per level as a power of two.
+        :param int levels:
+            Number of levels. Jobs further than ``2 ** (bits * levels)`` ticks away
+            are parked in the top level and re-inserted until they come into range.
+        """
+        self.bits = bits
+        self.levels = levels
+        self.size = 1 << bits
+        self.mask = self.size - 1
+        self.now = 0
+        self.count = 0
+        self._slots = [[set() for _ in range(self.size)] for _ in range(levels)]
+
+    def insert(self, job):
+        """
+        Schedule job for tick ``job.due``; due ticks in the past fire on the next tick.
+
+        :param WheelJob job: Job whose ``due`` is set.
+        """
+        if job.due <= self.now:
+            job.due = self.now + 1
+        self._place(job)
+        self.count += 1
+
+    def _place(self, job):
+        delta = job.due - self.now
+        level = 0
+        while level < self.levels - 1 and delta >> (self.bits * (level + 1)):
+            level += 1
+        slot = self._slots[level][(job.due >> (self.bits * level)) & self.mask]
+        slot.add(job)
+        job.slot = slot
+
+    def cancel(self, job):
+        """Remove job from wheel if scheduled."""
+        if job.slot is not None:
+            job.slot.discard(job)
+            job.slot = None
+            self.count -= 1
+
+    def advance(self):
+        """
+        Move to next tick.
+
+        :returns: Jobs due on the new tick.
+        :rtype: list
+        """
+        self.now += 1
+        level = 1
+        while level < self.levels and not self.now & ((1 << (self.bits * level)) - 1):
+            level += 1
+        for level in range(level - 1, 0, -1):
+            self._cascade(level)
+        index = self.now & self.mask
+        due = self._slots[0][index]
+        self._slots[0][index] = set()
+        self.count -= len(due)
+        for job in due:
+            job.slot = None
+        return list(due)
+
+    def _cascade(self, level):
+        index = (self.now >> (self.bits * level)) & self.mask
+        jobs = self._slots[level][index]
+        self._slots[level][index] = set()
+        for job in jobs:
+            # A job due on this very tick lands in the level 0 slot about to be fired
+            self._place(job)
+
+
+class WheelScheduler(object):
+    """
+    Scheduler built on a :class:`TimingWheel`, for daemons with very many jobs.
+    Provides the subset of the APScheduler scheduler interface used by
+    :class:`~reminders.reminder.ReminderDaemon`. Interval jobs are handled
+    natively; other triggers use APScheduler trigger objects to compute fire times.
+    All jobs due on a tick are collected and dispatched together.
+    """
+
+    def __init__(self, blocking=False, timezone='UTC', tick=0.1, bits=8, levels=4, max_workers=10, *args, **kwargs):
+        """
+        Create WheelScheduler object.
+
+        :param bool blocking: Run the scheduler loop in the thread calling :meth:`start`.
+        :param str timezone: Timezone for cron and date triggers.
+        :param float tick: Resolution in seconds. Interval jobs are rounded to whole ticks.
+        :param int bits: Slots per wheel level as a power of two.
+        :param int levels: Number of wheel levels.
+        :param int max_workers: Number of threads running jobs.
+        """
+        self._logger = logging.getLogger(__name__)
+        self.blocking = blocking
+        self.timezone = astimezone(timezone)
+        self.tick = tick
+        self.max_workers = max_workers
+        self.fired = 0
+        self.skipped = 0
+        self._wheel = TimingWheel(bits, levels)
+        self._jobs = {}
+        self._listeners = []
+        self._condition = threading.Condition()
+        self._origin = time.monotonic()
+        self._executor = None
+        self._thread = None
+        self._running = False
+
+    @property
+    def running(self):
+        return self._running
+
+    def datetime_at(self, tick):
+        """Return wall clock time of ``tick``."""
+        seconds = self._origin + tick * self.tick - time.monotonic()
+        return datetime.now(self.timezone) + timedelta(seconds=seconds)
+
+    def _current_tick(self):
+        # The wheel only advances while running, so jobs added before start count from the clock
+        return max(self._wheel.now, int((time.monotonic() - self._origin) / self.tick))
+
+    def _tick_at(self, run_time):
+        seconds = (run_time - datetime.now(self.timezone)).total_seconds()
+        return int((time.monotonic() + seconds - self._origin) / self.tick + 0.999999)
+
+    def add_job(self, func, trigger=None, args=None, kwargs=None, id=None, name=None, next_run_time=None,
+                **trigger_args):
+        """
+        Schedule ``func``, with the same arguments as APScheduler's ``add_job``.
+
+        :param func: Callable to run.
+        :param trigger: ``interval``, ``date``, ``cron`` or an APScheduler trigger. Defaults to running once now.
+        :param list args: Positional arguments for ``func``.
+        :param dict kwargs: Keyword arguments for ``func``.
+        :param str id: Job id; generated if not given.
+        :param str name: Job name.
+        :param datetime next_run_time: Override time of first run.
+        :param trigger_args: Arguments of the trigger.
+        :rtype: WheelJob
+        :raises TypeError: on arguments the trigger does not accept.
+        """
+        for option in IGNORED_OPTIONS:
+            trigger_args.pop(option, None)
+        interval = None
+        start_date = None
+        jitter = 0
+        if trigger == 'interval' and set(trigger_args).issubset(NATIVE_INTERVAL_ARGS):
+            start_date = trigger_args.pop('start_date', None)
+            if start_date is not None:
+                start_date = convert_to_datetime(start_date, self.timezone, 'start_date')
+            jitter = int(round((trigger_args.pop('jitter', None) or 0) / self.tick))
+            seconds = timedelta(**trigger_args).total_seconds()
+            interval = max(1, int(round(seconds / self.tick)))
+            trigger = None
+        elif trigger is None:
+            trigger = DateTrigger(timezone=self.timezone, **trigger_args)
+        elif not isinstance(trigger, BaseTrigger):
+            try:
+                trigger_class = TRIGGERS[trigger]
+            except KeyError:
+                raise TypeError('unsupported trigger {!r}'.format(trigger))
+            trigger_args.setdefault('timezone', self.timezone)
+            trigger = trigger_class(**trigger_args)
+        job = WheelJob(self, func, tuple(args or ()), dict(kwargs or {}), id or uuid.uuid4().hex,
+                       name or getattr(func, '__qualname__', repr(func)), interval, trigger, jitter)
+        with self._condition:
+            if job.id in self._jobs:
+                raise ValueError('job id {!r} already scheduled'.format(job.id))
+            if next_run_time is not None:
+                job.due = job.base = self._tick_at(next_run_time)
+            elif interval is not None:
+                now = self._current_tick()
+                job.base = now + interval
+                if start_date is not None:
+                    job.base = self._tick_at(start_date)
+                    if job.base <= now:
+                        job.base += interval * ((now - job.base) // interval + 1)
+                job.due = job.base + random.randint(0, jitter)
+            else:
+                first = trigger.get_next_fire_time(None, datetime.now(self.timezone))
+                if first is None:
+                    self._logger.debug('job %s will never run', job.id)
+                    return job
+                job.due = self._tick_at(first)
+            self._jobs[job.id] = job
+            self._wheel.insert(job)
+        return job
+
+    def remove_job(self, job_id, jobstore=None):
+        """
+        Unschedule job.
+
+        :raises JobLookupError: if no job has ``job_id``.
+        """
+        with self._condition:
+            job = self._jobs.pop(job_id, None)
+            if job is None:
+                raise JobLookupError(job_id)
+            self._wheel.cancel(job)
+            job.due = None
+
+    def get_job(self, job_id, jobstore=None):
+        return self._jobs.get(job_id)
+
+    def get_jobs(self, jobstore=None, pending=None):
+        return list(self._jobs.values())
+
+    def add_listener(self, callback, mask=EVENT_ALL):
+        """
+        Call ``callback(event)`` on job events, like APScheduler's ``add_listener``.
+        Only submission, execution and error events are emitted.
+        """
+        self._listeners.append((callback, mask))
+
+    def _notify(self, event):
+        for callback, mask in self._listeners:
+            if event.code & mask:
+                try:
+                    callback(event)
+                except Exception:
+                    self._logger.error('Error notifying listener', exc_info=True)
+
+    def start(self):
+        """Start dispatching jobs. Blocks until :meth:`shutdown` if ``blocking``."""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='reminders-wheel')
+        if self.blocking:
+            self._run()
+        else:
+            self._thread = threading.Thread(target=self._run, name='reminders-wheel', daemon=True)
+            self._thread.start()
+
+    def shutdown(self, wait=True):
+        """
+        Stop dispatching jobs.
+
+        :param bool wait: Wait for running jobs to finish.
+        """
+        with self._condition:
+            if not self._running:
+                return
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._executor.shutdown(wait=wait)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running:
+                    timeout = self._origin + (self._wheel.now + 1) * self.tick - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    self._condition.wait(timeout)
+                if not self._running:
+                    return
+                # Catches up on the first pass after start, or after a stall, firing overdue jobs once
+                target = int((time.monotonic() - self._origin) / self.tick)
+                batch = []
+                while self._wheel.now < target:
+                    for job in self._wheel.advance():
+                        self._reschedule(job, target)
+                        batch.append((job, self._wheel.now))
+            self._dispatch(batch)
+
+    def _reschedule(self, job, now):
+        """Compute next due tick after ``now`` of job that just came due, coalescing missed runs."""
+        if job.interval is not None:
+            job.base += job.interval * ((now - job.base) // job.interval + 1)
+            job.due = job.base + random.randint(0, job.jitter)
+        else:
+            fire_time = self.datetime_at(job.due)
+            next_time = job.trigger.get_next_fire_time(fire_time, datetime.now(self.timezone))
+            job.previous_fire_time = fire_time
+            if next_time is None:
+                self._jobs.pop(job.id, None)
+                job.due = None
+                return
+            job.due = self._tick_at(next_time)
+        self._wheel.insert(job)
+
+    def _dispatch(self, batch):
+        for job, tick in batch:
+            if job.running:
+                self.skipped += 1
+                self._logger.debug('skipping run of %s because previous run has not finished', job.name)
+                continue
+            job.running = True
+            scheduled = None
+            if self._listeners:
+                scheduled = self.datetime_at(tick)
+                self._notify(JobSubmissionEvent(EVENT_JOB_SUBMITTED, job.id, 'default', [scheduled]))
+            self._executor.submit(self._run_job, job, scheduled)
+
+    def _run_job(self, job, scheduled=None):
+        try:
+            job.func(*job.args, **job.kwargs)
+            self.fired += 1
+            event = JobExecutionEvent(EVENT_JOB_EXECUTED, job.id, 'default', scheduled)
+        except Exception as e:
+            self._logger.error('Job %s raised an exception', job.name, exc_info=True)
+            event = JobExecutionEvent(EVENT_JOB_ERROR, job.id, 'default', scheduled, exception=e)
+        finally:
+            job.running = False
+        if self._listeners:
+            self._notify(event)
@@ -4,10 +4,14 @@ import reminders
 setup(name='python-reminders',
       version=reminders.__version__,
       py_modules=['reminders'],
+      python_requires='>=3.8',
       author='@wisdomwolf',
       author_email='wisdomwolf@gmail.com',
       install_requires=[
           'APScheduler>=3.5.1',
           'requests>=2.3.0'
       ],
+      extras_require={
+          'async': ['aiohttp>=3.6'],
+      },
 )
@@ -0,0 +1,89 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+from reminders import coercion
+from reminders.coercion import coerce_status, parse_number, parse_bool, parse_iso8601, parse_datetime
+
+
+class ParserTest(unittest.TestCase):
+
+    def test_parse_number(self):
+        self.assertEqual(parse_number('42'), 42)
+        self.assertIsInstance(parse_number('42'), int)
+        self.assertEqual(parse_number('-1.5'), -1.5)
+        self.assertEqual(parse_number('.5'), 0.5)
+        self.assertEqual(parse_number('1e3'), 1000.0)
+        for value in ('', '1.2.3', 'nan', 'inf', '0x10', '1_000'):
+            with self.assertRaises(ValueError):
+                parse_number(value)
+
+    def test_parse_bool(self):
+        self.assertIs(parse_bool('TRUE'), True)
+        self.assertIs(parse_bool('off'), False)
+        with self.assertRaises(ValueError):
+            parse_bool('1')
+
+    def test_parse_iso8601(self):
+        self.assertEqual(parse_iso8601('2020-01-02'), datetime(2020, 1, 2))
+        self.assertEqual(parse_iso8601('2020-01-02T03:04:05Z'), datetime(2020, 1, 2, 3, 4, 5, tzinfo=timezone.utc))
+        self.assertEqual(parse_iso8601('2020-01-02 03:04:05.5+0100'),
+                         datetime(2020, 1, 2, 3, 4, 5, 500000, tzinfo=timezone(timedelta(hours=1))))
+        for value in ('2020-1-2', '02/01/2020', 'tomorrow'):
+            with self.assertRaises(ValueError):
+                parse_iso8601(value)
+
+    def test_parse_datetime_falls_back_to_dateparser(self):
+        self.assertEqual(parse_datetime('2020-01-02'), datetime(2020, 1, 2))
+        self.assertEqual(parse_datetime('2 January 2020').date(), datetime(2020, 1, 2).date())
+        with self.assertRaises(ValueError):
+            parse_datetime('not a date at all')
+
+
+class CoerceStatusTest(unittest.TestCase):
+
+    def test_auto(self):
+        self.assertIs(coerce_status('true'), True)
+        self.assertEqual(coerce_status('12'), 12)
+        self.assertEqual(coerce_status(b'1.5'), 1.5)
+        self.assertEqual(coerce_status('2020-01-02T03:04:05Z'), datetime(2020, 1, 2, 3, 4, 5, tzinfo=timezone.utc))
+        self.assertEqual(coerce_status('open'), 'open')
+        self.assertEqual(coerce_status(7), 7)
+        self.assertIsNone(coerce_status(None))
+
+    def test_auto_skips_dateparser_for_fast_values(self):
+        with mock.patch.object(coercion, 'dateparse') as dateparse:
+            coerce_status('314159')
+            coerce_status('false')
+            coerce_status('2021-03-04')
+        dateparse.assert_not_called()
+
+    def test_relative_dates_not_cached(self):
+        first = coerce_status('1 second ago')
+        second = coerce_status('1 second ago')
+        self.assertIsInstance(first, datetime)
+        self.assertGreaterEqual(second, first)
+
+    def test_declared_types(self):
+        self.assertEqual(coerce_status(' 12 ', 'number'), 12)
+        self.assertIs(coerce_status('yes', 'bool'), True)
+        self.assertEqual(coerce_status('2020-01-02', 'datetime'), datetime(2020, 1, 2))
+        self.assertEqual(coerce_status('12', 'string'), '12')
+        self.assertEqual(coerce_status(12, 'string'), '12')
+        self.assertEqual(coerce_status(1.5, 'number'), 1.5)
+        self.assertIs(coerce_status(False, 'bool'), False)
+
+    def test_declared_type_mismatch(self):
+        for value, status_type in (('open', 'number'), ('12', 'bool'), (True, 'number'), (3, 'datetime'),
+                                   ('never', 'datetime')):
+            with self.assertRaises(ValueError):
+                coerce_status(value, status_type)
+
+    def test_named_fields(self):
+        value = {'level': '3', 'state': 'on', 'when': None}
+        self.assertEqual(coerce_status(value), {'level': 3, 'state': 'on', 'when': None})
+        self.assertEqual(coerce_status(value, {'state': 'bool'}), {'level': 3, 'state': True, 'when': None})
+        self.assertEqual(coerce_status(value, 'string'), {'level': '3', 'state': 'on', 'when': None})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+from reminders import components
+from reminders.components import component_for
+from reminders.outbox import AlertOutbox
+from reminders.reminder import ReminderDaemon
+
+
+class _Reminder(object):
+
+    def __init__(self, daemon=None):
+        self._daemon = daemon
+
+
+class ComponentForTest(unittest.TestCase):
+
+    def tearDown(self):
+        components._stop_defaults()
+
+    def test_daemon_component(self):
+        daemon = ReminderDaemon(blocking=False, watch_configs=False, scheduler_type='wheel')
+        try:
+            self.assertIs(component_for(_Reminder(daemon), 'outbox', AlertOutbox), daemon.outbox)
+        finally:
+            daemon.stop()
+
+    def test_shared_default_without_daemon(self):
+        outbox = component_for(_Reminder(), 'outbox', AlertOutbox)
+        self.assertIs(component_for(None, 'outbox', AlertOutbox), outbox)
+        self.assertIsNot(outbox, component_for(_Reminder(), 'other', AlertOutbox))
+
+    def test_defaults_stopped(self):
+        outbox = component_for(_Reminder(), 'outbox', AlertOutbox)
+        outbox.start()
+        components._stop_defaults()
+        self.assertFalse(outbox._dispatcher.running)
+        self.assertIsNot(component_for(_Reminder(), 'outbox', AlertOutbox), outbox)
+
+
+if __name__ == '__main__':
+    unittest.main()
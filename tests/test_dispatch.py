@@ -0,0 +1,85 @@
+import threading
+import time
+import unittest
+from reminders.dispatch import DelayedDispatcher
+from reminders.evaluation import EvaluationQueue
+
+
+class DelayedDispatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.handled = []
+        self.due = []
+        self.dispatcher = DelayedDispatcher(self.handled.append, max_workers=1, on_due=self.due.append)
+        self.dispatcher.start()
+
+    def tearDown(self):
+        self.dispatcher.stop()
+
+    def _wait(self, predicate, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not predicate() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return predicate()
+
+    def test_items_handled_in_due_order(self):
+        self.dispatcher.push('late', 0.1)
+        self.dispatcher.push('early', 0.05)
+        self.dispatcher.push('now')
+        self.assertTrue(self._wait(lambda: len(self.handled) == 3))
+        self.assertEqual(self.handled, ['now', 'early', 'late'])
+        self.assertEqual(self.due, self.handled)
+
+    def test_items_wait_for_free_worker(self):
+        release = threading.Event()
+        self.dispatcher.handler = lambda item: release.wait()
+        self.dispatcher.push('blocking')
+        self.dispatcher.push('waiting')
+        self.assertTrue(self._wait(lambda: self.due == ['blocking']))
+        self.assertEqual(self.dispatcher.depth, 1)
+        release.set()
+        self.assertTrue(self._wait(lambda: self.due == ['blocking', 'waiting']))
+
+    def test_stop_returns_waiting_items(self):
+        self.dispatcher.push('later', 60)
+        self.assertEqual(self.dispatcher.stop(), ['later'])
+        self.assertFalse(self.dispatcher.push('after stop'))
+        self.assertEqual(self.handled, [])
+
+
+class _Reminder(object):
+
+    def __init__(self):
+        self.checks = 0
+
+    def check(self):
+        self.checks += 1
+
+
+class EvaluationQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = EvaluationQueue(debounce=0.05)
+
+    def tearDown(self):
+        self.queue.stop()
+
+    def test_notifications_coalesced_while_waiting(self):
+        reminders = [_Reminder(), _Reminder()]
+        for _ in range(5):
+            for reminder in reminders:
+                self.queue.submit(reminder)
+        self.assertEqual(self.queue.depth, 2)
+        deadline = time.monotonic() + 5
+        while self.queue.evaluated < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual([reminder.checks for reminder in reminders], [1, 1])
+        self.assertEqual((self.queue.received, self.queue.coalesced), (10, 8))
+        self.queue.submit(reminders[0], debounce=0)
+        while self.queue.evaluated < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(reminders[0].checks, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
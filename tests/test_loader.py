@@ -0,0 +1,44 @@
+import unittest
+from reminders.loader import reminder_entries
+
+PATH = '/configs/web.yaml'
+
+
+class ReminderEntriesTest(unittest.TestCase):
+
+    def test_single_reminder_keeps_path(self):
+        entries = reminder_entries(PATH, [{'reminder': {'condition': 'status'}}])
+        self.assertEqual(list(entries), [PATH])
+        self.assertEqual(entries[PATH]['id'], PATH)
+
+    def test_local_ids_are_qualified(self):
+        entries = reminder_entries(PATH, [{'reminder': {'id': 'api', 'condition': 'status'}}])
+        self.assertEqual(list(entries), [PATH + '#api'])
+
+    def test_positions_across_documents(self):
+        documents = [
+            {'reminders': [{'condition': 'a'}, {'id': 'b', 'condition': 'b'}]},
+            {'reminder': {'condition': 'c'}},
+        ]
+        entries = reminder_entries(PATH, documents)
+        self.assertEqual(list(entries), [PATH + '#0', PATH + '#b', PATH + '#2'])
+
+    def test_reminder_and_list_in_one_document(self):
+        entries = reminder_entries(PATH, [{'reminder': {'condition': 'a'}, 'reminders': [{'condition': 'b'}]}])
+        self.assertEqual(list(entries), [PATH + '#0', PATH + '#1'])
+
+    def test_duplicate_ids(self):
+        with self.assertRaises(ValueError):
+            reminder_entries(PATH, [{'reminders': [{'id': 'x', 'condition': 'a'}, {'id': 'x', 'condition': 'b'}]}])
+
+    def test_invalid_structure(self):
+        for documents in ([['not', 'a', 'mapping']], [{'reminders': {'id': 'x'}}], [{'reminders': ['text']}]):
+            with self.assertRaises(ValueError):
+                reminder_entries(PATH, documents)
+
+    def test_empty_file(self):
+        self.assertEqual(reminder_entries(PATH, [{}]), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
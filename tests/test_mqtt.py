@@ -0,0 +1,90 @@
+import time
+import unittest
+from reminders.mqtt import TopicTrie, LocalBroker, validate_filter
+from reminders.conditions import InvalidCondition
+from reminders.reminder import ReminderDaemon
+
+
+class TopicTrieTest(unittest.TestCase):
+
+    def setUp(self):
+        self.trie = TopicTrie()
+        for topic_filter in ('a/b/c', 'a/+/c', 'a/#', '#', '+/b/+', '$SYS/#', '$SYS/+/load'):
+            self.trie.subscribe(topic_filter, topic_filter)
+
+    def test_wildcards(self):
+        self.assertEqual(self.trie.match('a/b/c'), {'a/b/c', 'a/+/c', 'a/#', '#', '+/b/+'})
+        self.assertEqual(self.trie.match('a/x/c'), {'a/+/c', 'a/#', '#'})
+        self.assertEqual(self.trie.match('a'), {'a/#', '#'})
+        self.assertEqual(self.trie.match('b/b/b'), {'#', '+/b/+'})
+
+    def test_dollar_topics_skip_leading_wildcards(self):
+        self.assertEqual(self.trie.match('$SYS/broker/load'), {'$SYS/#', '$SYS/+/load'})
+
+    def test_unsubscribe_prunes(self):
+        self.assertFalse(self.trie.unsubscribe('a/+/c', 'other'))
+        self.assertTrue(self.trie.unsubscribe('a/+/c', 'a/+/c'))
+        self.assertNotIn('a/+/c', self.trie.match('a/x/c'))
+        self.assertNotIn('+', self.trie._root.children['a'].children)
+
+    def test_invalid_filters(self):
+        for topic_filter in ('a/#/b', 'a/b#', 'a+/b'):
+            with self.assertRaises(ValueError):
+                validate_filter(topic_filter)
+
+
+class LocalBrokerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.broker = LocalBroker()
+        self.daemon = ReminderDaemon(blocking=False, watch_configs=False, scheduler_type='wheel',
+                                     mqtt_kwargs={'client_factory': self.broker.client},
+                                     evaluation_kwargs={'debounce': 0})
+
+    def tearDown(self):
+        self.daemon.stop()
+
+    def _wait(self, predicate, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not predicate() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return predicate()
+
+    def test_message_triggers_alert(self):
+        reminder = self.daemon.add_reminder({
+            'id': 'temperature',
+            'condition': 'status > 50',
+            'watcher': {'type': 'MQTTWatcher', 'hostname': 'local', 'schedules': [],
+                        'topic_kwargs': ['sensors/+/temp']},
+            'alerter': {'type': 'LogAlerter', 'message': 'too hot', 'max_repeat': 1},
+        })
+        self.broker.publish('sensors/kitchen/temp', '20')
+        self.assertTrue(self._wait(lambda: reminder.check_count == 1))
+        self.assertFalse(reminder.alerter.active)
+        self.broker.publish('sensors/other/humidity', '90')
+        self.broker.publish('sensors/kitchen/temp', '70')
+        self.assertTrue(self._wait(lambda: reminder.alerter.current_repeats == 1))
+        self.assertEqual(reminder.check_count, 2)
+
+    def test_removed_reminder_unsubscribes(self):
+        reminder = self.daemon.add_reminder({
+            'id': 'door',
+            'condition': 'status == "open"',
+            'watcher': {'type': 'MQTTWatcher', 'hostname': 'local', 'schedules': [], 'topic_kwargs': ['door']},
+        })
+        self.daemon.remove_reminder(reminder)
+        self.assertEqual(self.broker.trie.match('door'), set())
+
+    def test_invalid_condition_unsubscribes(self):
+        with self.assertRaises(InvalidCondition):
+            self.daemon.add_reminder({
+                'id': 'window',
+                'condition': 'status ==',
+                'watcher': {'type': 'MQTTWatcher', 'hostname': 'local', 'schedules': [], 'topic_kwargs': ['window']},
+            })
+        self.assertEqual(self.broker.trie.match('window'), set())
+        self.assertEqual(self.daemon.mqtt.connections, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import threading
+import time
+import unittest
+from reminders.outbox import AlertOutbox
+
+
+class _Alerter(object):
+    """Stand-in for an alerter; fails its first ``failures`` deliveries."""
+
+    def __init__(self, batch=False, destination=None, failures=0, delay=0):
+        self.reminder = None
+        self.batch = batch
+        self.destination = destination
+        self.failures = failures
+        self.delay = delay
+        self.delivered = []
+        self.attempts = 0
+        self.concurrent = 0
+        self.max_concurrent = 0
+        self._lock = threading.Lock()
+
+    def deliver(self, payloads):
+        with self._lock:
+            self.attempts += 1
+            self.concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self.concurrent)
+            failed = self.attempts <= self.failures
+        try:
+            time.sleep(self.delay)
+            if failed:
+                raise IOError('webhook down')
+            with self._lock:
+                self.delivered.append(list(payloads))
+        finally:
+            with self._lock:
+                self.concurrent -= 1
+
+
+class AlertOutboxTest(unittest.TestCase):
+
+    def setUp(self):
+        self.outbox = AlertOutbox(max_workers=2, max_retries=2, backoff=0.01, batch_window=0.1)
+
+    def tearDown(self):
+        self.outbox.stop()
+
+    def _wait(self, predicate, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not predicate() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return predicate()
+
+    def test_enqueue_does_not_wait_for_delivery(self):
+        alerter = _Alerter(delay=0.2)
+        started = time.monotonic()
+        self.outbox.enqueue(alerter, 'a')
+        self.assertLess(time.monotonic() - started, 0.1)
+        self.assertTrue(self._wait(lambda: self.outbox.delivered == 1))
+        self.assertEqual(alerter.delivered, [['a']])
+
+    def test_failed_delivery_retried(self):
+        alerter = _Alerter(failures=2)
+        self.outbox.enqueue(alerter, 'a')
+        self.assertTrue(self._wait(lambda: self.outbox.delivered == 1))
+        self.assertEqual(alerter.attempts, 3)
+        self.assertEqual(self.outbox.retried, 2)
+        self.assertEqual(self.outbox.failed, 0)
+
+    def test_delivery_given_up_after_max_retries(self):
+        alerter = _Alerter(failures=10)
+        self.outbox.enqueue(alerter, 'a')
+        self.assertTrue(self._wait(lambda: self.outbox.failed == 1))
+        self.assertEqual(alerter.attempts, 3)
+        self.assertEqual(self.outbox.delivered, 0)
+
+    def test_batch_per_destination(self):
+        first = _Alerter(batch=True, destination='hook-1')
+        second = _Alerter(batch=True, destination='hook-2')
+        for payload in ('a', 'b', 'c'):
+            self.outbox.enqueue(first, payload)
+        self.outbox.enqueue(second, 'd')
+        self.assertTrue(self._wait(lambda: self.outbox.delivered == 4))
+        self.assertEqual(first.delivered, [['a', 'b', 'c']])
+        self.assertEqual(second.delivered, [['d']])
+
+    def test_batch_size_bounded(self):
+        self.outbox.max_batch = 2
+        alerter = _Alerter(batch=True, destination='hook')
+        for payload in ('a', 'b', 'c'):
+            self.outbox.enqueue(alerter, payload)
+        self.assertTrue(self._wait(lambda: self.outbox.delivered == 3))
+        self.assertEqual(sorted(alerter.delivered), [['a', 'b'], ['c']])
+
+    def test_unbatched_payloads_delivered_separately(self):
+        alerter = _Alerter(destination='hook')
+        self.outbox.enqueue(alerter, 'a')
+        self.outbox.enqueue(alerter, 'b')
+        self.assertTrue(self._wait(lambda: self.outbox.delivered == 2))
+        self.assertEqual(sorted(alerter.delivered), [['a'], ['b']])
+
+    def test_concurrency_bounded(self):
+        alerter = _Alerter(delay=0.05)
+        for payload in range(6):
+            self.outbox.enqueue(alerter, payload)
+        self.assertTrue(self._wait(lambda: self.outbox.delivered == 6))
+        self.assertEqual(alerter.max_concurrent, 2)
+
+    def test_stop_drops_pending(self):
+        alerter = _Alerter(batch=True, destination='hook')
+        self.outbox.batch_window = 60
+        self.outbox.enqueue(alerter, 'a')
+        self.assertEqual(self.outbox.depth, 1)
+        self.outbox.stop()
+        self.assertEqual(self.outbox.depth, 0)
+        self.assertEqual(alerter.delivered, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from reminders.coercion import coerce_status
+from reminders.conditions import InvalidCondition
+from reminders.reminder import ReminderDaemon
+
+
+class _ETagHandler(BaseHTTPRequestHandler):
+    """Serves ``server.body`` with ETag ``server.etag``, answering 304 to a matching ``If-None-Match``."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(self.headers.get('If-None-Match'))
+        if self.headers.get('If-None-Match') == server.etag:
+            self.send_response(304)
+            self.send_header('ETag', server.etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = json.dumps(server.body).encode('utf8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('ETag', server.etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def etag_server(body, etag='"1"'):
+    """Start an HTTP server on a random local port in a daemon thread."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _ETagHandler)
+    server.daemon_threads = True
+    server.body = body
+    server.etag = etag
+    server.requests = []
+    server.url = 'http://127.0.0.1:{}/'.format(server.server_address[1])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class ReminderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.daemon = ReminderDaemon(blocking=False, watch_configs=False, scheduler_type='wheel')
+
+    def tearDown(self):
+        self.daemon.stop()
+
+    def test_invalid_condition_releases_cached_response(self):
+        watcher = {'type': 'HTTPWatcher', 'schedules': [], 'request_kwargs': {'url': 'http://127.0.0.1:9/'},
+                   'json_expression': 'value'}
+        with self.assertRaises(InvalidCondition):
+            self.daemon.add_reminder({'id': 'broken', 'condition': 'status >', 'watcher': watcher})
+        self.assertEqual(self.daemon.response_cache._users, {})
+        self.assertIsNone(self.daemon.registry.get('broken'))
+
+    def _http_reminder(self, json_expression, status_type):
+        return self.daemon.add_reminder({
+            'id': 'typed',
+            'condition': 'status is not None',
+            'status_type': status_type,
+            'watcher': {'type': 'HTTPWatcher', 'schedules': [], 'request_kwargs': {'url': 'http://127.0.0.1:9/'},
+                        'json_expression': json_expression},
+        }, schedule=False)
+
+    def test_per_field_status_type_requires_named_fields(self):
+        with self.assertRaises(ValueError):
+            self._http_reminder('value', {'value': 'number'})
+        self.assertEqual(self.daemon.response_cache._users, {})
+        with self.assertRaises(ValueError):
+            self._http_reminder({'value': 'value'}, {'other': 'number'})
+        reminder = self._http_reminder({'value': 'value', 'unit': 'unit'}, {'value': 'number'})
+        self.assertEqual(reminder._snapshot_from({'value': '2', 'unit': '3'}).value, {'value': 2, 'unit': 3})
+
+    def test_per_field_status_type_of_single_value(self):
+        with self.assertRaises(ValueError):
+            coerce_status('2', {'value': 'number'})
+
+
+class ReloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = etag_server({'value': 80})
+        self.daemon = ReminderDaemon(blocking=False, watch_configs=False, scheduler_type='wheel',
+                                     cache_kwargs={'ttl': 0})
+
+    def tearDown(self):
+        self.daemon.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _config(self, condition='status > 50', message='too high'):
+        return {
+            'id': 'value',
+            'condition': condition,
+            'watcher': {'type': 'HTTPWatcher', 'schedules': [{'trigger': 'interval', 'minutes': 1}],
+                        'request_kwargs': {'url': self.server.url}, 'json_expression': 'value'},
+            'alerter': {'type': 'LogAlerter', 'message': message, 'max_repeat': 5},
+        }
+
+    def test_unchanged_status_skips_evaluation(self):
+        reminder = self.daemon.add_reminder(self._config(), schedule=False)
+        reminder.check()
+        reminder.check()
+        self.assertEqual(self.server.requests, [None, '"1"'])
+        self.assertFalse(reminder.watcher.changed)
+        self.assertEqual(reminder.skipped_count, 1)
+
+    def test_alerter_reload_reactivates_on_unchanged_status(self):
+        reminder = self.daemon.add_reminder(self._config(), schedule=False)
+        reminder.check()
+        self.assertTrue(reminder.alerter.active)
+        changed = self.daemon.reload_reminder(reminder, self._config(message='still too high'))
+        self.assertEqual(changed, {'alerter'})
+        self.assertFalse(reminder.alerter.active)
+        reminder.check()
+        self.assertFalse(reminder.watcher.changed)
+        self.assertTrue(reminder.alerter.active)
+        self.assertEqual(reminder.alerter.message, 'still too high')
+        self.assertEqual(reminder.skipped_count, 0)
+
+    def test_condition_reload_reevaluates_on_unchanged_status(self):
+        reminder = self.daemon.add_reminder(self._config(condition='status > 90'), schedule=False)
+        reminder.check()
+        self.assertFalse(reminder.alerter.active)
+        self.assertEqual(self.daemon.reload_reminder(reminder, self._config()), {'condition'})
+        reminder.check()
+        self.assertTrue(reminder.alerter.active)
+        # Forced evaluation happens once; later unchanged checks are skipped again
+        reminder.check()
+        self.assertEqual(reminder.skipped_count, 1)
+
+    def test_watcher_reload_replaces_reminder(self):
+        reminder = self.daemon.add_reminder(self._config(), schedule=False)
+        config = self._config()
+        config['watcher']['json_expression'] = 'missing'
+        self.assertEqual(self.daemon.reload_reminder(reminder, config), {'watcher'})
+        self.assertIsNot(self.daemon.registry.get('value'), reminder)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from reminders.sessions import HostGuard, CircuitOpen, RateLimited, SessionPool
+
+
+class HostGuardTest(unittest.TestCase):
+
+    def test_opens_after_threshold(self):
+        guard = HostGuard(failure_threshold=3, reset_timeout=60)
+        for _ in range(2):
+            guard.allow()
+            guard.failure()
+        self.assertEqual(guard.state, HostGuard.CLOSED)
+        guard.allow()
+        guard.record(503)
+        self.assertEqual(guard.state, HostGuard.OPEN)
+        with self.assertRaises(CircuitOpen):
+            guard.allow()
+        self.assertEqual(guard.rejected, 1)
+
+    def test_success_resets_failures(self):
+        guard = HostGuard(failure_threshold=2)
+        guard.failure()
+        guard.record(200)
+        guard.failure()
+        self.assertEqual(guard.state, HostGuard.CLOSED)
+
+    def test_half_open_allows_single_trial(self):
+        guard = HostGuard(failure_threshold=1, reset_timeout=0.05)
+        guard.failure()
+        time.sleep(0.06)
+        guard.allow()
+        self.assertEqual(guard.state, HostGuard.HALF_OPEN)
+        with self.assertRaises(CircuitOpen):
+            guard.allow()
+        guard.success()
+        self.assertEqual(guard.state, HostGuard.CLOSED)
+        guard.allow()
+
+    def test_failed_trial_reopens(self):
+        guard = HostGuard(failure_threshold=1, reset_timeout=0.05)
+        guard.failure()
+        time.sleep(0.06)
+        guard.allow()
+        guard.record(429)
+        self.assertEqual(guard.state, HostGuard.OPEN)
+        self.assertEqual(guard.opened, 2)
+        with self.assertRaises(CircuitOpen):
+            guard.allow()
+
+    def test_rate_limit_without_waiting(self):
+        guard = HostGuard(rate=1, burst=2)
+        guard.allow(wait=False)
+        guard.allow(wait=False)
+        with self.assertRaises(RateLimited):
+            guard.allow(wait=False)
+
+    def test_disabled_circuit(self):
+        guard = HostGuard(failure_threshold=0)
+        for _ in range(10):
+            guard.failure()
+        guard.allow()
+
+
+class _CookieHandler(BaseHTTPRequestHandler):
+    """Sets a cookie on every response and records the Cookie header of each request."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.cookies.append(self.headers.get('Cookie'))
+        self.send_response(200)
+        self.send_header('Set-Cookie', 'session=secret; Path=/')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SessionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _CookieHandler)
+        self.server.daemon_threads = True
+        self.server.cookies = []
+        self.url = 'http://127.0.0.1:{}/'.format(self.server.server_address[1])
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.pool = SessionPool()
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_session_shared_per_host(self):
+        self.assertIs(self.pool.session_for(self.url), self.pool.session_for(self.url + 'other'))
+
+    def test_cookies_not_persisted(self):
+        self.pool.get(self.url)
+        self.pool.get(self.url)
+        self.assertEqual(self.server.cookies, [None, None])
+        self.assertEqual(len(self.pool.session_for(self.url).cookies), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from reminders.reminder import ReminderDaemon
+from reminders.store import MemoryStateStore, SQLiteStateStore
+
+
+class _StoreTests(object):
+    """Lease and state behaviour every :class:`~reminders.store.StateStore` must share."""
+
+    def test_state_round_trip(self):
+        self.assertIsNone(self.store.get_state('r'))
+        self.store.put_state('r', {'active': True, 'current_repeats': 2})
+        self.assertEqual(self.store.get_state('r'), {'active': True, 'current_repeats': 2})
+        self.store.delete_state('r')
+        self.assertIsNone(self.store.get_state('r'))
+
+    def test_lease_is_exclusive_until_released(self):
+        self.assertEqual(set(self.store.acquire('a', ['r1', 'r2'], 60)), {'r1', 'r2'})
+        self.assertEqual(set(self.store.acquire('b', ['r1', 'r3'], 60)), {'r3'})
+        self.assertEqual(set(self.store.acquire('a', ['r1'], 60)), {'r1'})
+        self.store.release('a', ['r1'])
+        self.assertEqual(set(self.store.acquire('b', ['r1'], 60)), {'r1'})
+
+    def test_expired_lease_taken_over(self):
+        self.store.acquire('a', ['r'], 0.05)
+        self.assertEqual(set(self.store.acquire('b', ['r'], 60)), set())
+        time.sleep(0.1)
+        self.assertEqual(set(self.store.acquire('b', ['r'], 60)), {'r'})
+
+    def test_heartbeat_lists_live_nodes_of_group(self):
+        self.store.heartbeat('a', 'g', 0.05)
+        self.store.heartbeat('c', 'other', 60)
+        self.assertEqual(list(self.store.heartbeat('b', 'g', 60)), ['a', 'b'])
+        time.sleep(0.1)
+        self.assertEqual(list(self.store.heartbeat('b', 'g', 60)), ['b'])
+
+    def test_zero_ttl_heartbeat_leaves_group(self):
+        self.store.heartbeat('a', 'g', 60)
+        self.assertEqual(list(self.store.heartbeat('a', 'g', 0)), [])
+        self.assertEqual(list(self.store.heartbeat('b', 'g', 60)), ['b'])
+
+
+class MemoryStateStoreTest(_StoreTests, unittest.TestCase):
+
+    def setUp(self):
+        self.store = MemoryStateStore()
+
+
+class SQLiteStateStoreTest(_StoreTests, unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='reminders-test-')
+        self.store = SQLiteStateStore(os.path.join(self.directory, 'state.db'))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class FailoverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='reminders-test-')
+        self.store_kwargs = {'path': os.path.join(self.directory, 'state.db')}
+        self.daemons = []
+
+    def tearDown(self):
+        for daemon in self.daemons:
+            daemon.stop()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _daemon(self, node_id, lease_ttl=30):
+        daemon = ReminderDaemon(blocking=False, watch_configs=False, scheduler_type='wheel', node_id=node_id,
+                                lease_ttl=lease_ttl, store_kwargs=dict(self.store_kwargs))
+        daemon.add_reminder({
+            'id': 'always',
+            'condition': 'True',
+            'alerter': {'type': 'LogAlerter', 'message': 'alert', 'max_repeat': 5,
+                        'repeat_interval': {'minutes': 10}},
+        }, schedule=False)
+        self.daemons.append(daemon)
+        return daemon
+
+    def test_reminder_skipped_without_lease(self):
+        first = self._daemon('a')
+        second = self._daemon('b')
+        self.assertEqual(first.renew_leases(), {'always'})
+        self.assertEqual(second.renew_leases(), frozenset())
+        reminder = second.registry.get('always')
+        reminder.check()
+        self.assertFalse(reminder.alerter.active)
+
+    def test_expired_lease_taken_over_with_alert_state(self):
+        first = self._daemon('a', lease_ttl=0.2)
+        first.renew_leases()
+        first.registry.get('always').check()
+        alerter = first.registry.get('always').alerter
+        self.assertTrue(alerter.active)
+        self.assertEqual(alerter.current_repeats, 1)
+        # First node stops renewing without releasing, as if it crashed
+        second = self._daemon('b')
+        self.assertEqual(second.renew_leases(), frozenset())
+        time.sleep(0.3)
+        self.assertFalse(first.owns(first.registry.get('always')))
+        self.assertEqual(second.renew_leases(), {'always'})
+        restored = second.registry.get('always').alerter
+        self.assertTrue(restored.active)
+        self.assertEqual(restored.current_repeats, 1)
+        self.assertEqual(restored.last_alert, alerter.last_alert)
+        self.assertEqual(len(restored.jobs), 1)
+
+    def test_stopped_node_hands_over(self):
+        first = self._daemon('a')
+        first.renew_leases()
+        first.registry.get('always').check()
+        self.daemons.remove(first)
+        first.stop()
+        second = self._daemon('b')
+        self.assertEqual(second.renew_leases(), {'always'})
+        self.assertTrue(second.registry.get('always').alerter.active)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,245 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from reminders.reminder import ReminderDaemon
+from reminders.watchers import ResponseCache, CachedResponse
+
+
+class _UpstreamHandler(BaseHTTPRequestHandler):
+    """
+    Serves ``server.body`` with the ``server.etag`` and ``server.last_modified`` validators
+    when set, answering ``304 Not Modified`` to a request carrying the current one.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        if_none_match = self.headers.get('If-None-Match')
+        if_modified_since = self.headers.get('If-Modified-Since')
+        with server.lock:
+            server.requests.append((if_none_match, if_modified_since))
+        if server.etag:
+            not_modified = if_none_match == server.etag
+        else:
+            not_modified = bool(server.last_modified) and if_modified_since == server.last_modified
+        body = b'' if not_modified else json.dumps(server.body).encode('utf8')
+        self.send_response(304 if not_modified else 200)
+        self.send_header('Content-Type', 'application/json')
+        if server.etag:
+            self.send_header('ETag', server.etag)
+        if server.last_modified:
+            self.send_header('Last-Modified', server.last_modified)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _WatcherTest(unittest.TestCase):
+    cache_kwargs = {'ttl': 0}
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _UpstreamHandler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.body = {'value': 80, 'unit': 'C'}
+        self.server.etag = '"1"'
+        self.server.last_modified = None
+        self.url = 'http://127.0.0.1:{}/'.format(self.server.server_address[1])
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.daemon = ReminderDaemon(blocking=False, watch_configs=False, scheduler_type='wheel',
+                                     cache_kwargs=self.cache_kwargs)
+
+    def tearDown(self):
+        self.daemon.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _reminder(self, id='value', json_expression='value', condition='status > 50', **watcher):
+        watcher.update({'type': 'HTTPWatcher', 'schedules': [], 'request_kwargs': {'url': self.url},
+                        'json_expression': json_expression})
+        return self.daemon.add_reminder({
+            'id': id,
+            'condition': condition,
+            'watcher': watcher,
+            'alerter': {'type': 'LogAlerter', 'message': 'too high', 'max_repeat': 5},
+        }, schedule=False)
+
+
+class ConditionalRequestTest(_WatcherTest):
+
+    def test_etag_not_modified_reuses_status(self):
+        reminder = self._reminder()
+        self.assertEqual(reminder.fetch_status().value, 80)
+        self.assertTrue(reminder.watcher.changed)
+        self.assertEqual(reminder.fetch_status().value, 80)
+        self.assertFalse(reminder.watcher.changed)
+        self.assertEqual(self.server.requests, [(None, None), ('"1"', None)])
+
+    def test_not_modified_skips_evaluation(self):
+        reminder = self._reminder()
+        reminder.check()
+        reminder.check()
+        reminder.check()
+        self.assertEqual(reminder.check_count, 3)
+        self.assertEqual(reminder.skipped_count, 2)
+        self.assertTrue(reminder.alerter.active)
+
+    def test_new_body_is_changed(self):
+        reminder = self._reminder()
+        reminder.check()
+        self.assertTrue(reminder.alerter.active)
+        self.server.body = {'value': 20}
+        self.server.etag = '"2"'
+        self.assertEqual(reminder.fetch_status().value, 20)
+        self.assertTrue(reminder.watcher.changed)
+        self.assertEqual(self.server.requests[-1], ('"1"', None))
+
+    def test_last_modified_validator(self):
+        self.server.etag = None
+        self.server.last_modified = 'Wed, 21 Oct 2015 07:28:00 GMT'
+        reminder = self._reminder()
+        reminder.fetch_status()
+        self.assertEqual(reminder.fetch_status().value, 80)
+        self.assertFalse(reminder.watcher.changed)
+        self.assertEqual(self.server.requests[-1], (None, 'Wed, 21 Oct 2015 07:28:00 GMT'))
+
+    def test_no_validators_always_changed(self):
+        self.server.etag = None
+        reminder = self._reminder()
+        reminder.fetch_status()
+        reminder.fetch_status()
+        self.assertTrue(reminder.watcher.changed)
+        self.assertEqual(self.server.requests, [(None, None), (None, None)])
+
+    def test_unconditional_watcher(self):
+        reminder = self._reminder(conditional=False)
+        reminder.fetch_status()
+        reminder.fetch_status()
+        self.assertEqual(self.server.requests, [(None, None), (None, None)])
+
+    def test_time_dependent_condition_evaluated_on_not_modified(self):
+        reminder = self._reminder(condition='status > 50 and now.year > 2000')
+        reminder.check()
+        reminder.check()
+        self.assertEqual(reminder.skipped_count, 0)
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def test_concurrent_fetches_share_one_load(self):
+        cache = ResponseCache(ttl=0)
+        calls = []
+        started = threading.Event()
+
+        def loader(previous):
+            calls.append(previous)
+            started.set()
+            time.sleep(0.1)
+            return CachedResponse({'value': 1}, None, None, 0)
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.fetch('key', loader))) for _ in range(8)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(calls, [None])
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual((cache.misses, cache.coalesced), (1, 7))
+
+    def test_fresh_response_reused_within_ttl(self):
+        cache = ResponseCache(ttl=60)
+        first = cache.fetch('key', lambda previous: CachedResponse(1, None, None, 0))
+        self.assertIs(cache.fetch('key', self.fail), first)
+        self.assertEqual(cache.hits, 1)
+
+    def test_expired_response_passed_to_loader(self):
+        cache = ResponseCache(ttl=0)
+        first = cache.fetch('key', lambda previous: CachedResponse(1, '"1"', None, 0))
+        previous = []
+        cache.fetch('key', lambda response: previous.append(response) or response)
+        self.assertEqual(previous, [first])
+
+    def test_error_reaches_waiters_and_is_not_cached(self):
+        cache = ResponseCache(ttl=60)
+        started = threading.Event()
+        errors = []
+
+        def loader(previous):
+            started.set()
+            time.sleep(0.1)
+            raise IOError('upstream down')
+
+        def fetch():
+            try:
+                cache.fetch('key', loader)
+            except IOError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=fetch) for _ in range(3)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 3)
+        self.assertEqual(cache.fetch('key', lambda previous: CachedResponse(2, None, None, 0)).body, 2)
+
+    def test_response_dropped_with_last_user(self):
+        cache = ResponseCache(ttl=60)
+        cache.acquire('key')
+        cache.acquire('key')
+        cache.fetch('key', lambda previous: CachedResponse(1, None, None, 0))
+        cache.release('key')
+        self.assertIsNotNone(cache.previous('key'))
+        cache.release('key')
+        self.assertIsNone(cache.previous('key'))
+
+
+class SharedRequestTest(_WatcherTest):
+    cache_kwargs = {'ttl': 60}
+
+    def test_watchers_of_same_request_share_response(self):
+        value = self._reminder('value', 'value')
+        unit = self._reminder('unit', 'unit', condition='status == "F"')
+        self.assertEqual(value.watcher.request_key, unit.watcher.request_key)
+        self.assertEqual(value.fetch_status().value, 80)
+        self.assertEqual(unit.fetch_status().value, 'C')
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.daemon.response_cache.hits, 1)
+
+    def test_different_requests_not_shared(self):
+        value = self._reminder('value', 'value')
+        other = self.daemon.add_reminder({
+            'id': 'other',
+            'condition': 'status > 50',
+            'watcher': {'type': 'HTTPWatcher', 'schedules': [], 'json_expression': 'value',
+                        'request_kwargs': {'url': self.url, 'params': {'page': 2}}},
+        }, schedule=False)
+        self.assertNotEqual(value.watcher.request_key, other.watcher.request_key)
+        value.fetch_status()
+        other.fetch_status()
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_removed_reminder_keeps_response_of_remaining_watcher(self):
+        value = self._reminder('value', 'value')
+        unit = self._reminder('unit', 'unit', condition='status == "F"')
+        value.fetch_status()
+        self.daemon.remove_reminder(value)
+        self.assertIsNotNone(self.daemon.response_cache.previous(unit.watcher.request_key))
+        self.daemon.remove_reminder(unit)
+        self.assertIsNone(self.daemon.response_cache.previous(unit.watcher.request_key))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from reminders.wheel import TimingWheel
+
+
+class _Job(object):
+    __slots__ = ('due', 'slot')
+
+    def __init__(self, due):
+        self.due = due
+        self.slot = None
+
+
+class TimingWheelTest(unittest.TestCase):
+
+    def setUp(self):
+        # 4 slots per level and 3 levels, so cascades happen every 4 and 16 ticks
+        self.wheel = TimingWheel(bits=2, levels=3)
+
+    def _run(self, ticks):
+        fired = {}
+        for _ in range(ticks):
+            for job in self.wheel.advance():
+                fired[job] = self.wheel.now
+        return fired
+
+    def test_jobs_fire_on_their_tick_across_cascades(self):
+        jobs = [_Job(due) for due in (1, 3, 4, 5, 15, 16, 17, 63, 64, 65, 100)]
+        for job in jobs:
+            self.wheel.insert(job)
+        fired = self._run(110)
+        self.assertEqual({job.due: tick for job, tick in fired.items()}, {job.due: job.due for job in jobs})
+        self.assertEqual(self.wheel.count, 0)
+
+    def test_jobs_inserted_mid_revolution(self):
+        self._run(6)
+        jobs = [_Job(due) for due in (7, 8, 16, 22, 70)]
+        for job in jobs:
+            self.wheel.insert(job)
+        fired = self._run(70)
+        self.assertEqual(sorted(fired.values()), [7, 8, 16, 22, 70])
+
+    def test_past_due_fires_next_tick(self):
+        self._run(10)
+        job = _Job(3)
+        self.wheel.insert(job)
+        self.assertEqual(self._run(1), {job: 11})
+
+    def test_cancel(self):
+        job = _Job(20)
+        self.wheel.insert(job)
+        self.wheel.cancel(job)
+        self.assertEqual(self._run(30), {})
+        self.assertEqual(self.wheel.count, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()